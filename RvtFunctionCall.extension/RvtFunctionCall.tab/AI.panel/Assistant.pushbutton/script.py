@@ -8,16 +8,31 @@ import clr
 from pyrevit import forms, script
 from Autodesk.Revit.DB import *
 from Autodesk.Revit.UI import *
+from System import Action
 
 current_dir = os.path.dirname(__file__)
 extension_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
 lib_path = os.path.join(extension_dir, 'lib')
 sys.path.append(lib_path)
 
-from utils.ai_client import get_ai_response
+from utils.ai_client import forget_response, get_ai_response
+from utils.agent_loop import AgentLoop, agent_settings, error_prompt, format_history
 from utils.docs_lookup import find_relevant_context
+from utils.docs_router import route_files
 from utils.config import load_config
+from utils.intent_classifier import max_docs_for
+from utils.providers import PROVIDERS
+from utils.hedging import has_code_block
 from utils.task_agent import understand_and_formulate_tasks, formulate_enhanced_query
+from utils.semantic_cache import SemanticCache
+from utils.streaming import partial_code_block
+from utils.worker import BackgroundTask, OperationCancelled
+from utils.dry_run import dry_run, format_result
+from utils.exec_cache import NamespaceTemplate, module_names
+from utils.code_validator import blocking, format_issues, preflight, repair_prompt, side_effects
+from utils.perf_linter import analyze, format_findings, reference_text, rewrite
+from utils.profiler import format_report, optimize_prompt, run_script
+from utils.tracing import now, start_trace
 
 class AssistantUI(forms.WPFWindow):
     """Main UI window for Revit AI Assistant with complete agentic workflow"""
@@ -30,6 +45,18 @@ class AssistantUI(forms.WPFWindow):
         self.last_error = None
         self.last_query = None
         self.last_context = None
+        self.last_cache_key = None
+        self.last_reused = False
+        self.last_issues = []
+        self.last_findings = []
+        self.last_profile = None
+        self.auto_repairs_left = 0
+        self.namespace = NamespaceTemplate(self.build_namespace)
+        self.semantic_cache = SemanticCache.from_config(self.config)
+        self.active_task = None
+        self.prefetch_task = None
+        self.prefetched = (None, None, None)
+        self.Closing += self.window_closing
         self.setup_ui()
     
     def setup_ui(self):
@@ -37,13 +64,111 @@ class AssistantUI(forms.WPFWindow):
         self.Title = "Revit AI Assistant - Agentic Workflow"
         
         self.modelComboBox.Items.Clear()
-        self.modelComboBox.Items.Add("Claude")
-        self.modelComboBox.Items.Add("Gemini")
-        self.modelComboBox.SelectedIndex = 0 if self.config.get('default_model') == 'claude' else 1
+        default_model = (self.config.get('default_model') or 'claude').lower()
+        for index, provider in enumerate(PROVIDERS):
+            self.modelComboBox.Items.Add(provider.display_name)
+            if provider.name == default_model:
+                self.modelComboBox.SelectedIndex = index
+        if self.modelComboBox.SelectedIndex < 0:
+            self.modelComboBox.SelectedIndex = 0
+        self.agentLoopCheckBox.IsChecked = bool(agent_settings(self.config)['enabled'])
         
         self.statusText.Text = "Ready for agentic workflow"
         self.artifactTextBox.Text = "Generated code will appear here..."
         self.summaryTextBox.Text = "Task analysis and response summary will appear here..."
+        self.set_busy(False)
+    
+    def selected_model(self):
+        """Return the provider name chosen in the model combo box"""
+        return PROVIDERS[max(self.modelComboBox.SelectedIndex, 0)].name
+    
+    def dispatch(self, callback):
+        """Run a callback on the UI thread"""
+        self.Dispatcher.BeginInvoke(Action(callback))
+    
+    def set_busy(self, busy):
+        """Toggle buttons while a background request is running"""
+        self.askButton.IsEnabled = not busy
+        self.dryRunButton.IsEnabled = not busy
+        self.reviewFixButton.IsEnabled = not busy
+        self.executeButton.IsEnabled = not busy
+        self.cancelButton.IsEnabled = busy
+        self.optimizeButton.IsEnabled = not busy and self.can_optimize()
+    
+    def can_optimize(self):
+        """Optimize applies a linter rewrite, or sends a profile of the last run to the model"""
+        return self.last_profile is not None or any(item['rewritable'] for item in self.last_findings)
+    
+    def run_in_background(self, work, on_result, on_failure=None):
+        """Run work(token, report) off the UI thread; report(text) updates the status bar
+        
+        `on_failure(error)` is also told when the work fails or is cancelled.
+        """
+        def on_progress(text):
+            self.statusText.Text = text
+        
+        def on_error(error):
+            self.active_task = None
+            self.set_busy(False)
+            if on_failure is not None:
+                on_failure(error)
+            if isinstance(error, OperationCancelled):
+                self.statusText.Text = "Cancelled"
+                self.summaryTextBox.Text += "\n\nRequest cancelled."
+            else:
+                self.statusText.Text = "Error - See summary"
+                self.summaryTextBox.Text += "\n\n❌ REQUEST ERROR:\n{}".format(error)
+        
+        def on_done(result):
+            self.active_task = None
+            self.set_busy(False)
+            on_result(result)
+        
+        self.set_busy(True)
+        self.active_task = BackgroundTask(work, on_done, on_error, on_progress, self.dispatch).start()
+    
+    def cancel_button_click(self, sender, e):
+        """Cancel the running request"""
+        if self.active_task is not None:
+            self.active_task.cancel()
+            self.statusText.Text = "Cancelling..."
+    
+    def window_closing(self, sender, e):
+        """Abandon background work when the window closes"""
+        for task in (self.active_task, self.prefetch_task):
+            if task is not None:
+                task.cancel()
+    
+    def query_text_changed(self, sender, e):
+        """Prefetch documentation for the query while the user is still typing"""
+        if self.prefetch_task is not None:
+            self.prefetch_task.cancel()
+        query = self.queryTextBox.Text.strip()
+        if not query:
+            return
+        
+        def work(token, report):
+            if token.wait(0.3):
+                return None
+            # Analyzing here also loads the intent classifier off the UI
+            # thread before the first Ask, and routes the search as Ask will
+            task_analysis = understand_and_formulate_tasks(query, self.config)
+            files, routes = route_files(query, task_analysis, self.config)
+            return query, files, find_relevant_context(query, max_docs_for(task_analysis, self.config), files)
+        
+        def on_result(result):
+            if result is not None:
+                self.prefetched = result
+        
+        self.prefetch_task = BackgroundTask(work, on_result, dispatch=self.dispatch).start()
+    
+    def context_for(self, query, max_docs=None, files=None):
+        """Return prefetched documentation for the query, or look it up now"""
+        prefetched_query, prefetched_files, context = self.prefetched
+        if prefetched_query == query and prefetched_files == files and context is not None and (
+                max_docs is None or len(context['documentation']) >= max_docs):
+            return context
+        return find_relevant_context(query, max_docs, files)
     
     def ask_button_click(self, sender, e):
         """Handle Ask button - Complete agentic workflow"""
@@ -57,11 +182,15 @@ class AssistantUI(forms.WPFWindow):
         
         self.statusText.Text = "Agent analyzing task..."
         
-        task_analysis = understand_and_formulate_tasks(query)
-        enhanced_query = formulate_enhanced_query(query, task_analysis)
+        model = self.selected_model()
+        trace = start_trace('ask', self.config, model=model, agent_loop=bool(self.agentLoopCheckBox.IsChecked))
+        with trace.span('analyze') as span:
+            task_analysis = understand_and_formulate_tasks(query, self.config)
+            enhanced_query = formulate_enhanced_query(query, task_analysis)
+            span.update(action=task_analysis["primary_action"], confidence=task_analysis["confidence"])
         
         analysis_summary = """AGENT TASK ANALYSIS:
-Action: {}
+Action: {}{}
 Elements: {}
 Complexity: {}
 Needs Selection: {}
@@ -70,6 +199,7 @@ Approach: {}
 
 Processing...""".format(
             task_analysis["primary_action"] or "general",
+            self.confidence_note(task_analysis),
             ", ".join(task_analysis["target_elements"]) if task_analysis["target_elements"] else "unspecified",
             task_analysis["complexity"],
             "Yes" if task_analysis["requires_selection"] else "No",
@@ -78,19 +208,164 @@ Processing...""".format(
         )
         
         self.summaryTextBox.Text = analysis_summary
-        self.statusText.Text = "Querying documentation database..."
+        self.last_reused = False
+        self.auto_repairs_left = 1
+        use_cache = not self.regenerateCheckBox.IsChecked
+        trace.set(regenerate=not use_cache)
         
-        context = find_relevant_context(query)
-        self.last_context = context
+        if self.semantic_cache is not None and use_cache:
+            with trace.span('semantic_cache') as span:
+                similarity, entry = self.semantic_cache.lookup(query)
+                span['hit'] = entry is not None
+            trace.set(semantic_cache='hit' if entry is not None else 'miss')
+            if entry is not None:
+                self.last_reused = True
+                self.artifactTextBox.Text = entry['code']
+                self.summaryTextBox.Text = analysis_summary.replace(
+                    "Processing...",
+                    "REUSED SCRIPT ({:.0%} match) that previously ran successfully for:\n{}".format(similarity, entry['query'])
+                )
+                self.statusText.Text = "Ready - Reused script (cached, {:.0%} match)".format(similarity)
+                trace.finish(outcome='reused')
+                return
         
-        self.statusText.Text = "Agent generating code..."
+        self.statusText.Text = "Querying documentation database..."
         self.artifactTextBox.Text = "Agent is generating code based on task analysis..."
         
-        model = "claude" if self.modelComboBox.SelectedIndex == 0 else "gemini"
-        response = get_ai_response(enhanced_query, context, model)
+        on_token = self.stream_to_artifact()
+        if self.agentLoopCheckBox.IsChecked:
+            self.run_agent_loop(query, enhanced_query, task_analysis, model, on_token, trace, use_cache)
+            return
+        
+        def work(token, report):
+            context = self.traced_context(query, trace, task_analysis)
+            token.raise_if_cancelled()
+            report("Agent generating code...")
+            response_info = {}
+            
+            def forward(text):
+                token.raise_if_cancelled()
+                on_token(text)
+            
+            started = now()
+            response = get_ai_response(enhanced_query, context, model, info=response_info, on_token=forward,
+                                       token=token, on_retry=self.retry_reporter(report), use_cache=use_cache)
+            trace.add_generation(started, response_info)
+            return context, response, response_info
         
-        self.parse_and_display_response(response, task_analysis)
-        self.statusText.Text = "Ready - Code generated"
+        def on_result(result):
+            context, response, response_info = result
+            self.last_context = context
+            self.last_cache_key = response_info.get('cache_key')
+            with trace.span('display'):
+                self.parse_and_display_response(response, task_analysis)
+            trace.finish(outcome='code' if has_code_block(response) else 'no_code')
+            if response_info.get('cached'):
+                self.statusText.Text = "Ready - Code generated (cached, {:.0f} ms)".format(response_info['elapsed'] * 1000)
+            elif 'first_token' in response_info:
+                self.statusText.Text = "Ready - Code generated (first token {:.0f} ms, total {:.1f} s)".format(
+                    response_info['first_token'] * 1000, response_info['elapsed'])
+                prompt_cache = response_info.get('prompt_cache')
+                if prompt_cache and prompt_cache['status'] == 'hit':
+                    self.statusText.Text += " - prompt cache hit, {} tokens reused".format(prompt_cache['saved_input_tokens'])
+                if response_info.get('hedged'):
+                    self.statusText.Text += " - hedged after {:.0f} ms, {} won".format(
+                        response_info['hedge_delay'] * 1000, response_info['winner'].capitalize())
+            else:
+                self.statusText.Text = "Ready - Code generated"
+            self.repair_if_needed()
+        
+        self.run_in_background(work, on_result, self.trace_failure(trace))
+    
+    def confidence_note(self, task_analysis):
+        """' (87% confident)', flagged when the classifier is unsure; empty without it"""
+        if task_analysis["confidence"] is None:
+            return ""
+        if task_analysis["low_confidence"]:
+            return " ({:.0%} confident - retrieving broader documentation)".format(task_analysis["confidence"])
+        return " ({:.0%} confident)".format(task_analysis["confidence"])
+    
+    def traced_context(self, query, trace, task_analysis):
+        """context_for() recorded as the trace's retrieve span
+        
+        Uncertain tasks get more documentation; the others search only the
+        documentation files the index maps their task to.
+        """
+        max_docs = max_docs_for(task_analysis, self.config)
+        with trace.span('retrieve', prefetched=self.prefetched[0] == query, max_docs=max_docs) as span:
+            files, routes = route_files(query, task_analysis, self.config)
+            span.update(routes=routes, files=len(files) if files is not None else None)
+            context = self.context_for(query, max_docs, files)
+            span['documents'] = len(context.get('documentation') or [])
+        return context
+    
+    def trace_failure(self, trace):
+        """Return an on_failure callback that closes the trace as cancelled or failed"""
+        def on_failure(error):
+            if isinstance(error, OperationCancelled):
+                trace.finish(outcome='cancelled')
+            else:
+                trace.finish(outcome='error', error=type(error).__name__)
+        return on_failure
+    
+    def run_agent_loop(self, query, enhanced_query, task_analysis, model, on_token, trace, use_cache=True):
+        """Generate, check and repair without user clicks until the script passes or the budget runs out"""
+        def work(token, report):
+            context = self.traced_context(query, trace, task_analysis)
+            
+            def forward(text):
+                token.raise_if_cancelled()
+                on_token(text)
+            
+            loop = AgentLoop(query, enhanced_query, context, model, self.config, dry_run=self.dry_run_on_ui_thread,
+                             on_token=forward, on_progress=report, token=token, on_retry=self.retry_reporter(report),
+                             use_cache=use_cache)
+            with trace.span('agent_loop') as span:
+                outcome = loop.run()
+                span.update(iterations=outcome['iterations'], tokens=outcome['tokens'])
+            return context, outcome
+        
+        def on_result(result):
+            context, outcome = result
+            self.last_context = context
+            # The loop already dropped every response that failed its checks
+            self.last_cache_key = None
+            if outcome['response'] is not None:
+                with trace.span('display'):
+                    self.parse_and_display_response(outcome['response'], task_analysis)
+            trace.finish(outcome=outcome['status'])
+            self.summaryTextBox.Text += "\n\nAGENT LOOP: {} after {} iteration(s) in {:.1f} s, ~{} tokens\n{}".format(
+                outcome['status'], outcome['iterations'], outcome['elapsed'], outcome['tokens'], format_history(outcome))
+            if outcome['status'] == 'passed':
+                self.statusText.Text = "Ready - Code passed checks ({} iteration(s), {:.1f} s)".format(
+                    outcome['iterations'], outcome['elapsed'])
+            else:
+                self.statusText.Text = "Agent loop stopped ({}) - review before executing".format(outcome['status'])
+        
+        self.run_in_background(work, on_result, self.trace_failure(trace))
+    
+    def retry_reporter(self, report):
+        """Return an on_retry callback that shows provider back-off in the status bar"""
+        def on_retry(attempt, delay, error):
+            reason = "HTTP {}".format(error.code) if hasattr(error, 'code') else "connection error"
+            report("Provider busy ({}), retry {} in {:.1f} s...".format(reason, attempt, delay))
+        return on_retry
+    
+    def stream_to_artifact(self):
+        """Return a thread-safe on_token callback that shows code in the artifact pane as it is generated"""
+        received = []
+        
+        def show():
+            code = partial_code_block("".join(received))
+            if code is not None:
+                self.artifactTextBox.Text = code
+                self.artifactTextBox.ScrollToEnd()
+        
+        def on_token(text):
+            received.append(text)
+            self.dispatch(show)
+        
+        return on_token
     
     def parse_and_display_response(self, response, task_analysis):
         """Extract code from response and display with task context"""
@@ -99,8 +374,12 @@ Processing...""".format(
         code_pattern = r'```(?:python)?\s*\n([\s\S]*?)\n```'
         matches = re.findall(code_pattern, response)
         
+        self.last_profile = None
         if matches:
-            code = matches[0].strip()
+            code, preflight_summary = self.preflight_code(matches[0].strip())
+            if self.last_issues:
+                self.forget_cached_response()
+            preflight_summary.extend(self.lint_code(code))
             self.artifactTextBox.Text = code
             
             summary_parts = [
@@ -114,12 +393,116 @@ Processing...""".format(
             
             if len(response) > 500:
                 summary_parts.append("... (response truncated)")
+            summary_parts.extend(preflight_summary)
             
             self.summaryTextBox.Text = "\n".join(summary_parts)
         else:
+            self.last_issues = []
+            self.last_findings = []
+            self.optimizeButton.IsEnabled = False
             self.artifactTextBox.Text = "No code block found in response"
             self.summaryTextBox.Text = "AGENT RESPONSE (No Code):\n" + response
     
+    def forget_cached_response(self):
+        """Keep a broken script from being served again by the response cache"""
+        forget_response(self.last_cache_key, self.config)
+        self.last_cache_key = None
+    
+    def preflight_code(self, code):
+        """Statically check extracted code, fixing what can be fixed locally
+        
+        Returns the (possibly fixed) code and summary lines; blocking issues
+        that remain are kept in self.last_issues for a targeted repair.
+        """
+        if not self.config.get('preflight', {}).get('enabled', True):
+            self.last_issues = []
+            return code, []
+        
+        code, applied, issues = preflight(code)
+        self.last_issues = blocking(issues)
+        summary = []
+        if applied:
+            summary.extend(["", "PRE-FLIGHT AUTO-FIXED: {}".format(", ".join(applied))])
+        if issues:
+            summary.extend(["", "PRE-FLIGHT ISSUES:", format_issues(issues)])
+        return code, summary
+    
+    def lint_code(self, code):
+        """Run the performance linter; returns summary lines and enables Optimize when a rewrite applies"""
+        self.last_findings = analyze(code) if self.config.get('perf_lint', {}).get('enabled', True) else []
+        self.optimizeButton.IsEnabled = self.can_optimize()
+        if not self.last_findings:
+            return []
+        references = []
+        for item in self.last_findings:
+            if item['rule'] not in references:
+                references.append(item['rule'])
+        return ["", "PERFORMANCE:", format_findings(self.last_findings), "",
+                "Based on:"] + ["- " + reference_text(rule) for rule in references]
+    
+    def optimize_button_click(self, sender, e):
+        """Apply the linter's rewrites: hoist collectors out of loops and batch transactions"""
+        code = self.artifactTextBox.Text.strip()
+        optimized, applied = rewrite(code)
+        if not applied and self.last_profile is not None:
+            self.optimize_with_profile(code)
+            return
+        if not applied:
+            self.statusText.Text = "Nothing to rewrite automatically"
+            self.optimizeButton.IsEnabled = False
+            return
+        self.artifactTextBox.Text = optimized
+        summary = ["", "⚡ OPTIMIZED: {}".format(", ".join(
+            "{} x{}".format(rule, applied.count(rule)) for rule in sorted(set(applied))))]
+        summary.extend(self.lint_code(optimized))
+        self.summaryTextBox.Text += "\n".join(summary)
+        self.last_reused = False
+        self.statusText.Text = "Optimized - {} rewrite(s) applied".format(len(applied))
+    
+    def optimize_with_profile(self, code):
+        """Send the measured hot spots back to the model as an "optimize this" request"""
+        if not self.last_query:
+            forms.alert("No previous query to optimize. Please generate code first.", title="No Query")
+            return
+        
+        self.statusText.Text = "Agent optimizing code..."
+        prompt = optimize_prompt(self.last_query, code, format_report(self.last_profile))
+        model = self.selected_model()
+        last_query = self.last_query
+        on_token = self.stream_to_artifact()
+        
+        def work(token, report):
+            context = self.last_context if self.last_context else self.context_for(last_query)
+            
+            def forward(text):
+                token.raise_if_cancelled()
+                on_token(text)
+            
+            info = {}
+            response = get_ai_response(prompt, context, model, info=info, on_token=forward,
+                                       token=token, on_retry=self.retry_reporter(report))
+            return response, info
+        
+        def on_result(result):
+            response, info = result
+            self.last_cache_key = info.get('cache_key')
+            self.parse_and_display_response(response, understand_and_formulate_tasks(last_query, self.config))
+            self.summaryTextBox.Text += "\n\n⚡ OPTIMIZED from the execution profile - profile again to compare."
+            self.statusText.Text = "Code optimized - Ready to execute"
+            self.last_reused = False
+        
+        self.run_in_background(work, on_result)
+    
+    def repair_if_needed(self):
+        """Send blocking pre-flight issues back for one automatic targeted repair"""
+        if not self.last_issues:
+            return
+        if self.auto_repairs_left > 0 and self.config.get('preflight', {}).get('auto_repair', True):
+            self.auto_repairs_left -= 1
+            self.review_fix_button_click(None, None)
+        else:
+            self.statusText.Text = "Pre-flight found {} issue(s) - use Fix Code before executing".format(len(self.last_issues))
+    
     def execute_button_click(self, sender, e):
         """Execute the generated code with error capture"""
         code = self.artifactTextBox.Text.strip()
@@ -132,25 +515,69 @@ Processing...""".format(
             return
         
         self.statusText.Text = "Executing code..."
+        profile = bool(self.profileCheckBox.IsChecked)
         
         try:
-            self.execute_code(code)
+            self.execute_code(code, profile)
             
             self.statusText.Text = "Success - Script completed"
             self.summaryTextBox.Text += "\n\n✅ EXECUTION SUCCESSFUL: Script ran without errors!"
             self.last_error = None
+            if self.semantic_cache is not None and self.last_query and not self.last_reused:
+                self.semantic_cache.remember(self.last_query, code)
+            self.show_profile()
             forms.alert("Script executed successfully!", title="Success")
             
         except Exception as e:
             error_message = str(e)
             self.last_error = error_message
+            self.forget_cached_response()
             
             self.statusText.Text = "Error - See summary"
             error_summary = "\n\n❌ EXECUTION ERROR:\n{}".format(error_message)
             self.summaryTextBox.Text += error_summary
+            self.show_profile()
             
             forms.alert("Script execution failed. Use 'Fix Code' button to automatically correct the error.", title="Execution Error")
     
+    def dry_run_button_click(self, sender, e):
+        """Run the generated code and roll every change back"""
+        code = self.artifactTextBox.Text.strip()
+        
+        if not code or code == "Generated code will appear here...":
+            forms.alert("No code to dry-run!", title="Empty Code")
+            return
+        
+        effects = side_effects(code)
+        if effects and not forms.alert(
+                "The dry run only rolls back model changes. This script would still run:\n{}\n\nDry-run anyway?".format(
+                    "\n".join("- line {}: {}".format(item['line'], item['call']) for item in effects)),
+                ok=True, cancel=True):
+            return
+        
+        self.statusText.Text = "Dry run..."
+        result = self.dry_run_code(code)
+        self.summaryTextBox.Text += "\n\n🧪 DRY RUN {}".format(format_result(result))
+        if result['skipped']:
+            self.statusText.Text = "Dry run skipped - a Transaction is already open"
+        elif result['ok']:
+            self.last_error = None
+            self.statusText.Text = "Dry run passed - {} element(s) would change".format(result['touched'])
+        else:
+            self.last_error = result['error']
+            self.forget_cached_response()
+            self.statusText.Text = "Dry run failed - use Fix Code"
+    
+    def dry_run_code(self, code):
+        """Execute code inside a rolled-back TransactionGroup; returns the dry_run() result"""
+        return dry_run(code, self.exec_namespace(), TransactionGroup)
+    
+    def dry_run_on_ui_thread(self, code):
+        """Agent loop hook: dry-run on the UI thread, where the Revit API may be used; returns the error or None"""
+        outcome = []
+        self.Dispatcher.Invoke(Action(lambda: outcome.append(self.dry_run_code(code))))
+        return outcome[0]['error']
+    
     def review_fix_button_click(self, sender, e):
         """Fix code based on error or general review"""
         if not self.last_query:
@@ -164,20 +591,11 @@ Processing...""".format(
         
         self.statusText.Text = "Agent fixing code..."
         
+        last_issues = self.last_issues
         if self.last_error:
-            fix_prompt = """ORIGINAL TASK: {}
-
-CURRENT CODE WITH ERROR:
-```python
-{}
-```
-
-ERROR MESSAGE: {}
-
-TASK: Fix the code to resolve this error. The error occurred during execution in Revit. 
-Generate corrected IronPython 2.7 code that addresses the specific error while maintaining the original functionality.""".format(
-                self.last_query, current_code, self.last_error
-            )
+            fix_prompt = error_prompt(self.last_query, current_code, self.last_error)
+        elif last_issues:
+            fix_prompt = repair_prompt(self.last_query, current_code, last_issues)
         else:
             fix_prompt = """ORIGINAL TASK: {}
 
@@ -195,44 +613,78 @@ TASK: Review and improve this code. Check for:
 
 Generate improved IronPython 2.7 code.""".format(self.last_query, current_code)
         
-        model = "claude" if self.modelComboBox.SelectedIndex == 0 else "gemini"
+        model = self.selected_model()
+        last_query = self.last_query
+        last_error = self.last_error
+        on_token = self.stream_to_artifact()
         
-        context = self.last_context if self.last_context else find_relevant_context(self.last_query)
-        
-        response = get_ai_response(fix_prompt, context, model)
-        
-        task_analysis = understand_and_formulate_tasks(self.last_query)
-        self.parse_and_display_response(response, task_analysis)
+        def work(token, report):
+            context = self.last_context if self.last_context else self.context_for(last_query)
+            
+            def forward(text):
+                token.raise_if_cancelled()
+                on_token(text)
+            
+            info = {}
+            response = get_ai_response(fix_prompt, context, model, info=info, on_token=forward,
+                                       token=token, on_retry=self.retry_reporter(report))
+            return response, info
         
-        self.statusText.Text = "Code fixed - Ready to execute"
-        fix_summary = "\n\n🔧 CODE FIXED: Agent has analyzed and corrected the code."
-        if self.last_error:
-            fix_summary += " Error addressed: {}".format(self.last_error[:100])
-        self.summaryTextBox.Text += fix_summary
+        def on_result(result):
+            response, info = result
+            self.last_cache_key = info.get('cache_key')
+            task_analysis = understand_and_formulate_tasks(last_query, self.config)
+            self.parse_and_display_response(response, task_analysis)
+            
+            self.statusText.Text = "Code fixed - Ready to execute"
+            fix_summary = "\n\n🔧 CODE FIXED: Agent has analyzed and corrected the code."
+            if last_error:
+                fix_summary += " Error addressed: {}".format(last_error[:100])
+            elif last_issues:
+                fix_summary += " Pre-flight issues addressed: {}".format(len(last_issues))
+            self.summaryTextBox.Text += fix_summary
+            
+            self.last_error = None
+            self.last_reused = False
+            self.repair_if_needed()
         
-        self.last_error = None
+        self.run_in_background(work, on_result)
+    
+    def execute_code(self, code, profile=False):
+        """Execute code in Revit context, optionally timing each top-level statement"""
+        # Every run replaces the profile, so a plain run never reports the last profiled one
+        self.last_profile = None
+        try:
+            self.last_profile = run_script(code, self.exec_namespace(), profile)
+        except Exception as e:
+            self.last_profile = getattr(e, 'profile', None)
+            raise
     
-    def execute_code(self, code):
-        """Execute code in Revit context"""
-        doc = __revit__.ActiveUIDocument.Document
+    def show_profile(self):
+        """Append the hot-spot report of a profiled run to the summary"""
+        if self.last_profile is None:
+            self.optimizeButton.IsEnabled = self.can_optimize()
+            return
+        self.summaryTextBox.Text += "\n\n⏱ PROFILE (slowest first):\n{}\n\nUse Optimize to send this profile to the agent.".format(
+            format_report(self.last_profile))
+        self.optimizeButton.IsEnabled = True
+    
+    def exec_namespace(self):
+        """Globals for running generated code: a copy of the cached namespace with the current doc/uidoc"""
         uidoc = __revit__.ActiveUIDocument
-        
-        exec_globals = {
+        return self.namespace.fresh(doc=uidoc.Document, uidoc=uidoc)
+    
+    def build_namespace(self):
+        """Revit DB classes and helpers shared by every run; built once per window"""
+        exec_globals = module_names(sys.modules[__name__])
+        exec_globals.update({
             '__revit__': __revit__,
-            'doc': doc,
-            'uidoc': uidoc,
             'clr': clr,
             'Transaction': Transaction,
             'FilteredElementCollector': FilteredElementCollector,
             'TaskDialog': TaskDialog
-        }
-        
-        for attr_name in dir(sys.modules[__name__]):
-            attr = getattr(sys.modules[__name__], attr_name)
-            if hasattr(attr, '__module__') and attr.__module__ == 'Autodesk.Revit.DB':
-                exec_globals[attr_name] = attr
-        
-        exec(code, exec_globals)
+        })
+        return exec_globals
 
 if __name__ == "__main__":
     ui = AssistantUI()
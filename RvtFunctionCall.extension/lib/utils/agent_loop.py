@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Autonomous generate -> validate -> dry-run -> fix loop
+
+Does what a user otherwise does by hand with Generate Code, Execute and Fix
+Code: the script is pre-flight checked, optionally probed in a dry run, and
+any problem is fed straight back to the model until the script passes or the
+iteration/token budget is spent. Scripts that show dialogs, prompt for a
+selection or write files are not dry-run: rolling back the model would not
+undo those, and the user has not chosen to execute yet. Every iteration reuses the same packed
+documentation, so the provider prompt cache and the keep-alive connection
+pool serve the repairs.
+"""
+import time
+
+from .ai_client import forget_response, get_ai_response
+from .code_validator import blocking, preflight, repair_prompt, side_effects
+from .config import load_config
+from .context_packer import format_documentation, get_token_budget
+from .docs_corpus import estimate_tokens
+from .hedging import CODE_BLOCK_PATTERN
+
+DEFAULT_AGENT_CONFIG = {
+    'enabled': False,
+    'max_iterations': 4,        # Generations per task, including the first
+    'token_budget': 30000,      # Prompt + response tokens per task; 0 = unlimited
+    'dry_run': True             # Probe passing scripts in a rolled-back dry run when available
+}
+
+# Stages of a script that passed its checks
+PASSED_STAGES = ('passed', 'dry_run_skipped')
+
+
+def agent_settings(config):
+    settings = dict(DEFAULT_AGENT_CONFIG)
+    settings.update(config.get('agent_loop') or {})
+    return settings
+
+
+def extract_code(response):
+    """Return the first fenced code block of a response, or None"""
+    match = CODE_BLOCK_PATTERN.search(response or '')
+    if match is None or not match.group(1).strip():
+        return None
+    return match.group(1).strip()
+
+
+def error_prompt(query, code, error):
+    """Fix request for a script that raised while running in Revit"""
+    return """ORIGINAL TASK: {}
+
+CURRENT CODE WITH ERROR:
+```python
+{}
+```
+
+ERROR MESSAGE: {}
+
+TASK: Fix the code to resolve this error. The error occurred during execution in Revit.
+Generate corrected IronPython 2.7 code that addresses the specific error while maintaining the original functionality.""".format(
+        query, code, error)
+
+
+def no_code_prompt(query, response):
+    return """ORIGINAL TASK: {}
+
+YOUR PREVIOUS ANSWER CONTAINED NO CODE:
+{}
+
+TASK: Return the complete IronPython 2.7 script for the task in a single ```python code block.""".format(
+        query, response[:1000])
+
+
+class AgentLoop(object):
+    """Run the generate/check/repair cycle for one task
+
+    `dry_run(code)`, when given, runs the script without keeping its changes
+    and returns an error message, or None if it ran cleanly. It is only
+    called for scripts that already pass the pre-flight checks.
+
+    A response whose script fails a check is dropped from the response
+    cache; `use_cache=False` also ignores the cached answer to the first
+    prompt (Regenerate).
+
+    `run()` returns a result dict:
+    - status: 'passed', 'failed' (iterations used up), 'budget' (tokens
+      used up) or 'no_code'
+    - code, response: the last script and the raw response it came from
+    - iterations, tokens (estimated prompt + response), elapsed (seconds)
+    - history: one entry per iteration with its stage, problem and timings
+    """
+
+    def __init__(self, query, prompt, context, model="claude", config=None, dry_run=None, on_token=None,
+                 on_progress=None, token=None, on_retry=None, use_cache=True):
+        self.query = query
+        self.prompt = prompt
+        self.context = context
+        self.model = model
+        self.config = config or load_config()
+        self.settings = agent_settings(self.config)
+        self.dry_run = dry_run if self.settings['dry_run'] else None
+        self.on_token = on_token
+        self.on_progress = on_progress
+        self.token = token
+        self.on_retry = on_retry
+        self.use_cache = use_cache
+
+    def _report(self, text):
+        if self.on_progress is not None:
+            self.on_progress(text)
+
+    def _generate(self, prompt, use_cache=True):
+        """Return (response, info, tokens spent)"""
+        info = {}
+        response = get_ai_response(prompt, self.context, self.model, info=info, on_token=self.on_token,
+                                   config=self.config, token=self.token, on_retry=self.on_retry,
+                                   use_cache=use_cache)
+        if info.get('cached'):
+            return response, info, 0
+        prompt_cache = info.get('prompt_cache')
+        if prompt_cache:
+            prompt_tokens = prompt_cache['input_tokens']
+        else:
+            # The packed documentation is part of every prompt too
+            documentation = format_documentation(self.context, get_token_budget(self.config, self.model))
+            prompt_tokens = estimate_tokens(prompt) + estimate_tokens(documentation)
+        return response, info, prompt_tokens + estimate_tokens(response)
+
+    def check(self, code):
+        """Return (code, stage, problem, next_prompt); stage is in PASSED_STAGES once the script passes
+
+        A passing script that the dry run has to skip is 'dry_run_skipped',
+        with its side-effect calls as the problem.
+        """
+        code, applied, issues = preflight(code)
+        errors = blocking(issues)
+        if errors:
+            return code, 'preflight', errors, repair_prompt(self.query, code, errors)
+        if self.dry_run is not None:
+            effects = side_effects(code)
+            if effects:
+                return code, 'dry_run_skipped', effects, None
+            if self.token is not None:
+                self.token.raise_if_cancelled()
+            error = self.dry_run(code)
+            if error:
+                return code, 'dry_run', error, error_prompt(self.query, code, error)
+        return code, 'passed', None, None
+
+    def run(self):
+        started = time.time()
+        max_iterations = max(int(self.settings['max_iterations']), 1)
+        budget = int(self.settings['token_budget'])
+        prompt = self.prompt
+        result = {'status': 'failed', 'code': None, 'response': None, 'iterations': 0, 'tokens': 0,
+                  'history': []}
+
+        while result['iterations'] < max_iterations:
+            if budget and result['tokens'] >= budget:
+                result['status'] = 'budget'
+                break
+            if self.token is not None:
+                self.token.raise_if_cancelled()
+            result['iterations'] += 1
+            iteration_started = time.time()
+            self._report("Agent iteration {}/{}: generating...".format(result['iterations'], max_iterations))
+
+            response, info, tokens = self._generate(prompt, self.use_cache or result['iterations'] > 1)
+            result['tokens'] += tokens
+            result['response'] = response
+            step = {'iteration': result['iterations'], 'tokens': tokens, 'cached': info.get('cached', False),
+                    'generate': info.get('elapsed'), 'prompt_cache': (info.get('prompt_cache') or {}).get('status')}
+
+            code = extract_code(response)
+            if code is None:
+                step.update({'stage': 'no_code', 'problem': None})
+                result['status'] = 'no_code'
+                prompt = no_code_prompt(self.query, response)
+            else:
+                self._report("Agent iteration {}/{}: checking...".format(result['iterations'], max_iterations))
+                code, stage, problem, prompt = self.check(code)
+                result['code'] = code
+                step.update({'stage': stage, 'problem': problem})
+                result['status'] = 'passed' if stage in PASSED_STAGES else 'failed'
+                if result['status'] == 'failed':
+                    forget_response(info.get('cache_key'), self.config)
+            step['elapsed'] = time.time() - iteration_started
+            result['history'].append(step)
+            if result['status'] == 'passed':
+                break
+
+        result['elapsed'] = time.time() - started
+        return result
+
+
+def format_history(result):
+    """Summary lines describing each iteration of a loop result"""
+    lines = []
+    for step in result['history']:
+        if step['stage'] == 'passed':
+            outcome = "passed"
+        elif step['stage'] == 'no_code':
+            outcome = "no code block"
+        elif step['stage'] == 'dry_run_skipped':
+            calls = []
+            for item in step['problem']:
+                if item['call'] not in calls:
+                    calls.append(item['call'])
+            outcome = "passed, dry run skipped: it would run {}".format(", ".join(calls))
+        elif step['stage'] == 'preflight':
+            outcome = "pre-flight: " + "; ".join(item['message'] for item in step['problem'])
+        else:
+            outcome = "dry run: " + str(step['problem']).splitlines()[0][:150]
+        notes = ""
+        if step['cached']:
+            notes = ", cached"
+        elif step['prompt_cache']:
+            notes = ", prompt cache " + step['prompt_cache']
+        lines.append("- #{} {} ({:.1f} s, ~{} tokens{})".format(
+            step['iteration'], outcome, step['elapsed'], step['tokens'], notes))
+    return "\n".join(lines)
@@ -2,17 +2,25 @@
 """
 AI client for Revit Function Call with enhanced .NET import rules
 """
-import json
-import sys
-
-try:
-    import urllib.request as urllib_request
-    import urllib.parse as urllib_parse
-except ImportError:
-    import urllib2 as urllib_request
-    import urllib as urllib_parse
+import threading
+import time
 
 from .config import load_config
+from .docs_lookup import find_relevant_context
+from .context_packer import format_documentation, get_token_budget, pack_context
+from .docs_corpus import estimate_tokens
+from .response_cache import ResponseCache, fingerprint, make_key
+from .providers import Prompt, ReplayProvider, get_provider, record_response
+from .hedging import Race, get_tracker, has_code_block, race_settings, secondary_model
+from .governor import TokenBucket
+from .http_pool import get_pool
+from .worker import OperationCancelled, run_concurrently
+
+DEFAULT_BATCH_CONFIG = {
+    'concurrency': 8,
+    'requests_per_minute': {},  # Per provider, e.g. {'claude': 50}; missing or 0 = unlimited
+    'burst': 5
+}
 
 # Standard Revit API boilerplate that works reliably
 REVIT_BOILERPLATE = """import clr
@@ -36,127 +44,266 @@ CRITICAL .NET IMPORT RULES FOR IRONPYTHON 2.7:
 - Selection: uidoc.Selection.SetElementIds(List[ElementId](ids))
 """
 
-def get_claude_response(query, context_data):
+PROMPT_FRAMING = "You are an expert Revit API assistant. Generate IronPython 2.7 compatible code for pyRevit."
+
+PROMPT_INSTRUCTIONS = ("Generate working Revit Python code following the rules above. "
+                       "Use the standard boilerplate and ensure proper .NET imports.")
+
+def build_prompt(query, context_data, token_budget):
+    """Build the generation prompt with documentation packed into the token budget
+    
+    The rules and boilerplate never change and the documentation repeats for
+    similar queries, so both go in the cacheable prefix; only the request
+    itself is in the suffix.
+    """
+    documentation_context = format_documentation(context_data, token_budget)
+    
+    rules = "{}\n{}\nSTANDARD BOILERPLATE (always include):\n{}".format(
+        PROMPT_FRAMING, NET_IMPORT_RULES, REVIT_BOILERPLATE)
+    documentation = "REVIT API DOCUMENTATION:\n{}".format(
+        documentation_context if documentation_context else "No specific documentation loaded")
+    request = "USER REQUEST: {}\n\n{}".format(query, PROMPT_INSTRUCTIONS)
+    return Prompt([rules, documentation], request)
+
+def generate_response(query, context_data, model="claude", on_token=None, config=None, timings=None,
+                      token=None, on_retry=None, limit=None):
+    """Build the prompt and get a response from the provider registered as `model`
+    
+    Rate-limited and overloaded requests are retried by the provider's
+    governor; `on_retry(attempt, delay, error)` is told before each wait and
+    a cancelled `token` stops the wait. `limit(model, token)`, when given,
+    is called before the request is sent and may block to pace it. A
+    `timings` dict also receives 'prompt_build' (seconds) and
+    'prompt_tokens' (estimated).
+    """
+    config = config or load_config()
+    provider = get_provider(model, config)
+    started = time.time()
+    prompt = build_prompt(query, context_data, get_token_budget(config, provider.name))
+    if timings is not None:
+        timings['prompt_build'] = time.time() - started
+        timings['prompt_tokens'] = estimate_tokens(prompt.text)
+    if limit is not None:
+        limit(provider.name, token)
+    response = provider.generate(prompt, on_token, timings, token, on_retry)
+    if provider.name != ReplayProvider.name:
+        record_response(config, prompt, response)
+    return response
+
+def get_claude_response(query, context_data, on_token=None, config=None, timings=None):
     """Get response from Claude API with enhanced .NET rules"""
-    config = load_config()
-    api_key = config.get('claude_api_key', '')
-    
-    if not api_key:
-        raise Exception("Claude API key not configured")
-    
-    documentation_context = ""
-    if context_data and isinstance(context_data, dict) and 'documentation' in context_data:
-        docs = context_data['documentation']
-        if docs and len(docs) > 0:
-            doc_sections = []
-            for doc in docs[:3]:
-                if 'content' in doc and 'source' in doc:
-                    source = doc['source']
-                    content = doc['content'][:2000]
-                    doc_sections.append("=== {} ===\n{}".format(source.upper(), content))
-            
-            if doc_sections:
-                documentation_context = "\n\n".join(doc_sections)
-    
-    prompt = """You are an expert Revit API assistant. Generate IronPython 2.7 compatible code for pyRevit.
-
-{}
-
-STANDARD BOILERPLATE (always include):
-{}
-
-REVIT API DOCUMENTATION:
-{}
-
-USER REQUEST: {}
-
-Generate working Revit Python code following the rules above. Use the standard boilerplate and ensure proper .NET imports.""".format(
-        NET_IMPORT_RULES,
-        REVIT_BOILERPLATE,
-        documentation_context if documentation_context else "No specific documentation loaded", 
-        query
-    )
-    
-    request_data = {
-        "model": "claude-3-5-sonnet-20241022",
-        "max_tokens": 3000,
-        "messages": [{"role": "user", "content": prompt}]
-    }
-    
-    headers = {
-        "Content-Type": "application/json",
-        "x-api-key": api_key,
-        "anthropic-version": "2023-06-01"
-    }
-    
-    data = json.dumps(request_data).encode('utf-8')
-    req = urllib_request.Request("https://api.anthropic.com/v1/messages", data, headers)
-    
-    response = urllib_request.urlopen(req)
-    response_data = json.loads(response.read().decode('utf-8'))
-    
-    return response_data['content'][0]['text']
-
-def get_gemini_response(query, context_data):
+    return generate_response(query, context_data, "claude", on_token, config, timings)
+
+def get_gemini_response(query, context_data, on_token=None, config=None, timings=None):
     """Get response from Gemini API with enhanced .NET rules"""
-    config = load_config()
-    api_key = config.get('gemini_api_key', '')
+    return generate_response(query, context_data, "gemini", on_token, config, timings)
+
+def race_response(query, context_data, model, secondary, on_token=None, config=None, settings=None,
+                  token=None, on_retry=None, limit=None):
+    """Race `model` against `secondary` once the primary misses its hedge delay
     
-    if not api_key:
-        raise Exception("Gemini API key not configured")
+    Returns (response, info) where info holds 'winner', 'hedged',
+    'hedge_delay' and 'first_token'.
+    """
+    config = config or load_config()
+    settings = settings or race_settings(config)
+    tracker = get_tracker()
     
-    documentation_context = ""
-    if context_data and isinstance(context_data, dict) and 'documentation' in context_data:
-        docs = context_data['documentation']
-        if docs and len(docs) > 0:
-            doc_sections = []
-            for doc in docs[:3]:
-                if 'content' in doc and 'source' in doc:
-                    source = doc['source']
-                    content = doc['content'][:2000]
-                    doc_sections.append("=== {} ===\n{}".format(source.upper(), content))
-            
-            if doc_sections:
-                documentation_context = "\n\n".join(doc_sections)
+    def generate(race_model, race_on_token, timings, token):
+        return generate_response(query, context_data, race_model, race_on_token, config, timings,
+                                 token, on_retry, limit)
     
-    prompt = """You are an expert Revit API assistant. Generate IronPython 2.7 compatible code for pyRevit.
+    race = Race(generate, model.lower(), secondary, tracker.hedge_delay(model, settings), on_token, tracker, token)
+    return race.run()
 
-{}
+def response_key(model, query, context_data, config):
+    """Response cache key for `query` answered by `model` with this documentation"""
+    documentation_context = format_documentation(context_data, get_token_budget(config, model))
+    return make_key(model, query, fingerprint(documentation_context))
 
-STANDARD BOILERPLATE (always include):
-{}
+def forget_response(cache_key, config=None):
+    """Drop a cached response that proved broken (blocking pre-flight issues, failed dry run or execution)"""
+    if not cache_key:
+        return
+    cache = ResponseCache.from_config(config or load_config())
+    if cache is not None:
+        cache.discard(cache_key)
 
-REVIT API DOCUMENTATION:
-{}
+def get_ai_response(query, context_data, model="claude", info=None, on_token=None, config=None, race=None,
+                    token=None, on_retry=None, use_cache=True, limit=None):
+    """Get response from selected AI model with enhanced .NET rules
+    
+    Responses are served from the on-disk cache when the same model, normalized
+    query and packed documentation were seen before. When `on_token` is given
+    and 'stream_responses' is enabled, text fragments are streamed to it. If
+    an `info` dict is passed it receives 'cached' (bool), 'elapsed' and, for
+    streamed responses, 'first_token' (seconds); when the provider reports
+    prompt caching it also receives 'prompt_cache' (see providers.cache_report).
+    'response_cache' is 'hit', 'miss', 'skipped' or 'off', 'cache_lookup' the
+    seconds spent checking it, 'cache_key' the entry the response is stored
+    under (pass it to forget_response when the script turns out broken) and
+    'response_tokens' the estimated response size.
+    
+    `use_cache=False` regenerates: the cached response is ignored and
+    replaced by the new one. Responses without a code block are not cached.
+    
+    With race mode on (`race`, or config 'race.enabled' when `race` is None)
+    the request is hedged with a secondary provider; `info` then also
+    receives 'winner', 'hedged' and 'hedge_delay'.
+    
+    Failed requests are retried as described in generate_response; `token`
+    (a CancellationToken) interrupts retry waits. `limit(model, token)` is
+    called before every provider request, the secondary's included.
+    """
+    started = time.time()
+    config = config or load_config()
+    cache = ResponseCache.from_config(config)
+    
+    if cache is not None and use_cache:
+        cache_key = response_key(model, query, context_data, config)
+        response = cache.get(cache_key)
+        if response is not None:
+            if on_token is not None:
+                on_token(response)
+            if info is not None:
+                info.update({'cached': True, 'response_cache': 'hit', 'cache_key': cache_key,
+                             'response_tokens': estimate_tokens(response), 'elapsed': time.time() - started})
+            return response
+    cache_lookup = time.time() - started
+    
+    if not config.get('stream_responses', True):
+        on_token = None
+    
+    settings = race_settings(config)
+    secondary = secondary_model(model, settings)
+    if race is None:
+        race = settings.get('enabled')
+    
+    if race and secondary:
+        # Racing needs first-token times, so both contenders always stream
+        response, timings = race_response(query, context_data, model, secondary, on_token, config, settings,
+                                          token, on_retry, limit)
+    else:
+        timings = {}
+        response = generate_response(query, context_data, model, on_token, config, timings, token, on_retry,
+                                     limit)
+        if 'first_token' in timings:
+            get_tracker().record(model, timings['first_token'])
+    
+    cache_key = None
+    if cache is not None and has_code_block(response):
+        # A hedged request may have been answered by the secondary provider
+        winner = timings.get('winner', model).lower()
+        cache_key = response_key(winner, query, context_data, config)
+        try:
+            cache.put(cache_key, response, winner)
+        except (IOError, OSError):
+            cache_key = None
+    
+    if info is not None:
+        status = 'off' if cache is None else 'miss' if use_cache else 'skipped'
+        info.update(timings)
+        info.update({'cached': False, 'response_cache': status,
+                     'cache_key': cache_key, 'cache_lookup': cache_lookup,
+                     'response_tokens': estimate_tokens(response), 'elapsed': time.time() - started})
+    return response
 
-USER REQUEST: {}
+def batch_settings(config):
+    settings = dict(DEFAULT_BATCH_CONFIG)
+    settings.update(config.get('batch') or {})
+    return settings
 
-Generate working Revit Python code following the rules above. Use the standard boilerplate and ensure proper .NET imports.""".format(
-        NET_IMPORT_RULES,
-        REVIT_BOILERPLATE,
-        documentation_context if documentation_context else "No specific documentation loaded",
-        query
-    )
+class SharedContexts(object):
+    """Documentation looked up and packed once per intent, shared by every request with that intent
     
-    request_data = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"temperature": 0.2, "maxOutputTokens": 3000}
-    }
+    Requests that share an intent then also share a byte-identical prompt
+    prefix, which the provider's prompt cache serves.
+    """
     
-    headers = {"Content-Type": "application/json"}
-    data = json.dumps(request_data).encode('utf-8')
+    def __init__(self, lookup, token_budget):
+        self.lookup = lookup
+        self.token_budget = token_budget
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.lookups = 0
     
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent?key={}".format(api_key)
-    req = urllib_request.Request(url, data, headers)
+    def get(self, intent, text):
+        with self.lock:
+            entry = self.entries.get(intent)
+            owner = entry is None
+            if owner:
+                entry = self.entries[intent] = {'ready': threading.Event(), 'context': None, 'error': None}
+        if owner:
+            try:
+                context = self.lookup(text)
+                docs, used = pack_context(context.get('documentation') or [], self.token_budget)
+                entry['context'] = dict(context, documentation=docs)
+                self.lookups += 1
+            except Exception as e:
+                entry['error'] = e
+            finally:
+                entry['ready'].set()
+        else:
+            entry['ready'].wait()
+        if entry['error'] is not None:
+            raise entry['error']
+        return entry['context']
+
+def batch_responses(requests, model="claude", config=None, concurrency=None, lookup=None, token=None,
+                    on_retry=None):
+    """Generate responses for many queries concurrently, yielding each result as it finishes
     
-    response = urllib_request.urlopen(req)
-    response_data = json.loads(response.read().decode('utf-8'))
+    `requests` are dicts with 'query' (the enhanced query) and either
+    'context' (from find_relevant_context) or 'lookup' (the text to retrieve
+    documentation for) plus an optional 'intent'; requests with the same
+    intent share one retrieval and one packed documentation block (see
+    SharedContexts). `lookup(text)` defaults to find_relevant_context.
     
-    return response_data['candidates'][0]['content']['parts'][0]['text']
-
-def get_ai_response(query, context_data, model="claude"):
-    """Get response from selected AI model with enhanced .NET rules"""
-    if model.lower() == "claude":
-        return get_claude_response(query, context_data)
-    else:
-        return get_gemini_response(query, context_data)
+    At most `concurrency` (config 'batch.concurrency') requests are in
+    flight, and 'batch.requests_per_minute' caps each provider's request
+    rate on top of the per-key governor, also for the secondary of a raced
+    request. The connection pool keeps one idle connection per worker
+    until the batch ends. Yields dicts with 'index',
+    'query', 'response' (None on failure), 'error' and 'info' (as filled by
+    get_ai_response), in completion order.
+    """
+    config = config or load_config()
+    settings = batch_settings(config)
+    concurrency = int(concurrency or settings['concurrency'])
+    contexts = SharedContexts(lookup or find_relevant_context, get_token_budget(config, model))
+    
+    buckets = {}
+    for name, per_minute in (settings['requests_per_minute'] or {}).items():
+        if float(per_minute or 0) > 0:
+            buckets[name.lower()] = TokenBucket(float(per_minute) / 60.0, int(settings['burst']))
+    
+    def limit(provider_name, request_token):
+        bucket = buckets.get(provider_name)
+        if bucket is None:
+            return
+        wait = bucket.reserve()
+        if request_token is None:
+            time.sleep(wait)
+        elif request_token.wait(wait):
+            raise OperationCancelled("Operation cancelled")
+    
+    def work(item):
+        index, request = item
+        context = request.get('context')
+        if context is None:
+            text = request.get('lookup') or request['query']
+            context = contexts.get(request.get('intent', text), text)
+        info = {}
+        response = get_ai_response(request['query'], context, model, info=info, config=config, token=token,
+                                   on_retry=on_retry, limit=limit)
+        return response, info
+    
+    # One idle connection per worker, so finished requests hand theirs on
+    release = get_pool(config).hold_idle(concurrency)
+    try:
+        for (index, request), result, error in run_concurrently(work, enumerate(requests), concurrency, token):
+            response, info = result if error is None else (None, {})
+            yield {'index': index, 'query': request['query'], 'response': response, 'error': error,
+                   'info': info}
+    finally:
+        release()
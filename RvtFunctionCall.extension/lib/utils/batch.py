@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Headless batch runner for the generation pipeline
+
+Runs understand_and_formulate_tasks -> route_files -> find_relevant_context
+-> get_ai_response -> code extraction for every query in a JSONL file,
+keeping a bounded number of queries in flight, and writes one JSONL result
+per query as it completes, with per-stage timings. Nothing here needs Revit: use the
+replay provider, or point claude_api_url / gemini_api_url at a stand-in
+server (benchmarks/standin_server.py).
+
+Usage (from RvtFunctionCall.extension/lib):
+    python -m utils.batch queries.jsonl [-o results.jsonl] [--model replay]
+        [--concurrency 4] [--config config.json] [--no-cache] [--include-response]
+
+Input lines are {"query": "...", "id": ...} objects or bare JSON strings.
+"""
+import argparse
+import io
+import json
+import sys
+import time
+
+from .agent_loop import extract_code
+from .ai_client import build_prompt, get_ai_response
+from .config import load_config
+from .context_packer import get_token_budget
+from .docs_corpus import estimate_tokens
+from .docs_index import get_index
+from .docs_lookup import find_relevant_context
+from .docs_router import get_routes, route_files
+from .intent_classifier import get_classifier, max_docs_for
+from .task_agent import formulate_enhanced_query, understand_and_formulate_tasks
+from .worker import run_concurrently
+
+
+def read_queries(lines):
+    """Return [(index, id, query)] from JSONL lines, skipping blanks"""
+    items = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        entry = json.loads(line)
+        if not isinstance(entry, dict):
+            entry = {'query': entry}
+        items.append((len(items), entry.get('id', number), entry['query']))
+    return items
+
+
+def run_query(query, model, config, include_response=False):
+    """Run the pipeline for one query; returns the result record"""
+    timings = {}
+    record = {'query': query, 'model': model}
+    started = time.time()
+    try:
+        stage = time.time()
+        analysis = understand_and_formulate_tasks(query, config)
+        enhanced_query = formulate_enhanced_query(query, analysis)
+        timings['analyze'] = time.time() - stage
+        record['analysis'] = {
+            'primary_action': analysis['primary_action'],
+            'target_elements': analysis['target_elements'],
+            'parameters': sorted(analysis['parameters']),
+            'confidence': analysis['confidence']
+        }
+
+        stage = time.time()
+        # Retrieval uses the user's words, as the assistant does; the
+        # analysis boilerplate in the enhanced query would skew BM25
+        files, routes = route_files(query, analysis, config)
+        context = find_relevant_context(query, max_docs_for(analysis, config), files)
+        timings['retrieve'] = time.time() - stage
+        record['sources'] = [doc['source'] for doc in context['documentation']]
+        record['routing'] = {'files': files, 'routes': routes}
+
+        stage = time.time()
+        record['prompt_tokens'] = estimate_tokens(
+            build_prompt(enhanced_query, context, get_token_budget(config, model)).text)
+        timings['prompt'] = time.time() - stage
+
+        stage = time.time()
+        info = {}
+        response = get_ai_response(enhanced_query, context, model, info=info, config=config)
+        timings['generate'] = time.time() - stage
+        record['cached'] = info.get('cached', False)
+        if 'first_token' in info:
+            timings['first_token'] = info['first_token']
+        if info.get('prompt_cache'):
+            record['prompt_cache'] = info['prompt_cache']
+
+        stage = time.time()
+        code = extract_code(response)
+        timings['extract'] = time.time() - stage
+        record.update({'status': 'ok' if code else 'no_code', 'code': code})
+        if include_response:
+            record['response'] = response
+    except Exception as e:
+        record.update({'status': 'error', 'error': "{}: {}".format(type(e).__name__, e)})
+    timings['total'] = time.time() - started
+    record['timings_ms'] = dict((name, round(seconds * 1000.0, 2)) for name, seconds in timings.items())
+    return record
+
+
+def iter_results(items, model, config, concurrency=4, include_response=False):
+    """Yield result records as they complete, with at most `concurrency` queries in flight"""
+    # Load the documentation index, routing tables and intent classifier
+    # once instead of in every worker
+    get_index()
+    get_routes()
+    get_classifier()
+
+    def work(item):
+        return run_query(item[2], model, config, include_response)
+
+    for (index, query_id, query), record, error in run_concurrently(work, items, concurrency):
+        record.update({'index': index, 'id': query_id})
+        yield record
+
+
+def load_batch_config(path=None, model=None, no_cache=False):
+    if path:
+        with io.open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    else:
+        config = dict(load_config())
+    if no_cache:
+        config['response_cache'] = dict(config.get('response_cache') or {}, enabled=False)
+    model = (model or config.get('default_model') or 'replay').lower()
+    return config, model
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m utils.batch', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('queries', help="JSONL file of queries ('-' for stdin)")
+    parser.add_argument('-o', '--output', default='-', help="JSONL results file (default: stdout)")
+    parser.add_argument('--model', help="Provider name: claude, gemini or replay (default: config default_model)")
+    parser.add_argument('--concurrency', type=int, default=4, help="Queries in flight (default: 4)")
+    parser.add_argument('--config', help="Config JSON to use instead of the extension's config.json")
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the on-disk response cache")
+    parser.add_argument('--include-response', action='store_true', help="Also write the raw model response")
+    args = parser.parse_args(argv)
+
+    config, model = load_batch_config(args.config, args.model, args.no_cache)
+    if args.queries == '-':
+        items = read_queries(sys.stdin)
+    else:
+        with io.open(args.queries, 'r', encoding='utf-8') as f:
+            items = read_queries(f)
+
+    output = sys.stdout if args.output == '-' else io.open(args.output, 'w', encoding='utf-8')
+    started = time.time()
+    counts = {}
+    try:
+        for record in iter_results(items, model, config, args.concurrency, args.include_response):
+            output.write(u'{}\n'.format(json.dumps(record, sort_keys=True)))
+            output.flush()
+            counts[record['status']] = counts.get(record['status'], 0) + 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.time() - started
+    sys.stderr.write("{} queries in {:.2f} s ({:.1f}/s) with {} worker(s), model {}: {}\n".format(
+        len(items), elapsed, len(items) / elapsed if elapsed else 0.0, args.concurrency, model,
+        ", ".join("{} {}".format(count, status) for status, count in sorted(counts.items()))))
+    return 0 if not counts.get('error') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
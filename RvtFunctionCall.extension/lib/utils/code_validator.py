@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+"""
+Offline pre-flight validation of generated scripts
+
+Catches the mistakes that otherwise only surface after Execute -> exception
+-> Review & Fix: syntax errors, imports that break IronPython
+(NET_IMPORT_RULES), Dynamo-only document access, doc/uidoc names that do not
+match the boilerplate, and unbalanced or missing Transactions. Mechanical
+problems are fixed locally; the rest become a targeted repair prompt.
+"""
+import ast
+import re
+
+DOC_ASSIGNMENT = "doc = __revit__.ActiveUIDocument.Document"
+UIDOC_ASSIGNMENT = "uidoc = __revit__.ActiveUIDocument"
+LIST_IMPORT = "from System.Collections.Generic import List"
+
+# Assemblies that must never be referenced explicitly (see NET_IMPORT_RULES)
+FORBIDDEN_REFERENCES = ('System.Collections.Generic', 'System.Collections')
+
+# Transaction-like classes and the calls that close them
+TRANSACTION_CLASSES = {
+    'Transaction': ('Commit', 'RollBack'),
+    'SubTransaction': ('Commit', 'RollBack'),
+    'TransactionGroup': ('Assimilate', 'Commit', 'RollBack')
+}
+# Modules whose Transaction wrappers start on entering 'with' and commit on
+# leaving it, e.g. pyRevit's revit.Transaction('Name')
+SELF_STARTING_MODULES = set(['revit'])
+
+# Calls whose effects a rolled-back TransactionGroup does not undo, so a dry
+# run would already perform them: dialogs, selection prompts and file or
+# document IO. None stands for any method of the receiver.
+DIALOG_METHODS = set(['Show', 'ShowDialog'])
+DIALOG_RECEIVERS = set(['forms', 'SelectFromList'])
+PROMPT_METHODS = set(['PickObject', 'PickObjects', 'PickElementsByRectangle', 'PickPoint', 'PickBox'])
+IO_FUNCTIONS = set(['open', 'file', 'StreamWriter', 'FileStream'])
+IO_METHODS = set(['Export', 'SaveAs', 'SubmitPrint'])
+IO_CALLS = {
+    'os': set(['remove', 'unlink', 'rename', 'replace', 'makedirs', 'mkdir', 'rmdir', 'system', 'startfile']),
+    'io': set(['open']),
+    'codecs': set(['open']),
+    'shutil': None,
+    'subprocess': None,
+    'File': set(['WriteAllText', 'WriteAllLines', 'WriteAllBytes', 'AppendAllText', 'AppendAllLines',
+                 'AppendText', 'Create', 'CreateText', 'Delete', 'Copy', 'Move']),
+    'Directory': set(['CreateDirectory', 'Delete', 'Move']),
+    'doc': set(['Save'])
+}
+
+# Calls that modify the model and need an open Transaction
+MODIFYING_METHODS = set([
+    'Delete', 'Regenerate', 'NewFamilyInstance', 'NewDimension', 'NewTag', 'NewRoom',
+    'SetValueString', 'ChangeTypeId', 'CopyElement', 'CopyElements', 'MoveElement',
+    'MoveElements', 'RotateElement', 'RotateElements', 'MirrorElements', 'CreateSchedule',
+    'CreateSheet', 'Duplicate'
+])
+# Static creation methods, e.g. Wall.Create(doc, ...) or ViewSheet.Create(doc, ...)
+CREATE_METHODS = set(['Create'])
+# Geometry constructors that do not touch the document
+GEOMETRY_CLASSES = set(['Line', 'Arc', 'XYZ', 'CurveLoop', 'Plane', 'Transform', 'Frame', 'Ellipse'])
+
+_DYNAMO_DOC = re.compile(r'DocumentManager\.Instance\.CurrentDBDocument')
+_DYNAMO_UIDOC = re.compile(r'DocumentManager\.Instance\.CurrentUIApplication\.ActiveUIDocument')
+_DYNAMO_IMPORT = re.compile(r'^\s*(from\s+RevitServices\b.*|import\s+RevitServices\b.*|'
+                            r'clr\.AddReference\(\s*[\'"]RevitServices[\'"]\s*\)\s*)$')
+
+
+def issue(rule, line, message, severity='error', fixable=False):
+    return {'rule': rule, 'line': line, 'message': message, 'severity': severity, 'fixable': fixable}
+
+
+def _call_name(node):
+    """Return (receiver, method) for a call like receiver.method(...) or (None, name)"""
+    func = node.func
+    if isinstance(func, ast.Attribute):
+        value = func.value
+        if isinstance(value, ast.Name):
+            return value.id, func.attr
+        if isinstance(value, ast.Attribute):
+            return value.attr, func.attr
+        return '', func.attr
+    if isinstance(func, ast.Name):
+        return None, func.id
+    return None, None
+
+
+def _transaction_call(node):
+    """Return (kind, self_starting) for Transaction(...), DB.Transaction(...) and the like, or None"""
+    if not isinstance(node, ast.Call):
+        return None
+    receiver, method = _call_name(node)
+    if method not in TRANSACTION_CLASSES:
+        return None
+    return method, receiver in SELF_STARTING_MODULES
+
+
+def _side_effect(receiver, method):
+    """'dialog', 'prompt' or 'io' for a call a rolled-back dry run would still make, else None"""
+    if method in DIALOG_METHODS or receiver in DIALOG_RECEIVERS:
+        return 'dialog'
+    if method in PROMPT_METHODS:
+        return 'prompt'
+    if receiver is None and method in IO_FUNCTIONS:
+        return 'io'
+    if method in IO_METHODS and receiver is not None:
+        return 'io'
+    if receiver in IO_CALLS and (IO_CALLS[receiver] is None or method in IO_CALLS[receiver]):
+        return 'io'
+    return None
+
+
+def _string_arg(node):
+    if not node.args:
+        return None
+    arg = node.args[0]
+    if hasattr(ast, 'Constant') and isinstance(arg, ast.Constant):
+        return arg.value if isinstance(arg.value, str) else None
+    return arg.s if isinstance(arg, ast.Str) else None
+
+
+def _with_items(node):
+    """(context_expr, optional_vars) pairs for Python 2 and 3 With nodes"""
+    if hasattr(node, 'items'):
+        return [(item.context_expr, item.optional_vars) for item in node.items]
+    return [(node.context_expr, node.optional_vars)]
+
+
+def _last_line(node):
+    return max([getattr(child, 'lineno', 0) for child in ast.walk(node)] or [0])
+
+
+def _dotted(node):
+    if isinstance(node, ast.Attribute):
+        base = _dotted(node.value)
+        return base + '.' + node.attr if base else None
+    if isinstance(node, ast.Name):
+        return node.id
+    return None
+
+
+class _Scanner(ast.NodeVisitor):
+    """Collect names, imports, transactions and modifying calls in one pass"""
+
+    def __init__(self):
+        self.bound = set()
+        self.used = {}
+        self.references = []
+        self.list_used = None
+        self.list_imported = False
+        self.document_aliases = []
+        self.transactions = {}
+        self.with_transactions = []
+        self.modifying_calls = []
+        self.side_effects = []
+        self.function_depth = 0
+
+    def visit_FunctionDef(self, node):
+        self.bound.add(node.name)
+        self.function_depth += 1
+        self.generic_visit(node)
+        self.function_depth -= 1
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.bound.add((alias.asname or alias.name).split('.')[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == '*':
+                continue
+            self.bound.add(alias.asname or alias.name)
+            if node.module == 'System.Collections.Generic' and alias.name == 'List':
+                self.list_imported = True
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.used.setdefault(node.id, node.lineno)
+        else:
+            # Store, Del and Python 2 function parameters (Param)
+            self.bound.add(node.id)
+
+    def visit_arg(self, node):
+        self.bound.add(node.arg)
+
+    def visit_Subscript(self, node):
+        if isinstance(node.value, ast.Name) and node.value.id == 'List' and self.list_used is None:
+            self.list_used = node.lineno
+        self.generic_visit(node)
+
+    def visit_Assign(self, node):
+        source = _dotted(node.value)
+        transaction = _transaction_call(node.value)
+        if transaction is not None:
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    self.transactions.setdefault(target.id, {
+                        'kind': transaction[0], 'line': node.lineno, 'starts': [], 'closes': []})
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                if source == '__revit__.ActiveUIDocument.Document' and target.id != 'doc':
+                    self.document_aliases.append((target.id, 'doc', node.lineno))
+                elif source == '__revit__.ActiveUIDocument' and target.id != 'uidoc':
+                    self.document_aliases.append((target.id, 'uidoc', node.lineno))
+        self.generic_visit(node)
+
+    def visit_With(self, node):
+        for context_expr, optional_vars in _with_items(node):
+            transaction = _transaction_call(context_expr)
+            if transaction is not None:
+                name = optional_vars.id if isinstance(optional_vars, ast.Name) else None
+                self.with_transactions.append((name, transaction[0], transaction[1], node))
+                if name is not None:
+                    self.transactions.setdefault(name, {
+                        'kind': transaction[0], 'line': node.lineno, 'starts': [], 'closes': []})
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        receiver, method = _call_name(node)
+        if receiver == 'clr' and method == 'AddReference':
+            self.references.append((_string_arg(node), node.lineno))
+        if receiver in self.transactions:
+            record = self.transactions[receiver]
+            if method == 'Start':
+                record['starts'].append(node.lineno)
+            elif method in TRANSACTION_CLASSES[record['kind']]:
+                record['closes'].append(node.lineno)
+        if self.function_depth == 0 and self._modifies(receiver, method, node):
+            self.modifying_calls.append((method, node.lineno))
+        kind = _side_effect(receiver, method)
+        if kind is not None:
+            self.side_effects.append({'kind': kind, 'call': '.'.join(filter(None, (receiver, method))),
+                                      'line': node.lineno})
+        self.generic_visit(node)
+
+    def _modifies(self, receiver, method, node):
+        if method in MODIFYING_METHODS:
+            return receiver not in (None, 'Selection')
+        if method in CREATE_METHODS:
+            # doc.Create.NewX(...) is covered above; Class.Create(doc, ...) modifies
+            return receiver not in GEOMETRY_CLASSES and receiver is not None and bool(node.args)
+        if method == 'Set' and len(node.args) == 1:
+            return receiver is not None
+        return False
+
+
+def validate_code(code):
+    """Return a list of issue dicts (rule, line, message, severity, fixable), sorted by line"""
+    issues = []
+    for number, line in enumerate(code.splitlines(), 1):
+        if _DYNAMO_DOC.search(line) or _DYNAMO_UIDOC.search(line) or _DYNAMO_IMPORT.match(line):
+            issues.append(issue('dynamo_api', number,
+                                "Dynamo's RevitServices/DocumentManager is not available in pyRevit; "
+                                "use the __revit__ boilerplate", fixable=True))
+        elif 'TransactionManager.Instance' in line:
+            issues.append(issue('dynamo_api', number,
+                                "Dynamo's TransactionManager is not available; use Transaction(doc, 'Name')"))
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        issues.append(issue('syntax', e.lineno or 0, "Syntax error: {}".format(e.msg)))
+        return sorted(issues, key=lambda item: item['line'])
+
+    scanner = _Scanner()
+    scanner.visit(tree)
+
+    for reference, line in scanner.references:
+        if reference in FORBIDDEN_REFERENCES:
+            issues.append(issue('forbidden_reference', line,
+                                "clr.AddReference('{}') fails in IronPython; import the types directly".format(reference),
+                                fixable=True))
+
+    if scanner.list_used is not None and not scanner.list_imported:
+        issues.append(issue('missing_list_import', scanner.list_used,
+                            "List[...] is used without '{}'".format(LIST_IMPORT), fixable=True))
+
+    for name, line in (('doc', scanner.used.get('doc')), ('uidoc', scanner.used.get('uidoc'))):
+        if line is not None and name not in scanner.bound:
+            issues.append(issue('undefined_' + name, line,
+                                "'{}' is used but never assigned; the boilerplate defines it".format(name),
+                                fixable=True))
+    for alias, expected, line in scanner.document_aliases:
+        issues.append(issue('document_alias', line,
+                            "'{}' holds the active {} but the boilerplate names it '{}'".format(
+                                alias, 'document' if expected == 'doc' else 'UI document', expected),
+                            severity='warning'))
+
+    for name, transaction_type, self_starting, node in scanner.with_transactions:
+        if self_starting:
+            continue
+        record = scanner.transactions.get(name)
+        if record is None or not record['starts']:
+            issues.append(issue('transaction_not_started', node.lineno,
+                                "'with {}(...)' does not start it; call {}.Start() first".format(
+                                    transaction_type, name or 't')))
+        elif not record['closes']:
+            issues.append(issue('transaction_unbalanced', node.lineno,
+                                "{} '{}' is started but never committed, so its changes are rolled back".format(
+                                    transaction_type, name)))
+    with_names = set(item[0] for item in scanner.with_transactions)
+    for name, record in sorted(scanner.transactions.items(), key=lambda item: item[1]['line']):
+        if name in with_names:
+            continue
+        if record['starts'] and not record['closes']:
+            issues.append(issue('transaction_unbalanced', record['starts'][0],
+                                "{} '{}' is started but never committed or rolled back".format(record['kind'], name)))
+        elif record['closes'] and not record['starts']:
+            issues.append(issue('transaction_unbalanced', record['closes'][0],
+                                "{} '{}' is committed but never started".format(record['kind'], name)))
+        elif len(record['starts']) > len(record['closes']) and len(record['starts']) > 1:
+            issues.append(issue('transaction_unbalanced', record['starts'][-1],
+                                "{} '{}' is started {} times but closed {} times".format(
+                                    record['kind'], name, len(record['starts']), len(record['closes'])),
+                                severity='warning'))
+
+    ranges = []
+    for name, transaction_type, self_starting, node in scanner.with_transactions:
+        if transaction_type != 'TransactionGroup':
+            ranges.append((node.lineno, _last_line(node)))
+    for name, record in scanner.transactions.items():
+        if record['kind'] != 'TransactionGroup' and record['starts']:
+            ranges.append((min(record['starts']), max(record['closes'] or [_last_line(tree)])))
+    for method, line in scanner.modifying_calls:
+        if not any(start <= line <= end for start, end in ranges):
+            issues.append(issue('missing_transaction', line,
+                                "{}() modifies the model outside a started Transaction".format(method)))
+            break
+
+    return sorted(issues, key=lambda item: item['line'])
+
+
+def side_effects(code):
+    """Calls that rolling back a dry run would not undo, as {'kind', 'call', 'line'}
+
+    'kind' is 'dialog' (TaskDialog.Show, pyRevit forms), 'prompt'
+    (Selection.PickObject and the like) or 'io' (files, doc.Save, Export).
+    Code that does not parse has none; the pre-flight reports it instead.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    scanner = _Scanner()
+    scanner.visit(tree)
+    return scanner.side_effects
+
+
+def blocking(issues):
+    """Issues that would make the script fail or misbehave"""
+    return [item for item in issues if item['severity'] == 'error']
+
+
+def format_issues(issues):
+    return "\n".join("- line {}: {}".format(item['line'], item['message']) for item in issues)
+
+
+def _insert_after_imports(lines, new_lines):
+    """Insert lines after the leading import/clr block"""
+    position = 0
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith(('import ', 'from ', 'clr.')) and not line.startswith((' ', '\t')):
+            position = index + 1
+        elif stripped and not stripped.startswith('#') and position:
+            break
+    return lines[:position] + new_lines + lines[position:]
+
+
+def autofix(code, issues=None):
+    """Apply local fixes for fixable issues; returns (code, applied rules)"""
+    issues = validate_code(code) if issues is None else issues
+    rules = set(item['rule'] for item in issues if item['fixable'])
+    if not rules:
+        return code, []
+
+    lines = code.splitlines()
+    applied = []
+    if 'dynamo_api' in rules:
+        fixed = []
+        for line in lines:
+            if _DYNAMO_IMPORT.match(line):
+                continue
+            line = _DYNAMO_UIDOC.sub('__revit__.ActiveUIDocument', line)
+            fixed.append(_DYNAMO_DOC.sub('__revit__.ActiveUIDocument.Document', line))
+        lines = fixed
+        applied.append('dynamo_api')
+    if 'forbidden_reference' in rules:
+        pattern = re.compile(r'^\s*clr\.AddReference\(\s*[\'"]({})[\'"]\s*\)\s*$'.format(
+            '|'.join(re.escape(reference) for reference in FORBIDDEN_REFERENCES)))
+        lines = [line for line in lines if not pattern.match(line)]
+        applied.append('forbidden_reference')
+
+    missing = []
+    if 'missing_list_import' in rules:
+        missing.append(LIST_IMPORT)
+        applied.append('missing_list_import')
+    if 'undefined_doc' in rules or 'undefined_uidoc' in rules:
+        # Keep the boilerplate order even if only one of them was missing
+        if 'undefined_doc' in rules:
+            missing.append(DOC_ASSIGNMENT)
+            applied.append('undefined_doc')
+        if 'undefined_uidoc' in rules:
+            missing.append(UIDOC_ASSIGNMENT)
+            applied.append('undefined_uidoc')
+    if missing:
+        lines = _insert_after_imports(lines, missing)
+
+    return "\n".join(lines), applied
+
+
+def preflight(code):
+    """Validate, auto-fix what can be fixed locally and re-validate
+
+    Returns (code, applied_fixes, remaining_issues).
+    """
+    issues = validate_code(code)
+    fixed, applied = autofix(code, issues)
+    return fixed, applied, validate_code(fixed) if applied else issues
+
+
+def repair_prompt(query, code, issues):
+    """Targeted fix request listing only the pre-flight problems"""
+    return """ORIGINAL TASK: {}
+
+CURRENT CODE:
+```python
+{}
+```
+
+PRE-FLIGHT CHECK FAILED (static analysis, the code was not run):
+{}
+
+TASK: Fix exactly these problems and change nothing else. Return the complete corrected IronPython 2.7 script.""".format(
+        query, code, format_issues(issues))
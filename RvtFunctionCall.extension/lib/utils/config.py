@@ -7,12 +7,109 @@ import json
 
 # Default configuration
 DEFAULT_CONFIG = {
-    'default_model': 'claude',  # Options: 'claude', 'gemini'
+    'default_model': 'claude',  # Options: 'claude', 'gemini', 'replay'
     'claude_api_key': '',       # Your Claude API key
     'gemini_api_key': '',       # Your Gemini API key
-    'max_docs': 5               # Maximum number of document sections to retrieve
+    'max_docs': 5,              # Maximum number of document sections to retrieve
+    'stream_responses': True,   # Stream generated code into the UI as it arrives
+    'intent_classifier': {      # Local model behind task analysis (lib/intent_model.json)
+        'enabled': True,
+        'min_confidence': 0.6,  # Below this the task counts as uncertain
+        'broad_max_docs': 10    # Document sections retrieved for uncertain tasks
+    },
+    'retrieval_routing': {      # Search only the docs files revit_api_docs/index.py maps the task to
+        'enabled': True
+    },
+    'preflight': {              # Static checks on generated code before it is shown as runnable
+        'enabled': True,
+        'auto_repair': True     # Send remaining issues back to the model once, automatically
+    },
+    'agent_loop': {             # "Auto-fix loop": generate, check and repair without clicks
+        'enabled': False,       # Initial state of the checkbox
+        'max_iterations': 4,    # Generations per task, including the first
+        'token_budget': 30000,  # Estimated prompt + response tokens per task; 0 = unlimited
+        'dry_run': True         # Probe scripts that pass pre-flight in a rolled-back dry run
+    },
+    'perf_lint': {              # Flag slow Revit API patterns in generated code
+        'enabled': True
+    },
+    'context_token_budget': {   # Documentation tokens packed into each prompt, per model
+        'claude': 1200,
+        'gemini': 1200
+    },
+    'response_cache': {         # On-disk cache of AI responses
+        'enabled': True,
+        'max_entries': 500,
+        'max_mb': 20,
+        'max_age_days': 30
+    },
+    'semantic_cache': {         # Reuse scripts that ran successfully for similar queries
+        'enabled': True,
+        'threshold': 0.85,
+        'max_entries': 10000
+    },
+    'replay': {                 # Offline provider serving recorded responses
+        'recordings': '',       # Empty uses the bundled lib/replay_recordings.json
+        'first_token_ms': 400,
+        'tokens_per_second': 60,
+        'record': False         # Append live Claude/Gemini responses to the recordings
+    },
+    'race': {                   # Hedge slow requests with the other provider
+        'enabled': False,
+        'secondary': '',        # Empty races Claude against Gemini and vice versa
+        'hedge_delay_ms': 1500, # Until enough samples exist; then the primary's p95 first token
+        'percentile': 95,
+        'min_delay_ms': 250,
+        'max_delay_ms': 8000
+    },
+    'prompt_cache': {           # Claude cache_control on the rules/boilerplate/docs prefix
+        'enabled': True
+    },
+    'governor': {               # Retries and client-side rate limiting for API calls
+        'max_retries': 4,       # For 429, 529, 5xx and dropped connections
+        'base_delay_ms': 500,   # Full-jitter exponential backoff unless Retry-After is sent
+        'max_delay_ms': 30000,
+        'requests_per_minute': 0, # Per API key, shared by every request from this machine; 0 = unlimited
+        'burst': 5
+    },
+    'batch': {                  # ai_client.batch_responses (pre-generating many scripts)
+        'concurrency': 8,
+        'requests_per_minute': {}, # Per provider, e.g. {"claude": 50}; missing = unlimited
+        'burst': 5
+    },
+    'tracing': {                # Per-request stage timings; python -m utils.tracing summary
+        'enabled': True,
+        'directory': '',        # Empty uses cache/traces in the extension folder
+        'max_mb': 5,            # Rotate the trace file beyond this size
+        'backups': 3
+    },
+    'http_pool': {              # Keep-alive connections shared by both providers
+        'max_connections_per_host': 4,
+        'idle_timeout': 60,     # Seconds an idle connection is kept
+        'connect_timeout': 10,
+        'read_timeout': 120
+    }
 }
 
+def replace_file(source, target):
+    """Move `source` over `target`, atomically where the platform allows
+    
+    os.replace (Python 3) and os.rename on POSIX swap the file in one step.
+    IronPython 2.7 on Windows has neither, so there the target is removed
+    first and a concurrent reader can briefly find no file.
+    """
+    replace = getattr(os, 'replace', None)
+    if replace is not None:
+        replace(source, target)
+        return
+    try:
+        os.rename(source, target)
+    except OSError:
+        if not os.path.exists(source) or not os.path.exists(target):
+            raise
+        os.remove(target)
+        os.rename(source, target)
+
 def get_config_path():
     """Get the path to the configuration file"""
     # Config will be stored in the extension directory
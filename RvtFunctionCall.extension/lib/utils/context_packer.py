@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Token-budget-aware packing of documentation chunks into prompts
+"""
+from .docs_corpus import estimate_tokens
+
+# Default documentation budget per model, in estimated tokens
+DEFAULT_TOKEN_BUDGETS = {
+    'claude': 1200,
+    'gemini': 1200,
+    'replay': 1200
+}
+
+SECTION_TEMPLATE = "=== {} ===\n{}"
+
+
+def get_token_budget(config, model):
+    """Return the documentation token budget for a model from config"""
+    budgets = config.get('context_token_budget') or {}
+    if isinstance(budgets, dict):
+        budget = budgets.get(model.lower(), DEFAULT_TOKEN_BUDGETS.get(model.lower()))
+    else:
+        budget = budgets
+    return int(budget or DEFAULT_TOKEN_BUDGETS['claude'])
+
+
+def _section(doc):
+    return SECTION_TEMPLATE.format(doc['source'].upper(), doc['content'])
+
+
+def pack_context(docs, token_budget):
+    """Select whole chunks greedily by relevance per token until the budget is full
+
+    Chunks are never truncated, so code examples always arrive intact; a chunk
+    that does not fit is skipped in favour of smaller ones. The selection is
+    returned in the original ranking order along with the tokens it uses.
+    """
+    candidates = []
+    for rank, doc in enumerate(docs):
+        if 'content' not in doc or 'source' not in doc:
+            continue
+        tokens = estimate_tokens(_section(doc))
+        # Unscored docs (e.g. fallback patterns) rank by position instead
+        score = doc.get('score', 1.0 / (rank + 1))
+        candidates.append((score / max(tokens, 1), rank, tokens, doc))
+
+    selected = []
+    used = 0
+    for density, rank, tokens, doc in sorted(candidates, key=lambda item: (-item[0], item[1])):
+        if used + tokens <= token_budget:
+            selected.append((rank, doc))
+            used += tokens
+
+    selected.sort(key=lambda item: item[0])
+    return [doc for rank, doc in selected], used
+
+
+def format_documentation(context_data, token_budget):
+    """Render the packed documentation block for a prompt"""
+    if not context_data or not isinstance(context_data, dict):
+        return ""
+    docs, used = pack_context(context_data.get('documentation') or [], token_budget)
+    return "\n\n".join(_section(doc) for doc in docs)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Precompiled documentation corpus for the revit_api_docs package
+
+The corpus is a single JSON artifact holding pre-chunked text, token counts,
+BM25 term postings and the literal dict tables (LIBRARY_STRUCTURE,
+WORKFLOW_INDEX, SELECTION_ACCESS, ...) of every documentation module. It is
+rebuilt when the hash of a source file changes, or when the code that
+builds it (the chunker, tokenizer and stemmer in docs_index.py, or this
+module) changes.
+
+Build manually from the lib directory with:
+    python -m utils.docs_corpus [--force]
+"""
+import ast
+import hashlib
+import io
+import json
+import os
+import sys
+
+from . import docs_index
+from .config import replace_file
+from .docs_index import DOCS_DIR, BM25Index, chunk_module, iter_doc_files
+
+CORPUS_VERSION = 1
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'revit_api_docs_corpus.json')
+
+# Rough characters-per-token ratio shared by Claude and Gemini tokenizers on code
+CHARS_PER_TOKEN = 4
+
+_CORPUS = None
+_BUILDER_HASH = None
+
+
+def estimate_tokens(text):
+    """Estimate the model token count of a piece of text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _source_path(module_file):
+    """The .py source of a module, even when it was imported from bytecode"""
+    return os.path.splitext(module_file)[0] + '.py'
+
+
+def builder_hash():
+    """Hash of the modules whose code determines chunks, postings and lengths"""
+    global _BUILDER_HASH
+    if _BUILDER_HASH is None:
+        digest = hashlib.sha1()
+        for module_file in (docs_index.__file__, __file__):
+            try:
+                with open(_source_path(module_file), 'rb') as f:
+                    digest.update(f.read())
+            except (IOError, OSError):
+                # Bytecode-only install: fall back to CORPUS_VERSION alone
+                digest.update(os.path.basename(module_file).encode('utf-8'))
+        _BUILDER_HASH = digest.hexdigest()
+    return _BUILDER_HASH
+
+
+def _file_stat(path):
+    stat = os.stat(path)
+    return [int(stat.st_mtime), stat.st_size]
+
+
+def _extract_structures(text):
+    """Return the literal dict tables defined in a module, keyed by (Class.)NAME"""
+    structures = {}
+
+    def collect(body, prefix):
+        for node in body:
+            if isinstance(node, ast.ClassDef) and not prefix:
+                collect(node.body, node.name + '.')
+            elif isinstance(node, ast.Assign) and isinstance(node.value, ast.Dict) \
+                    and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+                try:
+                    structures[prefix + node.targets[0].id] = ast.literal_eval(node.value)
+                except ValueError:
+                    continue
+
+    collect(ast.parse(text).body, '')
+    return structures
+
+
+def build_corpus(docs_dir=DOCS_DIR):
+    """Parse every documentation module into the serializable corpus layout"""
+    files = {}
+    structures = {}
+    chunks = []
+    for relative_path, path in iter_doc_files(docs_dir):
+        with io.open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        files[relative_path] = {"sha1": _file_hash(path), "stat": _file_stat(path)}
+        try:
+            chunks.extend(chunk_module(relative_path, text))
+            structures[relative_path] = _extract_structures(text)
+        except SyntaxError:
+            continue
+
+    for chunk in chunks:
+        chunk["tokens"] = estimate_tokens(chunk["content"])
+    index = BM25Index(chunks)
+
+    return {
+        "version": CORPUS_VERSION,
+        "builder": builder_hash(),
+        "files": files,
+        "chunks": chunks,
+        "lengths": index.lengths,
+        "postings": index.postings,
+        "structures": structures
+    }
+
+
+def save_corpus(corpus, path=CORPUS_PATH):
+    """Write the corpus in compact JSON through a temporary file (see config.replace_file)"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(corpus, f, separators=(',', ':'), sort_keys=True)
+    replace_file(temp_path, path)
+
+
+def _read_corpus(path):
+    try:
+        with open(path, 'r') as f:
+            corpus = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(corpus, dict) or corpus.get("version") != CORPUS_VERSION:
+        return None
+    # Built by a different chunker/tokenizer: its postings and lengths are stale
+    if corpus.get("builder") != builder_hash():
+        return None
+    return corpus
+
+
+def check_sources(corpus, docs_dir=DOCS_DIR):
+    """Compare recorded file hashes with the documentation sources
+
+    Returns 'stale' when any source changed, 'refreshed' when only file stats
+    moved (e.g. a fresh checkout) and 'fresh' otherwise. Files whose mtime and
+    size are unchanged are trusted without rehashing.
+    """
+    recorded = corpus.get("files", {})
+    current = iter_doc_files(docs_dir)
+    if sorted(recorded) != [relative_path for relative_path, path in current]:
+        return 'stale'
+    status = 'fresh'
+    for relative_path, path in current:
+        entry = recorded[relative_path]
+        if entry.get("stat") == _file_stat(path):
+            continue
+        if entry.get("sha1") != _file_hash(path):
+            return 'stale'
+        entry["stat"] = _file_stat(path)
+        status = 'refreshed'
+    return status
+
+
+def load_corpus(path=CORPUS_PATH, docs_dir=DOCS_DIR):
+    """Return the session-wide corpus, rebuilding the artifact if a source changed"""
+    global _CORPUS
+    if _CORPUS is not None:
+        return _CORPUS
+
+    corpus = _read_corpus(path)
+    status = check_sources(corpus, docs_dir) if corpus is not None else 'stale'
+    if status == 'stale':
+        corpus = build_corpus(docs_dir)
+    if status != 'fresh':
+        try:
+            save_corpus(corpus, path)
+        except (IOError, OSError):
+            pass
+
+    _CORPUS = corpus
+    return _CORPUS
+
+
+def get_structure(module_path, name, default=None):
+    """Return a literal table from the corpus, e.g. ('index.py', 'WORKFLOW_INDEX')"""
+    return load_corpus()["structures"].get(module_path, {}).get(name, default)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    corpus = _read_corpus(CORPUS_PATH)
+    if '--force' in argv or corpus is None or check_sources(corpus) == 'stale':
+        corpus = build_corpus()
+        save_corpus(corpus)
+        print("Built corpus v{}: {} files, {} chunks, {} terms -> {}".format(
+            CORPUS_VERSION, len(corpus["files"]), len(corpus["chunks"]),
+            len(corpus["postings"]), CORPUS_PATH))
+    else:
+        print("Corpus is up to date: {}".format(CORPUS_PATH))
+
+
+if __name__ == '__main__':
+    main()
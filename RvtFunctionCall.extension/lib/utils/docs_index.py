@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Chunked BM25 search index over the revit_api_docs package
+"""
+import ast
+import io
+import math
+import os
+import re
+
+DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'revit_api_docs')
+
+# BM25 tuning constants
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Chunk titles are repeated so headings outweigh incidental mentions in bodies
+TITLE_WEIGHT = 3
+
+STOPWORDS = set([
+    'a', 'all', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'for',
+    'from', 'get', 'gets', 'how', 'i', 'in', 'into', 'is', 'it', 'me', 'my', 'of',
+    'on', 'or', 'set', 'sets', 'that', 'the', 'this', 'to', 'with', 'want', 'void',
+    'new', 'return', 'returns', 'true', 'false', 'none', 'null', 'string', 'var'
+])
+
+_WORD_PATTERN = re.compile(r'[A-Za-z][A-Za-z0-9]*|[0-9]+')
+_CAMEL_PATTERN = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+')
+_HEADING_PATTERN = re.compile(r'^#\s+(\S.*)$')
+
+_INDEX = None
+
+
+def _stem(word):
+    """Conflate common English suffixes so 'selected walls' matches 'selection of wall'"""
+    if len(word) > 4 and word.endswith('ies'):
+        word = word[:-3] + 'y'
+    elif len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+    for suffix in ('ing', 'ion', 'ed'):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            word = word[:-len(suffix)]
+            break
+    if len(word) > 3 and word.endswith('e'):
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Split text into lowercase search terms, expanding CamelCase identifiers"""
+    terms = []
+    for word in _WORD_PATTERN.findall(text):
+        parts = _CAMEL_PATTERN.findall(word)
+        candidates = [word] if len(parts) <= 1 else [word] + parts
+        for candidate in candidates:
+            term = _stem(candidate.lower())
+            if len(term) > 1 and term not in STOPWORDS:
+                terms.append(term)
+    return terms
+
+
+def _read_source(path):
+    with io.open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _statement_spans(body, lines, end_line):
+    """Yield (node, first_line, last_line) for consecutive statements, 1-based inclusive"""
+    for i, node in enumerate(body):
+        stop = body[i + 1].lineno - 1 if i + 1 < len(body) else end_line
+        # Leading comments of the next statement belong to that statement
+        while stop > node.lineno and (not lines[stop - 1].strip() or lines[stop - 1].lstrip().startswith('#')):
+            stop -= 1
+        yield node, node.lineno, stop
+
+
+def _leading_comment(lines, first_line):
+    """Return the '# HEADING' comment directly above a statement, if any"""
+    previous = first_line - 2
+    if previous >= 0 and lines[previous].lstrip().startswith('#'):
+        return lines[previous].strip().lstrip('#').strip()
+    return ''
+
+
+def _split_examples(text):
+    """Split an example string into '# Heading' delimited blocks, keeping each block whole"""
+    blocks = []
+    title = None
+    current = []
+    for line in text.strip('\n').split('\n'):
+        heading = _HEADING_PATTERN.match(line)
+        if heading and (not current or not current[-1].strip()):
+            if any(part.strip() for part in current):
+                blocks.append((title, '\n'.join(current).strip('\n')))
+            title = heading.group(1).strip()
+            current = [line]
+        else:
+            current.append(line)
+    if any(part.strip() for part in current):
+        blocks.append((title, '\n'.join(current).strip('\n')))
+    return blocks
+
+
+def _string_value(node):
+    """Return the literal string held by an expression node, or None"""
+    value = getattr(node, 's', None)
+    if value is None and hasattr(node, 'value') and not isinstance(node.value, ast.AST):
+        value = node.value
+    if isinstance(value, type(u'')) or isinstance(value, str):
+        return value
+    return None
+
+
+def _assign_name(node):
+    if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+        return node.targets[0].id
+    return None
+
+
+def chunk_module(relative_path, text):
+    """Split one documentation module into self-contained chunks"""
+    lines = text.split('\n')
+    tree = ast.parse(text)
+    body = list(tree.body)
+    module = relative_path[:-3] if relative_path.endswith('.py') else relative_path
+
+    # The module docstring is a header, not reference material
+    if body and isinstance(body[0], ast.Expr) and _string_value(body[0].value) is not None:
+        body = body[1:]
+
+    chunks = []
+
+    def add_chunk(title, content):
+        content = content.strip('\n')
+        if content.strip():
+            chunks.append({
+                "id": "{}::{}".format(module, title),
+                "file": relative_path,
+                "source": "{}: {}".format(module, title),
+                "content": content
+            })
+
+    for node, first, last in _statement_spans(body, lines, len(lines)):
+        if isinstance(node, ast.ClassDef):
+            members = list(node.body)
+            summary = ''
+            if members and isinstance(members[0], ast.Expr) and _string_value(members[0].value) is not None:
+                summary = _string_value(members[0].value).strip().split('\n')[0].strip()
+                members = members[1:]
+            for member, m_first, m_last in _statement_spans(members, lines, last):
+                name = _assign_name(member)
+                if not name:
+                    continue
+                body_text = '\n'.join(line[4:] if line.startswith('    ') else line
+                                      for line in lines[m_first - 1:m_last])
+                header = "# {} ({})".format(node.name, summary) if summary else "# {}".format(node.name)
+                add_chunk("{}.{}".format(node.name, name), header + '\n' + body_text)
+            continue
+
+        name = _assign_name(node)
+        if not name:
+            continue
+        example_text = _string_value(node.value)
+        if example_text is not None:
+            for position, (title, block) in enumerate(_split_examples(example_text)):
+                add_chunk("{} #{} {}".format(name, position + 1, title or '').strip(), block)
+        else:
+            heading = _leading_comment(lines, first)
+            segment = '\n'.join(lines[first - 1:last])
+            add_chunk(name, ("# {}\n".format(heading) if heading else '') + segment)
+
+    return chunks
+
+
+def iter_doc_files(docs_dir=DOCS_DIR):
+    """Yield (relative_path, absolute_path) for every documentation module, sorted"""
+    found = []
+    for root, dirs, files in os.walk(docs_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(('.', '__'))]
+        for name in files:
+            if name.endswith('.py') and not name.startswith('__'):
+                path = os.path.join(root, name)
+                found.append((os.path.relpath(path, docs_dir).replace(os.sep, '/'), path))
+    return sorted(found)
+
+
+def build_chunks(docs_dir=DOCS_DIR):
+    """Chunk every module under revit_api_docs"""
+    chunks = []
+    for relative_path, path in iter_doc_files(docs_dir):
+        try:
+            chunks.extend(chunk_module(relative_path, _read_source(path)))
+        except (IOError, OSError, SyntaxError):
+            continue
+    return chunks
+
+
+class BM25Index(object):
+    """Inverted index with Okapi BM25 ranking over documentation chunks"""
+
+    def __init__(self, chunks, postings=None, lengths=None):
+        self.chunks = chunks
+        if postings is None or lengths is None:
+            postings, lengths = self._invert(chunks)
+        self.postings = postings
+        self.lengths = lengths
+        self.average_length = float(sum(self.lengths)) / len(self.lengths) if self.lengths else 0.0
+        self._scopes = {}
+
+    @staticmethod
+    def _invert(chunks):
+        postings = {}
+        lengths = []
+        for position, chunk in enumerate(chunks):
+            terms = tokenize(chunk["source"]) * TITLE_WEIGHT + tokenize(chunk["content"])
+            lengths.append(len(terms))
+            frequencies = {}
+            for term in terms:
+                frequencies[term] = frequencies.get(term, 0) + 1
+            for term in sorted(frequencies):
+                postings.setdefault(term, []).append((position, frequencies[term]))
+        return postings, lengths
+
+    def idf(self, term):
+        document_count = len(self.postings.get(term, ()))
+        total = len(self.chunks)
+        return math.log(1.0 + (total - document_count + 0.5) / (document_count + 0.5))
+
+    def scope(self, files):
+        """Chunk positions belonging to `files`, cached per file set"""
+        key = frozenset(files)
+        positions = self._scopes.get(key)
+        if positions is None:
+            positions = self._scopes[key] = frozenset(
+                position for position, chunk in enumerate(self.chunks) if chunk["file"] in key)
+        return positions
+
+    def search(self, query, limit=5, files=None):
+        """Return up to `limit` (score, chunk) pairs ranked by BM25 relevance
+
+        With `files` (paths relative to revit_api_docs) only chunks of those
+        files are scored; term statistics stay corpus-wide, so a scoped
+        search ranks its chunks exactly as the full search would.
+        """
+        positions = None if files is None else self.scope(files)
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for position, count in postings:
+                if positions is not None and position not in positions:
+                    continue
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.lengths[position] / self.average_length)
+                scores[position] = scores.get(position, 0.0) + idf * count * (BM25_K1 + 1.0) / (count + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(score, self.chunks[position]) for position, score in ranked[:limit]]
+
+
+def get_index():
+    """Return the session-wide index, loaded from the precompiled corpus"""
+    global _INDEX
+    if _INDEX is None:
+        from .docs_corpus import load_corpus
+        corpus = load_corpus()
+        _INDEX = BM25Index(corpus["chunks"], corpus["postings"], corpus["lengths"])
+    return _INDEX
@@ -2,87 +2,38 @@
 """
 Documentation lookup for Revit API
 """
-import os
+from .config import load_config
+from .docs_index import get_index
 
-def find_relevant_context(query):
-    """Return relevant Revit API context from documentation files"""
+def find_relevant_context(query, max_docs=None, files=None):
+    """Return the Revit API documentation chunks most relevant to the query
+    
+    `files` (from docs_router.route_files) limits the search to those
+    documentation files; when they hold fewer than `max_docs` matches the
+    rest come from the whole library.
+    """
     try:
-        current_dir = os.path.dirname(__file__)
-        lib_dir = os.path.dirname(current_dir)
-        docs_dir = os.path.join(lib_dir, 'revit_api_docs')
+        if max_docs is None:
+            max_docs = load_config().get('max_docs', 5)
         
         context = {
             "documentation": [],
             "patterns": {}
         }
         
-        quick_ref_path = os.path.join(docs_dir, 'quick_reference.py')
-        if os.path.exists(quick_ref_path):
-            try:
-                with open(quick_ref_path, 'r') as f:
-                    content = f.read()
-                    context["documentation"].append({
-                        "source": "quick_reference",
-                        "content": content
-                    })
-            except Exception:
-                pass
+        index = get_index()
+        results = index.search(query, max_docs, files)
+        if files is not None and len(results) < max_docs:
+            found = set(chunk["id"] for score, chunk in results)
+            results.extend([(score, chunk) for score, chunk in index.search(query, max_docs)
+                            if chunk["id"] not in found][:max_docs - len(results)])
         
-        core_dir = os.path.join(docs_dir, 'core')
-        if os.path.exists(core_dir):
-            document_path = os.path.join(core_dir, 'document.py')
-            if os.path.exists(document_path):
-                try:
-                    with open(document_path, 'r') as f:
-                        content = f.read()
-                        context["documentation"].append({
-                            "source": "core_document",
-                            "content": content
-                        })
-                except Exception:
-                    pass
-        
-        transactions_dir = os.path.join(docs_dir, 'transactions')
-        if os.path.exists(transactions_dir):
-            basic_trans_path = os.path.join(transactions_dir, 'basic_transactions.py')
-            if os.path.exists(basic_trans_path):
-                try:
-                    with open(basic_trans_path, 'r') as f:
-                        content = f.read()
-                        context["documentation"].append({
-                            "source": "basic_transactions",
-                            "content": content
-                        })
-                except Exception:
-                    pass
-        
-        selection_dir = os.path.join(docs_dir, 'selection')
-        if os.path.exists(selection_dir):
-            selection_path = os.path.join(selection_dir, 'selection.py')
-            if os.path.exists(selection_path):
-                try:
-                    with open(selection_path, 'r') as f:
-                        content = f.read()
-                        context["documentation"].append({
-                            "source": "selection_patterns",
-                            "content": content
-                        })
-                except Exception:
-                    pass
-        
-        elements_dir = os.path.join(docs_dir, 'elements')
-        if os.path.exists(elements_dir):
-            creation_path = os.path.join(elements_dir, 'creation.py')
-            if os.path.exists(creation_path):
-                try:
-                    with open(creation_path, 'r') as f:
-                        content = f.read()
-                        context["documentation"].append({
-                            "source": "element_creation",
-                            "content": content
-                        })
-                except Exception:
-                    pass
+        for score, chunk in results:
+            context["documentation"].append({
+                "source": chunk["source"],
+                "content": chunk["content"],
+                "score": score
+            })
         
         if not context["documentation"]:
             context["documentation"].append({
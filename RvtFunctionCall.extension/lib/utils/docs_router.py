@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Routing of documentation searches through the revit_api_docs index tables
+
+revit_api_docs/index.py maps use cases to files. route_files() matches a
+task_agent analysis and the query's own words against those tables and
+returns the documentation files worth searching, so BM25 only scores their
+chunks:
+
+- a WORKFLOW_INDEX, FUNCTIONAL_CATEGORIES or QUICK_START_PATHS entry whose
+  name, use cases, capabilities or key classes share a topic word with the
+  query or its target elements ("schedule", "sheet", "takeoff", rooms ->
+  Room) contributes its primary and supporting files;
+- a quick-start path about elements in general ("I want to create
+  elements") follows the analysis' actions instead;
+- the analysis itself picks files by their LIBRARY_STRUCTURE description:
+  transactions for create/modify/delete, selection for collecting elements,
+  built-in parameters and categories when those are named;
+- the COMPLEXITY_LEVELS starting files are always searched.
+
+Action verbs, element kinds and parameter words are not topic words: the
+tables mention walls and doors everywhere, and task_agent already turned
+them into the analysis. Queries without a confident primary action are not
+routed and search every file.
+"""
+import re
+import threading
+
+from .docs_index import tokenize
+from .task_agent import ELEMENT_KEYWORDS, KEYWORDS, match_intents
+
+DEFAULT_ROUTING_CONFIG = {
+    'enabled': True
+}
+
+# task_agent vocabulary, the "I need ..." of the quick-start phrases and
+# "view", which queries mostly use for the active view as a search scope
+GENERIC_TERMS = set(term for word in list(KEYWORDS) + ['need', 'view'] for term in tokenize(word))
+# Key classes name element kinds outright (Room, Area), so those stay topics
+ELEMENT_TERMS = set(term for label, words in ELEMENT_KEYWORDS if label != 'elements'
+                    for word in words for term in tokenize(word))
+
+_PATH_PATTERN = re.compile(r'[\w/]+\.py')
+_NAME_PATTERN = re.compile(r"[A-Za-z0-9&'/]+")
+
+_ROUTES = None
+_ROUTES_LOCK = threading.Lock()
+
+
+def routing_settings(config):
+    settings = dict(DEFAULT_ROUTING_CONFIG)
+    settings.update((config or {}).get('retrieval_routing') or {})
+    return settings
+
+
+def _route(name, files, text, key_classes=()):
+    """One table entry: files plus the topic terms (or, failing those, the actions) that select them"""
+    topics = set(term for term in tokenize(' '.join(text)) if term not in GENERIC_TERMS)
+    topics.update(term for term in tokenize(' '.join(key_classes))
+                  if term not in GENERIC_TERMS or term in ELEMENT_TERMS)
+    actions = []
+    if not topics:
+        actions = [item['label'] for item in match_intents(' '.join(text)) if item['kind'] == 'action']
+    return {
+        'name': ' '.join(_NAME_PATTERN.findall(name)),
+        'files': list(files),
+        'topics': topics,
+        'actions': actions
+    }
+
+
+def _library_files(structure, folder=''):
+    """Yield (path, description) from the nested LIBRARY_STRUCTURE table"""
+    for name, value in sorted(structure.items()):
+        if isinstance(value, dict):
+            for item in _library_files(value, folder + name):
+                yield item
+        else:
+            yield folder + name, value
+
+
+class Routes(object):
+    """The index tables of revit_api_docs/index.py, prepared for matching"""
+
+    def __init__(self, tables):
+        self.routes = []
+        for name, entry in sorted((tables.get('WORKFLOW_INDEX') or {}).items()):
+            self.routes.append(_route(name, entry.get('primary_files', []) + entry.get('supporting_files', []),
+                                      [name] + entry.get('use_cases', []), entry.get('key_classes', [])))
+        for name, entry in sorted((tables.get('FUNCTIONAL_CATEGORIES') or {}).items()):
+            self.routes.append(_route(name, entry.get('files', []), [name] + entry.get('capabilities', [])))
+        for phrase, target in sorted((tables.get('QUICK_START_PATHS') or {}).items()):
+            self.routes.append(_route(phrase, _PATH_PATTERN.findall(target), [phrase]))
+
+        self.library = [(path, set(tokenize(description)))
+                        for path, description in _library_files(tables.get('LIBRARY_STRUCTURE') or {})]
+        self.base = []
+        for name, level in sorted((tables.get('COMPLEXITY_LEVELS') or {}).items()):
+            self.base.extend(path for path in level.get('recommended_start', []) if path not in self.base)
+
+    @classmethod
+    def from_corpus(cls):
+        from .docs_corpus import get_structure
+        names = ['WORKFLOW_INDEX', 'FUNCTIONAL_CATEGORIES', 'QUICK_START_PATHS', 'LIBRARY_STRUCTURE',
+                 'COMPLEXITY_LEVELS']
+        return cls(dict((name, get_structure('index.py', name)) for name in names))
+
+    def route(self, query, analysis):
+        """Return (files, route names) for a query and its task analysis"""
+        terms = set(tokenize(query))
+        terms.update(tokenize(' '.join(analysis.get('target_elements') or [])))
+        actions = set(analysis.get('actions') or []) | set([analysis.get('primary_action')])
+
+        files = list(self.base)
+        names = []
+        for route in self.routes:
+            if (route['topics'] & terms) or actions.intersection(route['actions']):
+                names.append(route['name'])
+                files.extend(path for path in route['files'] if path not in files)
+
+        facets = set(tokenize(' '.join(_facet_words(analysis))))
+        for path, description in self.library:
+            if description & facets and path not in files:
+                files.append(path)
+        return files, names
+
+
+def _facet_words(analysis):
+    """LIBRARY_STRUCTURE words for the kinds of documentation the analysis calls for"""
+    words = []
+    if analysis.get('requires_transaction'):
+        words.append('transaction')
+    if analysis.get('requires_selection') or analysis.get('primary_action') in ('select', 'analyze'):
+        words.append('selection')
+    if analysis.get('parameters'):
+        words.append('parameters')
+    if analysis.get('target_elements'):
+        words.append('categories')
+    return words
+
+
+def get_routes():
+    """The process-wide routing tables, read from the documentation corpus on first use"""
+    global _ROUTES
+    with _ROUTES_LOCK:
+        if _ROUTES is None:
+            _ROUTES = Routes.from_corpus()
+        return _ROUTES
+
+
+def route_files(query, analysis, config=None):
+    """Return (files to search, matched index entries) for a query, or (None, []) to search everything"""
+    if (not routing_settings(config)['enabled'] or not analysis
+            or not analysis.get('primary_action') or analysis.get('low_confidence')):
+        return None, []
+    return get_routes().route(query, analysis)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Dry-run execution of generated scripts
+
+The script runs inside an outer TransactionGroup that is always rolled back,
+so it can be probed against the live model without the user having to undo
+anything. Element changes are counted through Application.DocumentChanged,
+which reports each inner Transaction as it commits.
+
+When the document already has an open Transaction the script is not run:
+the scripts open their own Transactions, which Revit refuses inside another
+one, and a SubTransaction scope would fail every such script.
+
+The Revit classes are passed in rather than imported, so the module also
+runs outside Revit against mock documents.
+"""
+import sys
+import time
+import traceback
+
+from .exec_cache import compile_script
+
+DRY_RUN_NAME = "AI Assistant dry run"
+OPEN_TRANSACTION = "the document already has an open Transaction, so the script's own Transactions could not start"
+
+
+class DocumentChanges(object):
+    """DocumentChanged handler counting the element ids each commit reports"""
+
+    def __init__(self):
+        self.added = 0
+        self.modified = 0
+        self.deleted = 0
+
+    def __call__(self, sender, e):
+        self.added += len(e.GetAddedElementIds())
+        self.modified += len(e.GetModifiedElementIds())
+        self.deleted += len(e.GetDeletedElementIds())
+
+    @property
+    def touched(self):
+        return self.added + self.modified + self.deleted
+
+
+def describe_error(error, tb=None):
+    """'Type: message (line N)' with the line taken from the script's own frame"""
+    text = "{}: {}".format(type(error).__name__, error)
+    line = getattr(error, 'lineno', None) if isinstance(error, SyntaxError) else None
+    for frame in traceback.extract_tb(tb) if tb is not None else []:
+        if frame[0] == '<string>':
+            line = frame[1]
+    if line:
+        text += " (line {})".format(line)
+    return text
+
+
+def _close_open_transactions(exec_globals, names):
+    """Roll back Transactions the script left started in `names`; returns how many"""
+    closed = 0
+    for name in names:
+        value = exec_globals.get(name)
+        try:
+            if value.HasStarted() and not value.HasEnded():
+                value.RollBack()
+                closed += 1
+        except Exception:
+            continue
+    return closed
+
+
+def dry_run(code, exec_globals, transaction_group):
+    """Run `code` with `exec_globals` and roll back everything it changed
+
+    `exec_globals['doc']` is the target document and `transaction_group` the
+    TransactionGroup class. Returns a dict with 'ok', 'error' (message or
+    None), 'skipped' (why the script was not run, or None), 'elapsed'
+    (seconds spent in the script), 'added', 'modified', 'deleted',
+    'touched', 'scope' (the class used) and 'rolled_back'.
+    """
+    doc = exec_globals['doc']
+    if doc.IsModifiable:
+        return {'ok': True, 'error': None, 'skipped': OPEN_TRANSACTION, 'scope': None, 'rolled_back': False,
+                'elapsed': 0.0, 'added': 0, 'modified': 0, 'deleted': 0, 'touched': 0}
+    scope = transaction_group(doc, DRY_RUN_NAME)
+
+    changes = DocumentChanges()
+    application = getattr(doc, 'Application', None)
+    if application is not None:
+        application.DocumentChanged += changes
+
+    result = {'ok': True, 'error': None, 'skipped': None, 'scope': type(scope).__name__, 'rolled_back': False}
+    predefined = set(exec_globals)
+    scope.Start()
+    started = time.time()
+    try:
+        exec(compile_script(code), exec_globals)
+    except Exception as e:
+        result['ok'] = False
+        result['error'] = describe_error(e, sys.exc_info()[2])
+    finally:
+        result['elapsed'] = time.time() - started
+        if application is not None:
+            # Detach first so the rollback itself is not counted
+            application.DocumentChanged -= changes
+        if _close_open_transactions(exec_globals, set(exec_globals) - predefined) and result['ok']:
+            result['ok'] = False
+            result['error'] = "Script left a Transaction open (never committed or rolled back)"
+        try:
+            scope.RollBack()
+            result['rolled_back'] = True
+        except Exception as e:
+            # Usually a Transaction the script left open
+            result['ok'] = False
+            result['error'] = (result['error'] + "; " if result['error'] else "") + \
+                "dry run could not be rolled back: {}".format(e)
+
+    result.update({'added': changes.added, 'modified': changes.modified, 'deleted': changes.deleted,
+                   'touched': changes.touched})
+    return result
+
+
+def format_result(result):
+    """One-line summary of a dry run"""
+    if result['skipped']:
+        return "skipped - {}".format(result['skipped'])
+    changes = "{} added, {} modified, {} deleted".format(result['added'], result['modified'], result['deleted'])
+    if result['ok']:
+        return "passed in {:.0f} ms - {} (rolled back)".format(result['elapsed'] * 1000, changes)
+    return "failed after {:.0f} ms - {}\n{}".format(result['elapsed'] * 1000, changes, result['error'])
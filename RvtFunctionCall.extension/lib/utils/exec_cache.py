@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Reusable execution namespace and compiled-code cache for generated scripts
+
+Building the globals for a script means walking every name imported with
+`from Autodesk.Revit.DB import *` - thousands of .NET reflection lookups -
+and IronPython compilation of the script itself is not cheap either. Both
+are done once: the namespace is built on first use and frozen, each run gets
+a shallow copy with the current doc/uidoc, and compiled code objects are
+kept by source hash so re-running a script (Execute after Dry Run, or the
+agent loop) skips compilation.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+REVIT_DB_MODULE = 'Autodesk.Revit.DB'
+
+
+def module_names(module, module_name=REVIT_DB_MODULE):
+    """Names in `module` whose value was defined in `module_name`"""
+    names = {}
+    for name, value in list(vars(module).items()):
+        if getattr(value, '__module__', None) == module_name:
+            names[name] = value
+    return names
+
+
+class NamespaceTemplate(object):
+    """Globals built once by `build()` and handed out as shallow copies"""
+
+    def __init__(self, build):
+        self._build = build
+        self._frozen = None
+        self._lock = threading.Lock()
+
+    def fresh(self, **values):
+        """Return a new globals dict with `values` (e.g. doc, uidoc) set"""
+        with self._lock:
+            if self._frozen is None:
+                self._frozen = self._build()
+            namespace = dict(self._frozen)
+        namespace.update(values)
+        return namespace
+
+    def invalidate(self):
+        with self._lock:
+            self._frozen = None
+
+
+class CodeCache(object):
+    """LRU cache of compiled scripts keyed by the sha1 of their source"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def compile(self, source, filename='<string>'):
+        """Return the code object for `source`; SyntaxError propagates and is not cached"""
+        key = hashlib.sha1(u'{}\n{}'.format(filename, source).encode('utf-8')).hexdigest()
+        with self._lock:
+            code = self.entries.pop(key, None)
+            if code is not None:
+                self.entries[key] = code
+                self.hits += 1
+                return code
+        code = compile(source, filename, 'exec')
+        with self._lock:
+            self.misses += 1
+            self.entries[key] = code
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return code
+
+
+_CODE_CACHE = CodeCache()
+
+
+def compile_script(source, filename='<string>'):
+    """Compile a generated script through the process-wide code cache"""
+    return _CODE_CACHE.compile(source, filename)
+
+
+def get_code_cache():
+    return _CODE_CACHE
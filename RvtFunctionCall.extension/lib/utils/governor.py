@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Request governor: retries with backoff and client-side rate limiting
+
+Overloaded (529), rate-limited (429) and transient server errors are retried
+with full-jitter exponential backoff, honouring Retry-After when the API
+sends one. Every attempt first takes a token from a per-API-key bucket so
+several threads (or a team sharing one key) send a smooth request rate
+instead of bursts that the API rejects.
+"""
+import hashlib
+import random
+import re
+import socket
+import threading
+import time
+
+from .http_pool import HTTPStatusError
+from .streaming import TruncatedStream
+from .worker import OperationCancelled
+
+DEFAULT_GOVERNOR_CONFIG = {
+    'max_retries': 4,
+    'base_delay_ms': 500,
+    'max_delay_ms': 30000,
+    'requests_per_minute': 0,   # Per API key; 0 disables the client-side limiter
+    'burst': 5
+}
+
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504, 529)
+
+# Gemini reports the wait in the error body rather than a header
+_RETRY_DELAY_PATTERN = re.compile(r'"retryDelay"\s*:\s*"(\d+(?:\.\d+)?)s"')
+
+_BUCKETS = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+def governor_settings(config):
+    settings = dict(DEFAULT_GOVERNOR_CONFIG)
+    settings.update(config.get('governor') or {})
+    return settings
+
+
+def retry_after(error):
+    """Return the server-requested wait in seconds, or None"""
+    headers = getattr(error, 'headers', None) or {}
+    value = headers.get('retry-after')
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                from email.utils import mktime_tz, parsedate_tz
+                return max(mktime_tz(parsedate_tz(value)) - time.time(), 0.0)
+            except (TypeError, ValueError, OverflowError):
+                pass
+    match = _RETRY_DELAY_PATTERN.search(getattr(error, 'body', '') or '')
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def is_retryable(error):
+    if isinstance(error, HTTPStatusError):
+        return error.code in RETRY_STATUSES
+    # Refused/reset connections, timeouts, and streams cut off before their end
+    return isinstance(error, (socket.error, TruncatedStream))
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket refilled at `rate` tokens per second"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(max(capacity, 1))
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token and return how long the caller must wait before using it"""
+        with self.lock:
+            now = time.time()
+            self._refill(now)
+            self.tokens -= 1.0
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now, 0.0)
+
+    def pause(self, seconds):
+        """Hold every caller back, e.g. after the server asked us to slow down"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.time() + seconds)
+
+
+def get_bucket(api_key, settings):
+    """Return the shared bucket for an API key, or None when limiting is off"""
+    per_minute = float(settings['requests_per_minute'])
+    if per_minute <= 0:
+        return None
+    key = (hashlib.sha1(api_key.encode('utf-8')).hexdigest(), per_minute, int(settings['burst']))
+    with _BUCKETS_LOCK:
+        bucket = _BUCKETS.get(key)
+        if bucket is None:
+            bucket = _BUCKETS[key] = TokenBucket(per_minute / 60.0, int(settings['burst']))
+        return bucket
+
+
+def _sleep(seconds, token):
+    if seconds <= 0:
+        return
+    if token is not None:
+        if token.wait(seconds):
+            raise OperationCancelled("Operation cancelled")
+    else:
+        time.sleep(seconds)
+
+
+class Governor(object):
+    """Run provider calls under the retry policy and the per-key rate limit"""
+
+    def __init__(self, max_retries=4, base_delay=0.5, max_delay=30.0, bucket=None, rng=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.bucket = bucket
+        self.random = rng or random.Random()
+
+    @classmethod
+    def from_config(cls, config, api_key=''):
+        settings = governor_settings(config)
+        return cls(
+            int(settings['max_retries']),
+            float(settings['base_delay_ms']) / 1000.0,
+            float(settings['max_delay_ms']) / 1000.0,
+            get_bucket(api_key, settings) if api_key else None
+        )
+
+    def backoff(self, attempt, error=None):
+        """Seconds to wait before retry number `attempt` (0-based)"""
+        requested = retry_after(error) if error is not None else None
+        if requested is not None:
+            return min(requested, self.max_delay)
+        # Full jitter keeps clients that failed together from retrying together
+        return self.random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, send, token=None, on_retry=None):
+        """Return send(), retrying retryable failures
+
+        `send` may report that it already delivered output (and so must not be
+        repeated) by raising with an attribute `partial` set to True.
+        `on_retry(attempt, delay, error)` is called before each wait.
+        """
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                _sleep(self.bucket.reserve(), token)
+            if token is not None:
+                token.raise_if_cancelled()
+            try:
+                return send()
+            except Exception as e:
+                if attempt >= self.max_retries or getattr(e, 'partial', False) or not is_retryable(e):
+                    raise
+                delay = self.backoff(attempt, e)
+                if self.bucket is not None and getattr(e, 'code', None) == 429:
+                    self.bucket.pause(delay)
+                if on_retry is not None:
+                    on_retry(attempt + 1, delay, e)
+                _sleep(delay, token)
+                attempt += 1
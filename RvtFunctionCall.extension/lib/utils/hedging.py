@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Hedged requests: race a secondary provider against a slow primary
+
+The primary provider is asked first. If it has not produced its first token
+within the hedge delay (or fails outright), the same prompt is also sent to
+the secondary. The first response containing a usable code block wins and
+the other request is cancelled. The hedge delay follows a high percentile of
+the primary's recent first-token latency, so only its slow tail is hedged.
+"""
+import re
+import threading
+import time
+
+from .worker import CancellationToken, OperationCancelled
+
+DEFAULT_RACE_CONFIG = {
+    'enabled': False,
+    'secondary': '',            # Empty races Claude against Gemini and vice versa
+    'hedge_delay_ms': 1500,     # Used until enough latency samples exist
+    'percentile': 95,           # Hedge when the primary is slower than this percentile
+    'min_delay_ms': 250,
+    'max_delay_ms': 8000,
+    'min_samples': 5
+}
+
+CODE_BLOCK_PATTERN = re.compile(r'```(?:python)?\s*\n([\s\S]*?)\n```')
+
+_DEFAULT_SECONDARY = {'claude': 'gemini', 'gemini': 'claude'}
+
+
+def race_settings(config):
+    settings = dict(DEFAULT_RACE_CONFIG)
+    settings.update(config.get('race') or {})
+    return settings
+
+
+def secondary_model(model, settings):
+    """Return the provider to hedge `model` with, or None if racing is not possible"""
+    secondary = (settings.get('secondary') or _DEFAULT_SECONDARY.get(model.lower(), '')).lower()
+    if not secondary or secondary == model.lower():
+        return None
+    return secondary
+
+
+def has_code_block(text):
+    """True when a response contains a non-empty fenced code block"""
+    match = CODE_BLOCK_PATTERN.search(text or '')
+    return match is not None and bool(match.group(1).strip())
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    rank = int(round(pct / 100.0 * len(ordered) + 0.5)) - 1
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+class LatencyTracker(object):
+    """Rolling window of first-token latencies (seconds) per provider"""
+
+    def __init__(self, window=100):
+        self.window = window
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, model, seconds):
+        with self.lock:
+            samples = self.samples.setdefault(model.lower(), [])
+            samples.append(seconds)
+            if len(samples) > self.window:
+                del samples[0]
+
+    def percentile(self, model, pct):
+        with self.lock:
+            samples = list(self.samples.get(model.lower(), []))
+        return percentile(samples, pct)
+
+    def count(self, model):
+        with self.lock:
+            return len(self.samples.get(model.lower(), []))
+
+    def summary(self, model):
+        """Return {'count', 'p50', 'p95', 'p99'} for a provider"""
+        with self.lock:
+            samples = list(self.samples.get(model.lower(), []))
+        return {
+            'count': len(samples),
+            'p50': percentile(samples, 50),
+            'p95': percentile(samples, 95),
+            'p99': percentile(samples, 99)
+        }
+
+    def hedge_delay(self, model, settings):
+        """Seconds to wait for the primary's first token before hedging"""
+        delay = float(settings['hedge_delay_ms']) / 1000.0
+        if self.count(model) >= int(settings['min_samples']):
+            delay = self.percentile(model, float(settings['percentile']))
+        low = float(settings['min_delay_ms']) / 1000.0
+        high = float(settings['max_delay_ms']) / 1000.0
+        return min(max(delay, low), high)
+
+
+_TRACKER = LatencyTracker()
+
+
+def get_tracker():
+    """Return the process-wide latency tracker"""
+    return _TRACKER
+
+
+class _Contender(object):
+
+    def __init__(self, model):
+        self.model = model
+        self.token = CancellationToken()
+        self.started = None
+        self.first_token = None
+        self.result = None
+        self.error = None
+        self.done = False
+
+
+class Race(object):
+    """Run one hedged generation
+
+    `generate(model, on_token, timings, token)` must return the response text
+    and call `on_token` for every streamed fragment; a loser is stopped by
+    cancelling its `token` and raising OperationCancelled from its
+    `on_token`. Fragments from whichever provider streams first are forwarded
+    to the caller's `on_token`. Cancelling the caller's `token` stops both.
+    """
+
+    def __init__(self, generate, primary, secondary, hedge_delay, on_token=None, tracker=None, token=None):
+        self.generate = generate
+        self.contenders = [_Contender(primary)]
+        self.secondary = secondary
+        self.hedge_delay = hedge_delay
+        self.on_token = on_token
+        self.tracker = tracker
+        self.token = token
+        self.condition = threading.Condition()
+        self.leader = None
+        self.aborted = None
+        self.started = None
+
+    def _fragment(self, contender, text):
+        contender.token.raise_if_cancelled()
+        with self.condition:
+            if contender.first_token is None:
+                contender.first_token = time.time() - contender.started
+                self.condition.notify_all()
+            if self.leader is None:
+                self.leader = contender
+        if self.leader is contender and self.on_token is not None:
+            try:
+                self.on_token(text)
+            except Exception as e:
+                # The caller gave up (e.g. the user pressed Cancel): stop everyone
+                with self.condition:
+                    self.aborted = e
+                    self.condition.notify_all()
+                self._cancel_all()
+                raise
+
+    def _run(self, contender):
+        try:
+            contender.result = self.generate(contender.model, lambda text: self._fragment(contender, text), {},
+                                             contender.token)
+        except Exception as e:
+            contender.error = e
+        with self.condition:
+            contender.done = True
+            self.condition.notify_all()
+
+    def _start(self, model_or_contender):
+        contender = model_or_contender
+        if not isinstance(contender, _Contender):
+            contender = _Contender(model_or_contender)
+            self.contenders.append(contender)
+        contender.started = time.time()
+        thread = threading.Thread(target=self._run, args=(contender,))
+        thread.daemon = True
+        thread.start()
+
+    def _cancel_all(self):
+        for contender in self.contenders:
+            contender.token.cancel()
+
+    def _settling(self):
+        """True while nobody has aborted; notices caller cancellation (call with the lock held)"""
+        if self.aborted is None and self.token is not None and self.token.is_cancelled:
+            self.aborted = OperationCancelled("Operation cancelled")
+        return self.aborted is None
+
+    def _winner(self):
+        """Return the deciding contender once the race is settled, else None"""
+        for contender in self.contenders:
+            if contender.done and contender.error is None and has_code_block(contender.result):
+                return contender
+        if all(contender.done for contender in self.contenders):
+            for contender in self.contenders:
+                if contender.error is None:
+                    return contender
+            return self.contenders[0]
+        return None
+
+    def run(self):
+        """Return (response, info); info holds winner, hedged, hedge_delay and first_token"""
+        primary = self.contenders[0]
+        self.started = time.time()
+        self._start(primary)
+
+        deadline = self.started + self.hedge_delay
+        with self.condition:
+            while primary.first_token is None and not primary.done and self._settling():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(min(remaining, 0.1))
+            hedge = self.aborted is None and primary.first_token is None and (
+                not primary.done or primary.error is not None)
+
+        if hedge and self.secondary:
+            self._start(self.secondary)
+
+        with self.condition:
+            winner = self._winner()
+            while winner is None and self._settling():
+                self.condition.wait(0.1)
+                winner = self._winner()
+        self._cancel_all()
+        self._record()
+
+        if self.aborted is not None:
+            raise self.aborted
+        if winner.error is not None:
+            raise winner.error
+
+        info = {
+            'winner': winner.model,
+            'hedged': len(self.contenders) > 1,
+            'hedge_delay': self.hedge_delay
+        }
+        if winner.first_token is not None:
+            info['first_token'] = winner.started - self.started + winner.first_token
+        return winner.result, info
+
+    def _record(self):
+        if self.tracker is None:
+            return
+        now = time.time()
+        for contender in self.contenders:
+            if contender.first_token is not None:
+                self.tracker.record(contender.model, contender.first_token)
+            elif isinstance(contender.error, OperationCancelled) or not contender.done:
+                # Cancelled before its first token: the wait so far is a lower
+                # bound, and keeping it stops spikes vanishing from the tail
+                self.tracker.record(contender.model, now - contender.started)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Keep-alive HTTP(S) connection pool shared by the AI providers
+
+Connections are kept per (scheme, host, port) and reused across requests so
+only the first call to api.anthropic.com or generativelanguage.googleapis.com
+pays the TCP and TLS handshake. Idle connections older than the idle timeout
+are discarded; a reused connection that turns out to be closed by the server
+is transparently replaced once.
+"""
+import socket
+import threading
+import time
+
+try:
+    import http.client as http_client
+    from urllib.parse import urlsplit
+except ImportError:
+    import httplib as http_client
+    from urlparse import urlsplit
+
+DEFAULT_POOL_CONFIG = {
+    'max_connections_per_host': 4,
+    'idle_timeout': 60,
+    'connect_timeout': 10,
+    'read_timeout': 120
+}
+
+# Errors that mean a kept-alive connection went stale before the request was answered
+_STALE_ERRORS = (http_client.BadStatusLine, http_client.CannotSendRequest, socket.error)
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+class HTTPStatusError(Exception):
+    """Raised for non-2xx responses; carries status code, headers and body"""
+
+    def __init__(self, status, reason, headers, body):
+        Exception.__init__(self, "HTTP {} {}: {}".format(status, reason, body[:500]))
+        self.code = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+
+class PooledResponse(object):
+    """File-like response that returns its connection to the pool once fully read"""
+
+    def __init__(self, pool, key, connection, response):
+        self._pool = pool
+        self._key = key
+        self._connection = connection
+        self._response = response
+        self.status = response.status
+        self.headers = dict((name.lower(), value) for name, value in response.getheaders())
+
+    def read(self, amount=None):
+        data = self._response.read() if amount is None else self._response.read(amount)
+        if amount is None or not data:
+            self._release()
+        return data
+
+    def readline(self):
+        if hasattr(self._response, 'readline'):
+            line = self._response.readline()
+        else:
+            # Python 2 HTTPResponse has no readline; read byte by byte so
+            # server-sent events are delivered as soon as each line ends
+            chars = []
+            while True:
+                char = self._response.read(1)
+                if not char:
+                    break
+                chars.append(char)
+                if char == b'\n':
+                    break
+            line = b''.join(chars)
+        if not line:
+            self._release()
+        return line
+
+    def close(self):
+        """Finish with the response; unread bodies cost the connection"""
+        if self._connection is not None and not self._response.isclosed():
+            self._connection.close()
+            self._connection = None
+        self._release()
+
+    def _release(self):
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        if self._response.isclosed() and not self._response.will_close:
+            self._pool._put(self._key, connection)
+        else:
+            connection.close()
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of keep-alive HTTP(S) connections"""
+
+    def __init__(self, max_connections_per_host=4, idle_timeout=60, connect_timeout=10,
+                 read_timeout=120, ssl_context=None):
+        self.max_connections_per_host = max_connections_per_host
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.ssl_context = ssl_context
+        self.idle = {}
+        # Temporary idle limits requested through hold_idle()
+        self.idle_holds = []
+        self.lock = threading.Lock()
+        self.stats = {'connections_opened': 0, 'connections_reused': 0}
+
+    @classmethod
+    def from_config(cls, config):
+        settings = dict(DEFAULT_POOL_CONFIG)
+        settings.update(config.get('http_pool') or {})
+        return cls(
+            int(settings['max_connections_per_host']),
+            float(settings['idle_timeout']),
+            float(settings['connect_timeout']),
+            float(settings['read_timeout'])
+        )
+
+    def _connect(self, key):
+        scheme, host, port = key
+        if scheme == 'https':
+            if self.ssl_context is not None:
+                connection = http_client.HTTPSConnection(host, port, timeout=self.connect_timeout,
+                                                         context=self.ssl_context)
+            else:
+                connection = http_client.HTTPSConnection(host, port, timeout=self.connect_timeout)
+        else:
+            connection = http_client.HTTPConnection(host, port, timeout=self.connect_timeout)
+        connection.connect()
+        connection.sock.settimeout(self.read_timeout)
+        try:
+            # Headers and body go out in separate writes; without this, Nagle's
+            # algorithm and delayed ACKs add ~40 ms to every reused request
+            connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (AttributeError, socket.error):
+            pass
+        with self.lock:
+            self.stats['connections_opened'] += 1
+        return connection
+
+    def _get(self, key):
+        """Return (connection, reused) with an idle connection if a fresh one exists"""
+        now = time.time()
+        with self.lock:
+            idle = self.idle.get(key, [])
+            while idle:
+                connection, last_used = idle.pop()
+                if now - last_used <= self.idle_timeout:
+                    self.stats['connections_reused'] += 1
+                    return connection, True
+                connection.close()
+        return self._connect(key), False
+
+    def _idle_limit(self):
+        return max([self.max_connections_per_host] + self.idle_holds)
+
+    def hold_idle(self, count):
+        """Keep up to `count` idle connections per host until the returned release() is called
+
+        Lets a burst of concurrent requests hand their connections on to the
+        next request without raising the limit for the rest of the session.
+        """
+        with self.lock:
+            self.idle_holds.append(count)
+
+        def release():
+            surplus = []
+            with self.lock:
+                self.idle_holds.remove(count)
+                limit = self._idle_limit()
+                for idle in self.idle.values():
+                    # The oldest connections go first; _get reuses from the end
+                    while len(idle) > limit:
+                        surplus.append(idle.pop(0)[0])
+            for connection in surplus:
+                connection.close()
+        return release
+
+    def _put(self, key, connection):
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self._idle_limit():
+                idle.append((connection, time.time()))
+                return
+        connection.close()
+
+    def request(self, method, url, body=None, headers=None):
+        """Send a request and return a PooledResponse; raises HTTPStatusError for non-2xx"""
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        connection, reused = self._get(key)
+        try:
+            connection.request(method, path, body, headers or {})
+            response = connection.getresponse()
+        except _STALE_ERRORS as e:
+            connection.close()
+            if not reused or isinstance(e, socket.timeout):
+                raise
+            connection = self._connect(key)
+            connection.request(method, path, body, headers or {})
+            response = connection.getresponse()
+
+        pooled = PooledResponse(self, key, connection, response)
+        if not 200 <= response.status < 300:
+            error_body = pooled.read().decode('utf-8', 'replace')
+            raise HTTPStatusError(response.status, response.reason, pooled.headers, error_body)
+        return pooled
+
+    def close(self):
+        """Close every idle connection"""
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for connection, last_used in connections:
+                connection.close()
+
+
+def get_pool(config):
+    """Return the process-wide pool, created from config on first use"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ConnectionPool.from_config(config)
+        return _POOL
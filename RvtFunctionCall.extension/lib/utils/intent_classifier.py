@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Local intent classifier for task_agent
+
+Two multinomial logistic regressions over hashed word n-grams, trained in
+pure Python on the bundled lib/intent_training.jsonl:
+
+- the action model reads the whole query and predicts create, select,
+  modify, delete or analyze, with a softmax confidence;
+- the role model reads the words around an occurrence of "level", "floor"
+  or "family" and decides whether it names the element being acted on
+  ("delete the unused levels") or a parameter qualifying other elements
+  ("walls on level 2", "rooms on the third floor").
+
+The trained weights ship in lib/intent_model.json, which records the sha1
+of the training set it came from. Loading it takes a few milliseconds;
+training takes a quarter of a second on CPython and longer under IronPython.
+If the training set has changed since, the models are retrained in memory.
+Inference takes well under 1 ms. Low-confidence queries get more
+documentation (see max_docs_for).
+
+Regenerate the weights from the lib directory after editing the training set:
+    python -m utils.intent_classifier
+"""
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+
+from .config import replace_file
+
+LIB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRAINING_PATH = os.path.join(LIB_DIR, 'intent_training.jsonl')
+MODEL_PATH = os.path.join(LIB_DIR, 'intent_model.json')
+MODEL_VERSION = 1
+
+DEFAULT_INTENT_CONFIG = {
+    'enabled': True,
+    'min_confidence': 0.6,      # Below this the keyword match decides the action
+    'broad_max_docs': 10        # Documentation sections retrieved for low-confidence queries
+}
+
+BUCKETS = 1 << 12
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+_CLASSIFIER = None
+_CLASSIFIER_LOCK = threading.Lock()
+
+
+def intent_settings(config):
+    settings = dict(DEFAULT_INTENT_CONFIG)
+    settings.update((config or {}).get('intent_classifier') or {})
+    return settings
+
+
+def tokenize(text):
+    """Lowercase words with every number replaced by <num>"""
+    return ['<num>' if word.isdigit() else word for word in WORD_PATTERN.findall(text.lower())]
+
+
+def _fnv1a(text):
+    """32-bit FNV-1a; stable across processes, unlike hash()"""
+    value = 2166136261
+    for byte in bytearray(text.encode('utf-8')):
+        value = ((value ^ byte) * 16777619) & 0xffffffff
+    return value
+
+
+def query_features(words):
+    """Unigrams, bigrams and the leading word of a query"""
+    features = ['bias']
+    features.extend('w=' + word for word in words)
+    features.extend('b={} {}'.format(first, second) for first, second in zip(words, words[1:]))
+    if words:
+        features.append('first=' + words[0])
+    return features
+
+
+def role_features(before, word, after):
+    """Context of one occurrence of an ambiguous word"""
+    prev1 = before[-1] if before else '<s>'
+    prev2 = before[-2] if len(before) > 1 else '<s>'
+    next1 = after[0] if after else '</s>'
+    next2 = after[1] if len(after) > 1 else '</s>'
+    return [
+        'bias',
+        'word=' + word,
+        'prev1=' + prev1,
+        'prev2={} {}'.format(prev2, prev1),
+        'next1=' + next1,
+        'next2={} {}'.format(next1, next2),
+        'around={} _ {}'.format(prev1, next1),
+        'word_next={} {}'.format(word, next1),
+        'prev_word={} {}'.format(prev1, word)
+    ]
+
+
+def _shuffle(items, rng):
+    """Fisher-Yates on rng.random(), which unlike random.shuffle gives the
+    same order on Python 2 (IronPython) and 3 for the same seed"""
+    for i in range(len(items) - 1, 0, -1):
+        j = int(rng.random() * (i + 1))
+        items[i], items[j] = items[j], items[i]
+
+
+class HashedLogisticRegression(object):
+    """Softmax regression over hashed binary features"""
+
+    def __init__(self, labels, buckets=BUCKETS):
+        self.labels = list(labels)
+        self.buckets = buckets
+        self.weights = [[0.0] * buckets for _ in self.labels]
+        self._indices = {}
+
+    def indices(self, features):
+        result = []
+        for feature in features:
+            index = self._indices.get(feature)
+            if index is None:
+                index = self._indices[feature] = _fnv1a(feature) % self.buckets
+            result.append(index)
+        return result
+
+    def _probabilities(self, indices):
+        scores = [sum(weights[index] for index in indices) for weights in self.weights]
+        top = max(scores)
+        exps = [math.exp(score - top) for score in scores]
+        total = sum(exps)
+        return [value / total for value in exps]
+
+    def fit(self, examples, epochs=25, rate=0.5, l2=1e-4, seed=0):
+        """SGD on [(features, label)]; the example order is shuffled reproducibly"""
+        data = [(self.indices(features), self.labels.index(label)) for features, label in examples]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            _shuffle(data, rng)
+            step = rate / (1.0 + 0.2 * epoch)
+            for indices, target in data:
+                probabilities = self._probabilities(indices)
+                for label, weights in enumerate(self.weights):
+                    gradient = probabilities[label] - (1.0 if label == target else 0.0)
+                    for index in indices:
+                        weights[index] -= step * (gradient + l2 * weights[index])
+        return self
+
+    def predict(self, features):
+        """Return (label, confidence, {label: probability})"""
+        probabilities = self._probabilities(self.indices(features))
+        best = max(range(len(self.labels)), key=lambda label: probabilities[label])
+        return self.labels[best], probabilities[best], dict(zip(self.labels, probabilities))
+
+    def to_dict(self):
+        """The buckets any feature reached, with one weight per label for each"""
+        used = [index for index in range(self.buckets) if any(weights[index] for weights in self.weights)]
+        return {
+            'labels': self.labels,
+            'buckets': self.buckets,
+            'indices': used,
+            'weights': [[round(weights[index], 6) for index in used] for weights in self.weights]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls(data['labels'], data['buckets'])
+        for weights, values in zip(model.weights, data['weights']):
+            for index, value in zip(data['indices'], values):
+                weights[index] = value
+        return model
+
+
+def _role_word(word, role_words):
+    """The singular role word for `word` ("levels" -> "level", "families" -> "family"), or None"""
+    if word in role_words:
+        return word
+    if word.endswith('s') and word[:-1] in role_words:
+        return word[:-1]
+    if word.endswith('ies') and word[:-3] + 'y' in role_words:
+        return word[:-3] + 'y'
+    return None
+
+
+class IntentClassifier(object):
+    """Action and role models trained from labeled queries
+
+    Each entry is {"query", "action", "roles": [[word, "element" | "parameter"], ...]}
+    with one role per occurrence of an ambiguous word, in query order.
+    """
+
+    def __init__(self, action_model, role_model, role_words, training=None):
+        self.action_model = action_model
+        self.role_model = role_model
+        self.actions = action_model.labels
+        self.role_words = set(role_words)
+        self.training = training
+
+    @classmethod
+    def train(cls, entries, training=None):
+        entries = list(entries)
+        actions = sorted(set(entry['action'] for entry in entries))
+        role_words = set(word for entry in entries for word, role in entry.get('roles', []))
+        action_model = HashedLogisticRegression(actions).fit(
+            [(query_features(tokenize(entry['query'])), entry['action']) for entry in entries])
+
+        examples = []
+        for entry in entries:
+            words = tokenize(entry['query'])
+            roles = list(entry.get('roles', []))
+            for position, word in enumerate(words):
+                role_word = _role_word(word, role_words)
+                if role_word is None or not roles:
+                    continue
+                labeled_word, role = roles.pop(0)
+                if labeled_word == role_word:
+                    examples.append((role_features(words[:position], word, words[position + 1:]), role))
+        role_model = HashedLogisticRegression(['element', 'parameter']).fit(examples)
+        return cls(action_model, role_model, role_words, training)
+
+    @classmethod
+    def from_file(cls, path=TRAINING_PATH):
+        """Train on a JSONL training set"""
+        with io.open(path, 'rb') as f:
+            data = f.read()
+        lines = data.decode('utf-8').splitlines()
+        return cls.train((json.loads(line) for line in lines if line.strip()), _digest(data))
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        """The classifier saved at `path`, or None when it is missing or unreadable"""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('version') != MODEL_VERSION:
+            return None
+        return cls(HashedLogisticRegression.from_dict(data['action_model']),
+                   HashedLogisticRegression.from_dict(data['role_model']),
+                   data['role_words'], data['training'])
+
+    def save(self, path=MODEL_PATH):
+        """Write the weights in compact JSON through a temporary file (see config.replace_file)"""
+        data = {
+            'version': MODEL_VERSION,
+            'training': self.training,
+            'role_words': sorted(self.role_words),
+            'action_model': self.action_model.to_dict(),
+            'role_model': self.role_model.to_dict()
+        }
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'), sort_keys=True)
+        replace_file(temp_path, path)
+
+    def classify(self, query):
+        """Return {'action', 'confidence', 'probabilities'} for a query"""
+        action, confidence, probabilities = self.action_model.predict(query_features(tokenize(query)))
+        return {'action': action, 'confidence': confidence, 'probabilities': probabilities}
+
+    def role(self, query, start, end):
+        """Return ('element' | 'parameter', confidence) for the word at query[start:end]"""
+        words = tokenize(query[start:end])
+        word = words[0] if words else ''
+        role, confidence, _ = self.role_model.predict(
+            role_features(tokenize(query[:start]), word, tokenize(query[end:])))
+        return role, confidence
+
+
+def _digest(data):
+    """sha1 of a training set, the same for LF and CRLF checkouts"""
+    return hashlib.sha1(data.replace(b'\r\n', b'\n')).hexdigest()
+
+
+def training_hash(path=TRAINING_PATH):
+    try:
+        with open(path, 'rb') as f:
+            return _digest(f.read())
+    except (IOError, OSError):
+        return None
+
+
+def get_classifier():
+    """The process-wide classifier, loaded from the shipped weights on first use
+
+    Weights trained on a different training set are ignored and the models
+    retrained in memory; the shipped file is left for `main` to regenerate.
+    """
+    global _CLASSIFIER
+    with _CLASSIFIER_LOCK:
+        if _CLASSIFIER is None:
+            classifier = IntentClassifier.load()
+            if classifier is None or classifier.training != training_hash():
+                classifier = IntentClassifier.from_file()
+            _CLASSIFIER = classifier
+        return _CLASSIFIER
+
+
+def max_docs_for(task_analysis, config):
+    """Documentation sections to retrieve: more when the intent is uncertain"""
+    max_docs = config.get('max_docs', 5)
+    if task_analysis.get('low_confidence'):
+        return max(max_docs, intent_settings(config)['broad_max_docs'])
+    return max_docs
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    classifier = IntentClassifier.load()
+    if '--force' in argv or classifier is None or classifier.training != training_hash():
+        classifier = IntentClassifier.from_file()
+        classifier.save()
+        print("Trained intent model v{}: {} actions, {} role words -> {}".format(
+            MODEL_VERSION, len(classifier.actions), len(classifier.role_words), MODEL_PATH))
+    else:
+        print("Intent model is up to date: {}".format(MODEL_PATH))
+
+
+if __name__ == '__main__':
+    main()
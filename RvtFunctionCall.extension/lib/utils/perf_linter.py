@@ -0,0 +1,467 @@
+# -*- coding: utf-8 -*-
+"""
+Static performance linter for generated Revit scripts
+
+Flags the patterns that turn a seconds-long script into minutes on large
+models and, where it is mechanical, rewrites them:
+
+- FilteredElementCollector constructed inside a loop (hoisted when it does
+  not depend on the loop and the loop does not change the model)
+- ToElements() followed by Python-side filtering, or len() of a collector
+- slow or parameter filters applied before any quick category/class filter
+- one Transaction per element (batched into a single Transaction)
+
+Advice is grounded in selection/selection.py and
+transactions/advanced_transactions.py from the bundled documentation.
+"""
+import ast
+
+QUICK_FILTER_METHODS = set(['OfCategory', 'OfCategoryId', 'OfClass', 'OwnedByView'])
+QUICK_FILTER_CLASSES = set(['ElementCategoryFilter', 'ElementClassFilter', 'ElementOwnerViewFilter',
+                            'ElementLevelFilter', 'ElementMulticategoryFilter', 'ElementMulticlassFilter'])
+SLOW_FILTER_CLASSES = set(['ElementParameterFilter', 'BoundingBoxIntersectsFilter',
+                           'BoundingBoxContainsPointFilter', 'BoundingBoxIsInsideFilter',
+                           'ElementIntersectsElementFilter', 'ElementIntersectsSolidFilter',
+                           'FamilyInstanceFilter', 'RoomFilter', 'AreaFilter'])
+MATERIALIZE_METHODS = set(['ToElements', 'ToElementIds'])
+TRANSACTION_CLASSES = set(['Transaction', 'TransactionGroup'])
+# Calls that change the model (or open a transaction to do so); a collector in a
+# loop making them sees different elements on every iteration. Prefixes match
+# whole words: 'Set' covers SetValueString but not Settings.
+MODIFYING_PREFIXES = ('Create', 'Delete', 'New', 'Set', 'Move', 'Copy', 'Rotate', 'Mirror', 'Duplicate',
+                      'ChangeTypeId', 'Regenerate', 'Start', 'Transaction', 'SubTransaction')
+
+# Name contexts that bind (Param is Python 2's function-argument context)
+_BINDING = tuple(getattr(ast, name) for name in ('Store', 'Del', 'Param') if hasattr(ast, name))
+
+# Documentation each rule is grounded in: (module path, structure name)
+REFERENCES = {
+    'collector_in_loop': ('selection/selection.py', 'FilteredElementCollectorAPI.BASIC_COLLECTION'),
+    'filter_after_materialize': ('selection/selection.py', 'FilteredElementCollectorAPI.CATEGORY_FILTERING'),
+    'count_via_materialize': ('selection/selection.py', 'FilteredElementCollectorAPI.BASIC_COLLECTION'),
+    'unfiltered_collector': ('selection/selection.py', 'FilteredElementCollectorAPI.CLASS_FILTERING'),
+    'slow_filter_first': ('selection/selection.py', 'ElementFiltersAPI.QUICK_FILTERS'),
+    'transaction_per_element': ('transactions/advanced_transactions.py', 'TransactionGroupAPI.TRANSACTION_GROUP')
+}
+
+
+def finding(rule, line, message, suggestion, rewritable=False):
+    return {'rule': rule, 'line': line, 'message': message, 'suggestion': suggestion,
+            'reference': "{} {}".format(*REFERENCES[rule]), 'rewritable': rewritable}
+
+
+def reference_text(rule, limit=3):
+    """Render the documentation entries a rule's advice is based on"""
+    module_path, name = REFERENCES[rule]
+    try:
+        from .docs_corpus import get_structure
+        table = get_structure(module_path, name) or {}
+    except Exception:
+        table = {}
+    entries = ["{} - {}".format(key, value) for key, value in sorted(table.items())[:limit]]
+    return "{} {}: {}".format(module_path, name, "; ".join(entries) if entries else "see documentation")
+
+
+def _call_target(node):
+    func = node.func
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    return None
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip())
+
+
+def _last_line(node):
+    return max([getattr(child, 'lineno', 0) for child in ast.walk(node)] or [0])
+
+
+def _names(node, context):
+    return set(child.id for child in ast.walk(node) if isinstance(child, ast.Name) and isinstance(child.ctx, context))
+
+
+def _is_method_call(statement, method):
+    """Return the receiver of an expression statement like `t.Start()`, or None"""
+    if isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Call):
+        func = statement.value.func
+        if isinstance(func, ast.Attribute) and func.attr == method and isinstance(func.value, ast.Name):
+            return func.value.id
+    return None
+
+
+def _modifying(name):
+    for prefix in MODIFYING_PREFIXES:
+        if name == prefix or (name.startswith(prefix) and name[len(prefix)].isupper()):
+            return True
+    return False
+
+
+def _modifies_model(loop):
+    """True if anything run per iteration of the loop may change the model"""
+    for statement in loop.body:
+        for node in ast.walk(statement):
+            if isinstance(node, ast.Call) and _modifying(_call_target(node) or ''):
+                return True
+    return False
+
+
+def _new_transaction(node):
+    return isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in TRANSACTION_CLASSES
+
+
+class _Analyzer(ast.NodeVisitor):
+    """Record collector chains and transactions with their loop nesting"""
+
+    def __init__(self):
+        self.parents = {}
+        self.loops = []
+        self.collectors = []
+        self.transactions = []
+
+    def generic_visit(self, node):
+        for child in ast.iter_child_nodes(node):
+            self.parents[child] = node
+        ast.NodeVisitor.generic_visit(self, node)
+
+    def _visit_loop(self, node, head):
+        for child in ast.iter_child_nodes(node):
+            self.parents[child] = node
+        for part in head:
+            self.visit(part)
+        self.loops.append(node)
+        for statement in node.body:
+            self.visit(statement)
+        self.loops.pop()
+        for statement in node.orelse:
+            self.visit(statement)
+
+    def visit_For(self, node):
+        self._visit_loop(node, [node.target, node.iter])
+
+    def visit_While(self, node):
+        self._visit_loop(node, [node.test])
+
+    def _visit_comprehension(self, node):
+        for child in ast.iter_child_nodes(node):
+            self.parents[child] = node
+        for generator in node.generators:
+            self.parents[generator] = node
+            for child in ast.iter_child_nodes(generator):
+                self.parents[child] = generator
+        # The first iterable is evaluated once; everything else runs per item
+        self.visit(node.generators[0].iter)
+        self.loops.append(node)
+        for index, generator in enumerate(node.generators):
+            self.visit(generator.target)
+            if index:
+                self.visit(generator.iter)
+            for condition in generator.ifs:
+                self.visit(condition)
+        for part in ('elt', 'key', 'value'):
+            if hasattr(node, part):
+                self.visit(getattr(node, part))
+        self.loops.pop()
+
+    visit_ListComp = visit_SetComp = visit_GeneratorExp = visit_DictComp = _visit_comprehension
+
+    def visit_Call(self, node):
+        target = _call_target(node)
+        if isinstance(node.func, ast.Name) and target == 'FilteredElementCollector':
+            self.collectors.append((node, self.loops[-1] if self.loops else None))
+        elif isinstance(node.func, ast.Name) and target in TRANSACTION_CLASSES and self.loops:
+            self.transactions.append((node, self.loops[-1]))
+        self.generic_visit(node)
+
+
+def _chain(analyzer, root):
+    """Return ([(method, call)], outermost call) for FilteredElementCollector(...).A().B()"""
+    methods = []
+    node = root
+    while True:
+        attribute = analyzer.parents.get(node)
+        call = analyzer.parents.get(attribute)
+        if isinstance(attribute, ast.Attribute) and isinstance(call, ast.Call) and call.func is attribute:
+            methods.append((attribute.attr, call))
+            node = call
+        else:
+            return methods, node
+
+
+def _check_chain(analyzer, root, methods, outer, line):
+    findings = []
+    names = [method for method, call in methods]
+    quick_seen = False
+    for method, call in methods:
+        if method in QUICK_FILTER_METHODS:
+            quick_seen = True
+        elif method == 'WherePasses' and call.args and isinstance(call.args[0], ast.Call):
+            filter_class = _call_target(call.args[0])
+            if filter_class in QUICK_FILTER_CLASSES:
+                quick_seen = True
+            elif filter_class in SLOW_FILTER_CLASSES and not quick_seen:
+                findings.append(finding(
+                    'slow_filter_first', line,
+                    "{} runs before any quick filter, so every element in the model is expanded".format(filter_class),
+                    "Narrow with OfCategory()/OfClass() first, then apply WherePasses({}(...))".format(filter_class)))
+
+    materialized = [name for name in names if name in MATERIALIZE_METHODS]
+    # A collector scoped to a view (doc, view.Id) is already narrowed
+    if materialized and not quick_seen and 'WherePasses' not in names and len(root.args) < 2:
+        findings.append(finding(
+            'unfiltered_collector', line,
+            "Collector calls {}() without a category or class filter".format(materialized[0]),
+            "Add OfCategory(BuiltInCategory.OST_...) or OfClass(...) before {}()".format(materialized[0])))
+
+    parent = analyzer.parents.get(outer)
+    if names and names[-1] in MATERIALIZE_METHODS:
+        if isinstance(parent, ast.comprehension) and parent.ifs:
+            findings.append(finding(
+                'filter_after_materialize', line,
+                "Elements are materialized with {}() and then filtered in Python".format(names[-1]),
+                "Move the condition into the collector (OfCategory/OfClass or "
+                "WherePasses(ElementParameterFilter)) so Revit filters natively"))
+        elif isinstance(parent, ast.For) and parent.iter is outer and parent.body and isinstance(parent.body[0], ast.If) \
+                and (len(parent.body) == 1 or _only_continue(parent.body[0])):
+            findings.append(finding(
+                'filter_after_materialize', line,
+                "Loop over {}() skips elements with an if; the collector could exclude them".format(names[-1]),
+                "Filter in the collector and iterate only the matching elements"))
+        elif isinstance(parent, ast.Call) and isinstance(parent.func, ast.Name) and parent.func.id == 'len':
+            findings.append(finding(
+                'count_via_materialize', line,
+                "len({}()) builds a full element list just to count it".format(names[-1]),
+                "Use collector.GetElementCount()"))
+    return findings
+
+
+def _only_continue(statement):
+    return len(statement.body) == 1 and isinstance(statement.body[0], ast.Continue)
+
+
+def _enclosing_statement(analyzer, node):
+    while node is not None and not isinstance(node, ast.stmt):
+        node = analyzer.parents.get(node)
+    return node
+
+
+def _hoistable(analyzer, root, loop):
+    """Return the loop-body assignment holding this collector if it can move above the loop"""
+    statement = _enclosing_statement(analyzer, root)
+    if not isinstance(loop, (ast.For, ast.While)) or not isinstance(statement, ast.Assign):
+        return None
+    if statement not in loop.body or statement.lineno == loop.lineno:
+        return None
+    if _names(statement.value, ast.Load) & _names(loop, _BINDING):
+        return None
+    # Deleting or creating elements changes what the next iteration collects
+    if _modifies_model(loop):
+        return None
+    targets = set()
+    for target in statement.targets:
+        targets |= _names(target, ast.Store)
+    # Only hoist if nothing else in the loop rebinds the hoisted names
+    others = set()
+    for other in loop.body:
+        if other is not statement:
+            others |= _names(other, _BINDING)
+    if targets & others:
+        return None
+    return statement
+
+
+def _mentions(statements, name):
+    """Whether any of the statements refers to the variable `name`"""
+    return any(isinstance(node, ast.Name) and node.id == name
+               for statement in statements for node in ast.walk(statement))
+
+
+def _batchable(loop):
+    """Return ('with'|'assign', nodes) when the loop body is one Start ... Commit transaction
+
+    The statements between Start and Commit must leave the transaction alone:
+    a RollBack() or Commit() there (typically in an except block) would end
+    the single outer transaction partway through the loop.
+    """
+    if not isinstance(loop, (ast.For, ast.While)) or loop.orelse or not loop.body:
+        return None
+    if loop.body[0].lineno == loop.lineno:
+        return None
+    body = loop.body
+    for statement in body:
+        for node in ast.walk(statement):
+            if isinstance(node, (ast.Return, ast.Break, ast.Continue)):
+                return None
+
+    if len(body) == 1 and isinstance(body[0], ast.With):
+        statement = body[0]
+        items = statement.items if hasattr(statement, 'items') else [statement]
+        if len(items) != 1 or not _new_transaction(items[0].context_expr):
+            return None
+        name = items[0].optional_vars.id if isinstance(items[0].optional_vars, ast.Name) else None
+        inner = statement.body
+        if name and len(inner) >= 3 and _is_method_call(inner[0], 'Start') == name \
+                and _is_method_call(inner[-1], 'Commit') == name and not _mentions(inner[1:-1], name):
+            return 'with', (statement, inner[0], inner[1], inner[-1])
+        return None
+
+    if len(body) >= 4 and isinstance(body[0], ast.Assign) and _new_transaction(body[0].value) \
+            and len(body[0].targets) == 1 and isinstance(body[0].targets[0], ast.Name):
+        name = body[0].targets[0].id
+        if _is_method_call(body[1], 'Start') == name and _is_method_call(body[-1], 'Commit') == name \
+                and not _mentions(body[2:-1], name):
+            return 'assign', (body[0], body[1], body[2], body[-1])
+    return None
+
+
+def analyze(code):
+    """Return performance findings (dicts with rule, line, message, suggestion, reference, rewritable)"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    analyzer = _Analyzer()
+    analyzer.visit(tree)
+
+    findings = []
+    for root, loop in analyzer.collectors:
+        methods, outer = _chain(analyzer, root)
+        if loop is not None:
+            hoistable = _hoistable(analyzer, root, loop) is not None
+            if hoistable:
+                suggestion = "Collect once before the loop"
+            elif isinstance(loop, (ast.For, ast.While)) and _modifies_model(loop):
+                suggestion = ("The loop changes the model, so collect once before it only if those changes "
+                              "cannot affect what is collected")
+            else:
+                suggestion = ("Collect once before the loop and index the results in a dict keyed by what "
+                              "the loop looks up")
+            findings.append(finding(
+                'collector_in_loop', root.lineno,
+                "FilteredElementCollector is built on every iteration of the loop at line {}".format(loop.lineno),
+                suggestion, rewritable=hoistable))
+        findings.extend(_check_chain(analyzer, root, methods, outer, root.lineno))
+
+    batched = set()
+    for node, loop in analyzer.transactions:
+        if loop in batched:
+            continue
+        batched.add(loop)
+        findings.append(finding(
+            'transaction_per_element', node.lineno,
+            "A {} is opened on every iteration of the loop at line {}".format(_call_target(node), loop.lineno),
+            "Open one Transaction around the loop (or a TransactionGroup and Assimilate())",
+            rewritable=_batchable(loop) is not None))
+    return sorted(findings, key=lambda item: (item['line'], item['rule']))
+
+
+def _statement_end(lines, statement):
+    """Line number of the last source line of a statement"""
+    end = getattr(statement, 'end_lineno', None)
+    if end:
+        return end
+    # Python 2 has no end positions: follow open brackets and backslashes
+    end = statement.lineno
+    depth = 0
+    while end <= len(lines):
+        text = lines[end - 1].split('#')[0]
+        depth += sum(text.count(char) for char in '([{') - sum(text.count(char) for char in ')]}')
+        if depth <= 0 and not text.rstrip().endswith('\\') and end >= _last_line(statement):
+            return end
+        end += 1
+    return len(lines)
+
+
+def _shift(block, amount):
+    """Indent (amount > 0) or dedent a block of lines"""
+    shifted = []
+    for line in block:
+        if amount >= 0:
+            shifted.append(' ' * amount + line if line.strip() else line)
+        else:
+            cut = min(-amount, _indent(line))
+            shifted.append(line[cut:])
+    return shifted
+
+
+def _hoist(lines, loop, statement):
+    start, end = statement.lineno - 1, _statement_end(lines, statement)
+    block = _shift(lines[start:end], _indent(lines[loop.lineno - 1]) - _indent(lines[start]))
+    rest = lines[:start] + lines[end:]
+    at = loop.lineno - 1
+    return rest[:at] + block + rest[at:]
+
+
+def _batch(lines, loop, kind, nodes):
+    opener, start_call, first_inner, commit = nodes
+    loop_start = loop.lineno - 1
+    commit_end = _statement_end(lines, commit)
+    step = _indent(lines[opener.lineno - 1]) - _indent(lines[loop_start])
+
+    header = lines[loop_start:opener.lineno - 1]
+    opening = lines[opener.lineno - 1:start_call.lineno - 1]
+    starting = lines[start_call.lineno - 1:first_inner.lineno - 1]
+    middle = lines[first_inner.lineno - 1:commit.lineno - 1]
+    closing = lines[commit.lineno - 1:commit_end]
+
+    if kind == 'with':
+        # with Transaction(...) as t: t.Start(); for ...: body; t.Commit()
+        rebuilt = _shift(opening, -step) + _shift(starting, -step) + _shift(header, step) + middle + \
+            _shift(closing, -step)
+    else:
+        # t = Transaction(...); t.Start(); for ...: body; t.Commit()
+        rebuilt = _shift(opening, -step) + _shift(starting, -step) + header + middle + _shift(closing, -step)
+    return lines[:loop_start] + rebuilt + lines[commit_end:]
+
+
+def _rewrite_once(code):
+    tree = ast.parse(code)
+    analyzer = _Analyzer()
+    analyzer.visit(tree)
+    lines = code.splitlines()
+    ending = "\n" if code.endswith("\n") else ""
+
+    for root, loop in analyzer.collectors:
+        if loop is not None:
+            statement = _hoistable(analyzer, root, loop)
+            if statement is not None:
+                return "\n".join(_hoist(lines, loop, statement)) + ending, 'collector_in_loop'
+    for node, loop in analyzer.transactions:
+        batch = _batchable(loop)
+        if batch is not None:
+            return "\n".join(_batch(lines, loop, batch[0], batch[1])) + ending, 'transaction_per_element'
+    return None, None
+
+
+def rewrite(code, max_passes=20):
+    """Hoist loop-invariant collectors and batch per-element transactions
+
+    Returns (code, applied rules). Every pass re-parses the result, and a
+    rewrite that would not parse is discarded.
+    """
+    applied = []
+    for _ in range(max_passes):
+        try:
+            rewritten, rule = _rewrite_once(code)
+        except SyntaxError:
+            break
+        if rewritten is None:
+            break
+        try:
+            ast.parse(rewritten)
+        except SyntaxError:
+            break
+        code = rewritten
+        applied.append(rule)
+    return code, applied
+
+
+def format_findings(findings):
+    parts = []
+    for item in findings:
+        parts.append("- line {}: {}\n  Fix: {}{}".format(
+            item['line'], item['message'], item['suggestion'],
+            " (one-click rewrite available)" if item['rewritable'] else ""))
+    return "\n".join(parts)
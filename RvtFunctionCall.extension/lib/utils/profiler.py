@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Execution profiler for generated scripts
+
+Runs a script one top-level statement at a time, timing each, and counts
+the Revit API calls that dominate slow scripts: FilteredElementCollector
+constructions, get_Parameter/LookupParameter lookups, ToElements() and
+Transaction Start/Commit. Calls are counted by routing them through the
+profiler (an AST rewrite of the call sites); where the interpreter cannot
+compile a rewritten tree, statements are still timed from their source.
+
+The ranked report is meant both for the user and as "optimize this" input
+for the model.
+"""
+import ast
+import time
+
+from .exec_cache import compile_script
+
+PROFILER_NAME = '__profiler__'
+
+COUNTED_CONSTRUCTORS = set(['FilteredElementCollector', 'Transaction', 'SubTransaction', 'TransactionGroup'])
+COUNTED_METHODS = set(['get_Parameter', 'LookupParameter', 'ToElements', 'ToElementIds', 'Start', 'Commit'])
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+def _constant(value):
+    if hasattr(ast, 'Constant'):
+        return ast.Constant(value=value)
+    return ast.Str(s=value)
+
+
+def _call(func, args):
+    node = ast.Call(func=func, args=args, keywords=[])
+    if 'starargs' in ast.Call._fields:
+        node.starargs = None
+        node.kwargs = None
+    return node
+
+
+class _Instrument(ast.NodeTransformer):
+    """Rewrite f(...) into __profiler__.count('f', f)(...) for counted calls"""
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        func = node.func
+        if isinstance(func, ast.Name) and func.id in COUNTED_CONSTRUCTORS:
+            label = func.id
+        elif isinstance(func, ast.Attribute) and func.attr in COUNTED_METHODS:
+            label = '.' + func.attr
+        else:
+            return node
+        counter = ast.Attribute(value=ast.Name(id=PROFILER_NAME, ctx=ast.Load()), attr='count', ctx=ast.Load())
+        node.func = ast.copy_location(_call(counter, [_constant(label), func]), func)
+        return node
+
+
+def _statement_start(statement):
+    """First line of a statement, including any decorators"""
+    return min([statement.lineno] + [decorator.lineno for decorator in getattr(statement, 'decorator_list', [])])
+
+
+def _compile_statement(statement, lines, start, end):
+    """Return (code object, calls counted) for one top-level statement"""
+    try:
+        module = ast.Module(body=[_Instrument().visit(statement)])
+        module.type_ignores = []
+        ast.fix_missing_locations(module)
+        return compile(module, '<string>', 'exec'), True
+    except (TypeError, ValueError, SyntaxError, NotImplementedError):
+        # Blank lines keep line numbers in tracebacks pointing at the script
+        source = '\n' * (start - 1) + '\n'.join(lines[start - 1:end])
+        return compile(source, '<string>', 'exec'), False
+
+
+class Profiler(object):
+    """Per-statement timings and API call counts of one script run
+
+    `statements` holds one dict per top-level statement: 'start', 'end'
+    (line numbers), 'source' (first line), 'elapsed' (seconds) and 'calls'
+    ({label: count}). Calls made inside functions are charged to the
+    statement that called them.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.current = None
+        self.counted = True
+        self.elapsed = 0.0
+
+    def count(self, label, func):
+        calls = self.current['calls']
+        calls[label] = calls.get(label, 0) + 1
+        return func
+
+    def run(self, code, exec_globals):
+        """Execute `code` in `exec_globals`; exceptions propagate after the statement is timed"""
+        lines = code.splitlines()
+        body = ast.parse(code).body
+        starts = [_statement_start(statement) for statement in body]
+        exec_globals[PROFILER_NAME] = self
+        started = _timer()
+        try:
+            for index, statement in enumerate(body):
+                start = starts[index]
+                end = starts[index + 1] - 1 if index + 1 < len(body) else len(lines)
+                while end > start and not lines[end - 1].strip():
+                    end -= 1
+                compiled, counted = _compile_statement(statement, lines, start, end)
+                self.counted = self.counted and counted
+                self.current = {'start': start, 'end': end, 'source': lines[start - 1].strip(), 'elapsed': 0.0,
+                                'calls': {}}
+                self.statements.append(self.current)
+                statement_started = _timer()
+                try:
+                    exec(compiled, exec_globals)
+                finally:
+                    self.current['elapsed'] = _timer() - statement_started
+        finally:
+            self.elapsed = _timer() - started
+            exec_globals.pop(PROFILER_NAME, None)
+
+    def totals(self):
+        """API call counts across the whole run"""
+        totals = {}
+        for record in self.statements:
+            for label, count in record['calls'].items():
+                totals[label] = totals.get(label, 0) + count
+        return totals
+
+    def hotspots(self, top=5):
+        return sorted(self.statements, key=lambda record: -record['elapsed'])[:top]
+
+
+def run_script(code, exec_globals, profile=False):
+    """Execute a generated script; return its Profiler, or None when not profiled
+
+    A profiled run that raises carries its Profiler on the exception as
+    `profile`, so the statements that did run can still be reported.
+    """
+    if not profile:
+        exec(compile_script(code), exec_globals)
+        return None
+    profiler = Profiler()
+    try:
+        profiler.run(code, exec_globals)
+    except Exception as e:
+        e.profile = profiler
+        raise
+    return profiler
+
+
+def _format_calls(calls):
+    return ", ".join("{} x{}".format(label, count) for label, count in
+                     sorted(calls.items(), key=lambda item: (-item[1], item[0])))
+
+
+def format_report(profiler, top=5):
+    """Ranked hot-spot report of a profiled run"""
+    total = profiler.elapsed or sum(record['elapsed'] for record in profiler.statements)
+    lines = ["Total {:.0f} ms over {} top-level statement(s)".format(total * 1000, len(profiler.statements))]
+    for rank, record in enumerate(profiler.hotspots(top), 1):
+        span = "line {}".format(record['start']) if record['start'] == record['end'] else \
+            "lines {}-{}".format(record['start'], record['end'])
+        lines.append("{}. {}: {:.1f} ms ({:.0%}){}".format(
+            rank, span, record['elapsed'] * 1000, record['elapsed'] / total if total else 0,
+            " - " + _format_calls(record['calls']) if record['calls'] else ""))
+        lines.append("   " + record['source'][:100])
+    if not profiler.counted:
+        lines.append("API calls: not counted (this interpreter cannot compile instrumented code)")
+    elif profiler.totals():
+        lines.append("API calls: " + _format_calls(profiler.totals()))
+    return "\n".join(lines)
+
+
+def optimize_prompt(query, code, report):
+    """Ask the model to speed up a script using its measured hot spots"""
+    return """ORIGINAL TASK: {}
+
+CURRENT CODE (works, but is slow):
+```python
+{}
+```
+
+EXECUTION PROFILE (measured in Revit, slowest top-level statements first):
+{}
+
+TASK: Optimize this code. Focus on the slowest statements: hoist FilteredElementCollector out of loops, filter with
+quick filters (OfCategory/OfClass) before ToElements(), avoid repeated parameter lookups, and use one Transaction
+for the whole batch. Keep the behaviour identical. Return the complete IronPython 2.7 script.""".format(
+        query, code, report)
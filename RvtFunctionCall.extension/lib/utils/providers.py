@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""
+Pluggable AI providers: Claude, Gemini and a deterministic local replay backend
+
+Every provider turns a finished prompt into response text, optionally
+streaming fragments to an `on_token` callback. The replay provider serves
+recorded responses with configurable latency and token rate so the whole
+pipeline can be load-tested and profiled offline.
+
+Prompts built as `Prompt` objects keep their stable prefix separate so
+Claude can serve it from its prompt cache (cache_control breakpoints);
+cache outcomes are reported per request. Gemini gets the plain prompt text:
+explicit cachedContents needs at least 32k tokens, far above the
+documentation budget, so only caching the API applies on its own is
+reported.
+"""
+import io
+import json
+import os
+import re
+import threading
+import time
+
+from .docs_corpus import estimate_tokens
+from .docs_index import tokenize
+from .governor import Governor
+from .http_pool import get_pool
+from .streaming import TruncatedStream, claude_text_deltas, collect_stream, gemini_text_deltas, iter_sse_events
+from .worker import OperationCancelled
+
+CLAUDE_API_URL = "https://api.anthropic.com/v1/messages"
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+GEMINI_MODEL = "gemini-1.5-pro"
+
+RECORDINGS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'replay_recordings.json')
+
+DEFAULT_REPLAY_CONFIG = {
+    'recordings': '',           # Empty uses the bundled lib/replay_recordings.json
+    'first_token_ms': 400,
+    'tokens_per_second': 60,
+    'record': False             # Append live Claude/Gemini responses to the recordings
+}
+
+DEFAULT_PROMPT_CACHE_CONFIG = {
+    'enabled': True
+}
+
+_TASK_PATTERN = re.compile(r'^(?:ORIGINAL )?TASK: (.+)$', re.MULTILINE)
+_RECORD_LOCK = threading.Lock()
+
+
+class Prompt(object):
+    """A prompt split into stable prefix segments and a per-request suffix
+
+    The prefix segments (rules and boilerplate, then documentation) are the
+    same across many requests and are marked cacheable; `text` is the plain
+    concatenation for providers without prompt caching.
+    """
+
+    def __init__(self, prefix, suffix):
+        self.prefix = [segment for segment in prefix if segment]
+        self.suffix = suffix
+
+    @property
+    def text(self):
+        return "\n\n".join(self.prefix + [self.suffix])
+
+
+def prompt_text(prompt):
+    """Return the full text of a Prompt or plain string"""
+    return prompt.text if isinstance(prompt, Prompt) else prompt
+
+
+def prompt_cache_settings(config):
+    settings = dict(DEFAULT_PROMPT_CACHE_CONFIG)
+    settings.update(config.get('prompt_cache') or {})
+    return settings
+
+
+def cache_report(status, input_tokens, cached_tokens):
+    """Per-request prompt cache outcome: 'hit', 'write' (stored for next time) or 'miss'"""
+    return {
+        'status': status,
+        'input_tokens': input_tokens,
+        'cached_tokens': cached_tokens,
+        'saved_input_tokens': cached_tokens if status == 'hit' else 0
+    }
+
+
+class Provider(object):
+    """Base provider; subclasses implement generate()"""
+    name = None
+    display_name = None
+
+    def __init__(self, config):
+        self.config = config
+
+    def generate(self, prompt, on_token=None, timings=None, token=None, on_retry=None):
+        """Return the response text for a prompt, streaming fragments to on_token if given
+
+        `token` is an optional CancellationToken honoured while waiting, and
+        `on_retry(attempt, delay, error)` is told about each retry.
+        """
+        raise NotImplementedError
+
+
+class HTTPProvider(Provider):
+    """Shared request/stream handling for hosted JSON APIs"""
+    api_key_setting = None
+
+    def api_key(self):
+        api_key = self.config.get(self.api_key_setting, '')
+        if not api_key:
+            raise Exception("{} API key not configured".format(self.display_name))
+        return api_key
+
+    def build_request(self, prompt, stream):
+        """Return (url, request_data, headers)"""
+        raise NotImplementedError
+
+    def parse_response(self, response_data):
+        raise NotImplementedError
+
+    def response_usage(self, response_data):
+        """Token usage reported in a blocking response"""
+        return {}
+
+    def text_deltas(self, events, usage):
+        raise NotImplementedError
+
+    def cache_report(self, usage):
+        """Translate provider usage into a cache_report(), or None"""
+        return None
+
+    def generate(self, prompt, on_token=None, timings=None, token=None, on_retry=None):
+        url, request_data, headers = self.build_request(prompt, on_token is not None)
+        data = json.dumps(request_data).encode('utf-8')
+        started = time.time()
+        usage = {}
+
+        def send():
+            usage.clear()
+            response = get_pool(self.config).request("POST", url, data, headers)
+            if on_token is None:
+                response_data = json.loads(response.read().decode('utf-8'))
+                usage.update(self.response_usage(response_data))
+                return self.parse_response(response_data)
+
+            delivered = []
+
+            def forward(text):
+                delivered.append(text)
+                on_token(text)
+
+            try:
+                text = collect_stream(self.text_deltas(iter_sse_events(response), usage), forward, timings, started)
+                # Claude's stream ends at message_stop before the closing chunk;
+                # reading it keeps the connection reusable for the next request
+                response.read()
+                return text
+            except Exception as e:
+                # Fragments already reached the caller, so the request cannot be
+                # replayed - unless the stream was cut off, where the text is
+                # unusable anyway and a retry streams the whole response again
+                e.partial = bool(delivered) and not isinstance(e, TruncatedStream)
+                raise
+            finally:
+                response.close()
+
+        text = Governor.from_config(self.config, self.api_key()).call(send, token, on_retry)
+        report = self.cache_report(usage) if usage else None
+        if timings is not None and report is not None:
+            timings['prompt_cache'] = report
+        return text
+
+
+class ClaudeProvider(HTTPProvider):
+    name = 'claude'
+    display_name = 'Claude'
+    api_key_setting = 'claude_api_key'
+
+    def build_request(self, prompt, stream):
+        request_data = {
+            "model": "claude-3-5-sonnet-20241022",
+            "max_tokens": 3000,
+            "messages": [{"role": "user", "content": prompt_text(prompt)}]
+        }
+        if isinstance(prompt, Prompt) and prompt_cache_settings(self.config)['enabled']:
+            # One breakpoint after the rules and one after the documentation;
+            # Claude caches each prefix that reaches its minimum length
+            request_data["system"] = [
+                {"type": "text", "text": segment, "cache_control": {"type": "ephemeral"}}
+                for segment in prompt.prefix
+            ]
+            request_data["messages"] = [{"role": "user", "content": prompt.suffix}]
+        if stream:
+            request_data["stream"] = True
+
+        headers = {
+            "Content-Type": "application/json",
+            "x-api-key": self.api_key(),
+            "anthropic-version": "2023-06-01"
+        }
+        return self.config.get('claude_api_url') or CLAUDE_API_URL, request_data, headers
+
+    def parse_response(self, response_data):
+        return response_data['content'][0]['text']
+
+    def response_usage(self, response_data):
+        return response_data.get('usage') or {}
+
+    def text_deltas(self, events, usage):
+        return claude_text_deltas(events, usage)
+
+    def cache_report(self, usage):
+        read = usage.get('cache_read_input_tokens') or 0
+        written = usage.get('cache_creation_input_tokens') or 0
+        total = (usage.get('input_tokens') or 0) + read + written
+        return cache_report('hit' if read else 'write' if written else 'miss', total, read)
+
+
+class GeminiProvider(HTTPProvider):
+    name = 'gemini'
+    display_name = 'Gemini'
+    api_key_setting = 'gemini_api_key'
+
+    def base_url(self):
+        return self.config.get('gemini_api_url') or GEMINI_API_URL
+
+    def build_request(self, prompt, stream):
+        request_data = {
+            "contents": [{"parts": [{"text": prompt_text(prompt)}]}],
+            "generationConfig": {"temperature": 0.2, "maxOutputTokens": 3000}
+        }
+        headers = {"Content-Type": "application/json"}
+
+        if stream:
+            url = "{}/{}:streamGenerateContent?alt=sse&key={}".format(self.base_url(), GEMINI_MODEL, self.api_key())
+        else:
+            url = "{}/{}:generateContent?key={}".format(self.base_url(), GEMINI_MODEL, self.api_key())
+        return url, request_data, headers
+
+    def parse_response(self, response_data):
+        return response_data['candidates'][0]['content']['parts'][0]['text']
+
+    def response_usage(self, response_data):
+        return response_data.get('usageMetadata') or {}
+
+    def text_deltas(self, events, usage):
+        return gemini_text_deltas(events, usage)
+
+    def cache_report(self, usage):
+        # Implicit caching, which newer models apply on their own
+        cached = usage.get('cachedContentTokenCount') or 0
+        return cache_report('hit' if cached else 'miss', usage.get('promptTokenCount') or 0, cached)
+
+
+def _replay_settings(config):
+    settings = dict(DEFAULT_REPLAY_CONFIG)
+    settings.update(config.get('replay') or {})
+    return settings
+
+
+def _recordings_path(settings):
+    return settings['recordings'] or RECORDINGS_PATH
+
+
+def task_text(prompt):
+    """Return the user task embedded in a prompt, used to match recordings"""
+    match = _TASK_PATTERN.search(prompt)
+    if match:
+        return match.group(1).strip()
+    marker = prompt.rfind('USER REQUEST:')
+    return prompt[marker + len('USER REQUEST:'):].strip() if marker >= 0 else prompt
+
+
+class ReplayProvider(Provider):
+    """Serves recorded responses deterministically with simulated latency
+
+    The recording whose query shares the most terms with the prompt's task
+    wins; ties go to the earliest recording, and the default response is
+    used when nothing overlaps.
+    """
+    name = 'replay'
+    display_name = 'Replay'
+
+    _loaded = {}
+
+    def __init__(self, config):
+        Provider.__init__(self, config)
+        settings = _replay_settings(config)
+        self.first_token_delay = float(settings['first_token_ms']) / 1000.0
+        self.tokens_per_second = float(settings['tokens_per_second'])
+        self.recordings, self.default_response = self._load(_recordings_path(settings))
+
+    @classmethod
+    def _load(cls, path):
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        cached = cls._loaded.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        recordings, default_response = [], "No recorded response available."
+        if mtime is not None:
+            with io.open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            default_response = data.get('default', default_response)
+            for recording in data.get('recordings', []):
+                recordings.append((set(tokenize(recording['query'])), recording['response']))
+        cls._loaded[path] = (mtime, recordings, default_response)
+        return recordings, default_response
+
+    def select(self, prompt):
+        terms = set(tokenize(task_text(prompt)))
+        best_score, best_response = 0.0, self.default_response
+        for recorded_terms, response in self.recordings:
+            union = terms | recorded_terms
+            score = float(len(terms & recorded_terms)) / len(union) if union else 0.0
+            if score > best_score:
+                best_score, best_response = score, response
+        return best_response
+
+    def fragments(self, text, chars_per_token=4):
+        return [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)]
+
+    def _sleep(self, seconds, token):
+        if token is None:
+            time.sleep(seconds)
+        elif token.wait(seconds):
+            raise OperationCancelled("Operation cancelled")
+
+    def generate(self, prompt, on_token=None, timings=None, token=None, on_retry=None):
+        response = self.select(prompt_text(prompt))
+        fragments = self.fragments(response)
+        token_delay = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+        started = time.time()
+        self._sleep(self.first_token_delay, token)
+        if on_token is None:
+            self._sleep(token_delay * len(fragments), token)
+            return response
+
+        def paced():
+            for fragment in fragments:
+                yield fragment
+                self._sleep(token_delay, token)
+
+        return collect_stream(paced(), on_token, timings, started)
+
+
+def record_response(config, prompt, response):
+    """Append a live response to the replay recordings when 'replay.record' is on"""
+    settings = _replay_settings(config)
+    if not settings['record']:
+        return
+    path = _recordings_path(settings)
+    with _RECORD_LOCK:
+        data = {'default': "No recorded response available.", 'recordings': []}
+        if os.path.exists(path):
+            with io.open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        data.setdefault('recordings', []).append({'query': task_text(prompt_text(prompt)), 'response': response})
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(data, indent=2, ensure_ascii=True) + u'\n')
+
+
+PROVIDERS = [ClaudeProvider, GeminiProvider, ReplayProvider]
+
+
+def get_provider(model, config):
+    """Instantiate the provider registered under `model`"""
+    for provider_class in PROVIDERS:
+        if provider_class.name == model.lower():
+            return provider_class(config)
+    raise Exception("Unknown AI model: {}".format(model))
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache of AI responses
+
+Entries are keyed by model, normalized query and a fingerprint of the packed
+documentation context, and evicted by age, entry count and total size.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+
+from .config import replace_file
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'cache', 'responses')
+
+DEFAULT_CACHE_CONFIG = {
+    'enabled': True,
+    'max_entries': 500,
+    'max_mb': 20,
+    'max_age_days': 30
+}
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s\.\?!]+$')
+
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    lines = [_WHITESPACE.sub(' ', line).strip() for line in query.lower().split('\n')]
+    return _TRAILING_PUNCTUATION.sub('', '\n'.join(line for line in lines if line))
+
+
+def fingerprint(text):
+    """Return a stable hash of a prompt fragment"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def make_key(model, query, context_fingerprint):
+    """Build the cache key for a request"""
+    return fingerprint(u"\n".join([model.lower(), normalize_query(query), context_fingerprint]))
+
+
+class ResponseCache(object):
+    """Directory of JSON entries with size and age based eviction"""
+
+    def __init__(self, directory=CACHE_DIR, max_entries=500, max_bytes=20 * 1024 * 1024,
+                 max_age_seconds=30 * 24 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a cache from the 'response_cache' config section, or None if disabled"""
+        settings = dict(DEFAULT_CACHE_CONFIG)
+        settings.update(config.get('response_cache') or {})
+        if not settings['enabled']:
+            return None
+        return cls(
+            max_entries=int(settings['max_entries']),
+            max_bytes=int(float(settings['max_mb']) * 1024 * 1024),
+            max_age_seconds=float(settings['max_age_days']) * 24 * 3600
+        )
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """Return the cached response text, or None on a miss or expired entry"""
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if time.time() - entry.get('created', 0) > self.max_age_seconds:
+            self._remove(path)
+            return None
+        return entry.get('response')
+
+    def put(self, key, response, model=None):
+        """Store a response and evict entries beyond the configured limits"""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        path = self._path(key)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'created': time.time(), 'model': model, 'response': response}, f)
+        replace_file(temp_path, path)
+        self.evict()
+
+    def discard(self, key):
+        """Remove one entry, e.g. a response whose script failed"""
+        self._remove(self._path(key))
+
+    def evict(self):
+        """Drop expired entries, then the oldest ones until under count and size limits"""
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.max_age_seconds:
+                self._remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for mtime, size, path in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            mtime, size, path = entries.pop(0)
+            total_bytes -= size
+            self._remove(path)
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                self._remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
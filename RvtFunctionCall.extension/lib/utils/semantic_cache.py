@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Semantic near-duplicate cache of successfully executed scripts
+
+Queries are embedded offline with a hashed n-gram vectorizer (canonical word
+unigrams and bigrams plus character trigrams) and stored in a sparse vector
+index. A new query reuses a stored script when its cosine similarity to a
+previous query passes the configured threshold, so "pick every door" finds
+the script generated for "select all doors".
+
+The index is partitioned by what a reused script must agree on exactly:
+numbers, quoted names, negation, and the actions, element categories and
+parameters task_agent's keywords find. In a long query one swapped word
+barely moves the cosine ("select all walls ... and set their mark" scores
+0.91 against the same query with "delete"), so the partition keeps them apart.
+"""
+import io
+import json
+import math
+import os
+import re
+import threading
+import zlib
+
+from .docs_index import tokenize
+from .task_agent import match_intents
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'cache', 'semantic_cache.jsonl')
+
+DEFAULT_SEMANTIC_CONFIG = {
+    'enabled': True,
+    'threshold': 0.85,
+    'max_entries': 10000
+}
+
+HASH_BUCKETS = 1 << 20
+
+# Paraphrases collapse onto one canonical term before hashing
+_SYNONYM_GROUPS = {
+    'select': ['pick', 'choose', 'grab', 'find', 'collect', 'highlight', 'filter'],
+    'create': ['make', 'add', 'generate', 'place', 'build'],
+    'delete': ['remove', 'erase'],
+    'modify': ['change', 'update', 'edit', 'adjust'],
+    'list': ['show', 'display', 'report'],
+    'level': ['storey', 'story'],
+    'floor': ['slab']
+}
+SYNONYMS = dict(
+    (tokenize(word)[0] if tokenize(word) else word, tokenize(canonical)[0])
+    for canonical, words in _SYNONYM_GROUPS.items() for word in words
+)
+# Paraphrases task_agent does not know, rewritten before its keywords are
+# matched so "pick every door" partitions with "select all doors"
+SYNONYM_PATTERN = re.compile(r"\b({})(?:s|es|ed|ing)?\b".format(
+    '|'.join(sorted((word for words in _SYNONYM_GROUPS.values() for word in words), key=len, reverse=True))),
+    re.IGNORECASE)
+CANONICAL_WORDS = dict((word, canonical) for canonical, words in _SYNONYM_GROUPS.items() for word in words)
+# Quantifiers carry no intent once 'all' is already a stopword
+IGNORED = set(['every', 'each', 'any', 'please', 'current', 'model', 'project'])
+
+# Numbers and quoted names must match exactly: 'level 1' never reuses 'level 2'
+_LITERAL_PATTERN = re.compile(r'\d+(?:\.\d+)?|\'[^\']*\'|"[^"]*"')
+# So must negation: "doors that are not fire rated" never reuses the script
+# for "doors that are fire rated" ("non-structural", "unused", "doesn't" too)
+_NEGATION_PATTERN = re.compile(
+    r"\b(?:not|no|without|except|excluding|[a-z]+n't|non-?[a-z]+|un[a-z]{2,}(?:ed|able))\b", re.IGNORECASE)
+NEGATION = u'!not'
+
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.5
+TRIGRAM_WEIGHT = 0.2
+CANDIDATE_LIMIT = 32
+
+
+def canonical_terms(query):
+    """Tokenize, stem and map synonyms to canonical terms"""
+    terms = []
+    for term in tokenize(query):
+        if term in IGNORED:
+            continue
+        terms.append(SYNONYMS.get(term, term))
+    return terms
+
+
+def literals(query):
+    """Return the numbers, quoted names and negations a reused script must agree on"""
+    found = [literal.strip('\'"').lower() for literal in _LITERAL_PATTERN.findall(query)]
+    found.extend(NEGATION for _ in _NEGATION_PATTERN.findall(query))
+    return tuple(sorted(found))
+
+
+def intents(query):
+    """Return the task_agent actions, elements and parameters a reused script must agree on"""
+    text = SYNONYM_PATTERN.sub(lambda match: CANONICAL_WORDS[match.group(1).lower()], query)
+    return tuple(sorted(set((item['kind'], item['label']) for item in match_intents(text)
+                            if item['kind'] != 'complexity')))
+
+
+def partition(query):
+    """The index partition of a query: its literals and its intents"""
+    return literals(query), intents(query)
+
+
+def _bucket(feature):
+    return zlib.crc32(feature.encode('utf-8')) & (HASH_BUCKETS - 1)
+
+
+def vectorize(query):
+    """Return (sparse L2-normalized vector, word feature buckets) for a query"""
+    terms = canonical_terms(query)
+    vector = {}
+    words = set()
+
+    def add(feature, weight):
+        bucket = _bucket(feature)
+        vector[bucket] = vector.get(bucket, 0.0) + weight
+        return bucket
+
+    for term in terms:
+        words.add(add(u'w:' + term, WORD_WEIGHT))
+        padded = u'<{}>'.format(term)
+        for i in range(len(padded) - 2):
+            add(u'c:' + padded[i:i + 3], TRIGRAM_WEIGHT)
+    for first, second in zip(terms, terms[1:]):
+        add(u'b:{} {}'.format(first, second), BIGRAM_WEIGHT)
+
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if norm:
+        for bucket in vector:
+            vector[bucket] /= norm
+    return vector, words
+
+
+def cosine(left, right):
+    """Dot product of two normalized sparse vectors"""
+    if len(left) > len(right):
+        left, right = right, left
+    return sum(weight * right.get(bucket, 0.0) for bucket, weight in left.items())
+
+
+class VectorIndex(object):
+    """Sparse vector index partitioned by literals and intents, with word-feature candidate generation"""
+
+    def __init__(self):
+        self.vectors = []
+        self.payloads = []
+        self.postings = {}
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def add(self, query, payload):
+        vector, words = vectorize(query)
+        key = partition(query)
+        position = len(self.vectors)
+        self.vectors.append(vector)
+        self.payloads.append(payload)
+        for bucket in words:
+            self.postings.setdefault((key, bucket), []).append(position)
+        return position
+
+    def nearest(self, query):
+        """Return (similarity, payload) of the closest stored query, or (0.0, None)"""
+        vector, words = vectorize(query)
+        key = partition(query)
+        overlap = {}
+        for bucket in words:
+            for position in self.postings.get((key, bucket), ()):
+                overlap[position] = overlap.get(position, 0) + 1
+        if not overlap:
+            return 0.0, None
+
+        # Exact cosine only for the entries sharing the most canonical words;
+        # later entries win ties so a re-learned script replaces an older one
+        candidates = sorted(overlap, key=lambda position: (-overlap[position], -position))[:CANDIDATE_LIMIT]
+        best_score, best_position = 0.0, None
+        for position in candidates:
+            score = cosine(vector, self.vectors[position])
+            if score > best_score:
+                best_score, best_position = score, position
+        if best_position is None:
+            return 0.0, None
+        return best_score, self.payloads[best_position]
+
+
+class SemanticCache(object):
+    """Persistent store of (query, script) pairs that executed successfully"""
+
+    def __init__(self, path=CACHE_PATH, threshold=0.85, max_entries=10000):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.index = VectorIndex()
+        self.lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def from_config(cls, config, path=CACHE_PATH):
+        """Create a cache from the 'semantic_cache' config section, or None if disabled"""
+        settings = dict(DEFAULT_SEMANTIC_CONFIG)
+        settings.update(config.get('semantic_cache') or {})
+        if not settings['enabled']:
+            return None
+        return cls(path, float(settings['threshold']), int(settings['max_entries']))
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with io.open(self.path, 'r', encoding='utf-8') as f:
+            entries = []
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        for entry in entries[-self.max_entries:]:
+            self.index.add(entry['query'], entry)
+
+    def lookup(self, query):
+        """Return (similarity, entry) when a stored query is close enough, else (similarity, None)"""
+        with self.lock:
+            score, entry = self.index.nearest(query)
+        if entry is None or score < self.threshold:
+            return score, None
+        return score, entry
+
+    def remember(self, query, code, model=None):
+        """Store a script that ran successfully for the query"""
+        entry = {'query': query, 'code': code, 'model': model}
+        with self.lock:
+            self.index.add(query, entry)
+            if self.path:
+                directory = os.path.dirname(self.path)
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                with io.open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=True) + u'\n')
+            if len(self.index) > self.max_entries * 2:
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the store keeping only the newest max_entries scripts"""
+        entries = self.index.payloads[-self.max_entries:]
+        self.index = VectorIndex()
+        for entry in entries:
+            self.index.add(entry['query'], entry)
+        if self.path:
+            with io.open(self.path, 'w', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=True) + u'\n')
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental parsing of server-sent event streams from Claude and Gemini
+"""
+import json
+import time
+
+
+class StreamError(Exception):
+    """Raised when a provider reports an error inside the event stream"""
+    pass
+
+
+class TruncatedStream(StreamError):
+    """Raised when a stream ends without its terminal event, e.g. a connection dropped mid-response"""
+    pass
+
+
+def iter_sse_events(stream):
+    """Yield (event, data) pairs from a file-like SSE byte stream
+
+    Follows the SSE framing rules: 'event:' and 'data:' fields accumulate until
+    a blank line dispatches the event; comment lines start with ':'.
+    """
+    event = None
+    data_lines = []
+    while True:
+        line = stream.readline()
+        if not line:
+            break
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.rstrip('\r\n')
+
+        if not line:
+            if data_lines:
+                yield event or 'message', '\n'.join(data_lines)
+            event = None
+            data_lines = []
+            continue
+        if line.startswith(':'):
+            continue
+
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if field == 'event':
+            event = value
+        elif field == 'data':
+            data_lines.append(value)
+
+    if data_lines:
+        yield event or 'message', '\n'.join(data_lines)
+
+
+def claude_text_deltas(events, usage=None):
+    """Yield text fragments from a Messages API event stream
+
+    A `usage` dict, if given, receives the token counts reported in the
+    message_start and message_delta events. A stream that ends before
+    message_stop raises TruncatedStream rather than passing for complete.
+    """
+    for event, data in events:
+        if event == 'ping':
+            continue
+        payload = json.loads(data)
+        kind = payload.get('type', event)
+        if usage is not None:
+            if kind == 'message_start':
+                usage.update(payload.get('message', {}).get('usage') or {})
+            elif kind == 'message_delta':
+                usage.update(payload.get('usage') or {})
+        if kind == 'content_block_delta':
+            delta = payload.get('delta', {})
+            if delta.get('type') == 'text_delta':
+                yield delta.get('text', '')
+        elif kind == 'error':
+            raise StreamError(payload.get('error', {}).get('message', data))
+        elif kind == 'message_stop':
+            return
+    raise TruncatedStream("Claude stream ended before message_stop")
+
+
+def gemini_text_deltas(events, usage=None):
+    """Yield text fragments from a streamGenerateContent (alt=sse) stream
+
+    A `usage` dict, if given, receives the latest usageMetadata. A stream
+    whose candidates never report a finishReason raises TruncatedStream.
+    """
+    finished = False
+    for event, data in events:
+        payload = json.loads(data)
+        if 'error' in payload:
+            raise StreamError(payload['error'].get('message', data))
+        if usage is not None and 'usageMetadata' in payload:
+            usage.update(payload['usageMetadata'])
+        for candidate in payload.get('candidates', []):
+            finished = finished or bool(candidate.get('finishReason'))
+            for part in candidate.get('content', {}).get('parts', []):
+                if part.get('text'):
+                    yield part['text']
+    if not finished:
+        raise TruncatedStream("Gemini stream ended without a finishReason")
+
+
+def collect_stream(deltas, on_token=None, timings=None, started=None):
+    """Join text fragments, forwarding each one to `on_token` as it arrives
+
+    When a `timings` dict is given it receives 'first_token' (seconds from
+    `started` to the first non-empty fragment).
+    """
+    parts = []
+    for text in deltas:
+        if not text:
+            continue
+        if timings is not None and started is not None and 'first_token' not in timings:
+            timings['first_token'] = time.time() - started
+        parts.append(text)
+        if on_token is not None:
+            on_token(text)
+    return ''.join(parts)
+
+
+def partial_code_block(text):
+    """Return the code generated so far inside the first ``` fence, or None"""
+    start = text.find('```')
+    if start < 0:
+        return None
+    newline = text.find('\n', start)
+    if newline < 0:
+        return ''
+    end = text.find('\n```', newline)
+    return text[newline + 1:end if end >= 0 else len(text)]
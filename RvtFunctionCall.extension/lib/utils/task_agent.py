@@ -1,84 +1,202 @@
 # -*- coding: utf-8 -*-
 """
 Task understanding for Revit operations
+
+Keywords are matched on word boundaries (an optional trailing "s" covers
+plurals) by a single regex compiled at import time from every keyword
+table, so one scan of the query finds every action, element, parameter and
+complexity cue together with its position.
+
+A local classifier (see intent_classifier) then scores the primary action,
+supplies one when no action keyword matched, and decides for "level",
+"floor" and "family" whether the word names the target element or a
+parameter.
 """
+import re
+
+from .intent_classifier import get_classifier, intent_settings
+
+# Earlier actions take priority as primary_action,
+# except that "analyze" verbs (list, show, report) yield to any other action
+ACTION_KEYWORDS = [
+    ("create", ["create", "make", "add", "new", "generate", "place"]),
+    ("select", ["select", "find", "get", "collect", "filter"]),
+    ("modify", ["move", "copy", "rotate", "modify", "change", "update", "set", "rename"]),
+    ("delete", ["delete", "remove", "erase"]),
+    ("analyze", ["list", "show", "display", "report", "analyze", "count", "calculate", "how many"])
+]
+
+ELEMENT_KEYWORDS = [
+    ("walls", ["wall"]),
+    ("doors", ["door"]),
+    ("windows", ["window"]),
+    ("floors", ["floor", "slab"]),
+    ("ceilings", ["ceiling"]),
+    ("rooms", ["room", "space"]),
+    ("grids", ["grid", "gridline"]),
+    ("levels", ["level"]),
+    ("families", ["family", "families", "family instance"]),
+    ("elements", ["element", "component"])
+]
+
+PARAMETER_KEYWORDS = [
+    ("height", ["height", "tall", "taller", "tallest", "elevation"]),
+    ("width", ["width", "wide", "wider", "widest", "thick", "thickness"]),
+    ("length", ["length", "long", "longer", "longest", "shorter", "distance", "spacing"]),
+    ("location", ["location", "position", "coordinate", "point"]),
+    ("material", ["material", "finish"]),
+    ("type", ["type", "family", "style"]),
+    ("level", ["level", "floor"]),
+    ("name", ["name", "tag", "mark", "label"])
+]
+
+COMPLEXITY_KEYWORDS = [
+    ("complex", ["all", "multiple", "batch", "many", "every", "loop", "iterate"]),
+    ("simple", ["one", "single", "this", "selected"])
+]
+
+KEYWORD_TABLES = [
+    ("action", ACTION_KEYWORDS),
+    ("element", ELEMENT_KEYWORDS),
+    ("parameter", PARAMETER_KEYWORDS),
+    ("complexity", COMPLEXITY_KEYWORDS)
+]
+
+def _keyword_map(tables):
+    """Map every keyword to the (kind, label) pairs it signals"""
+    keywords = {}
+    for kind, table in tables:
+        for label, words in table:
+            for word in words:
+                keywords.setdefault(word, []).append((kind, label))
+    return keywords
 
-def understand_and_formulate_tasks(query):
-    """Analyze user query to understand intent and formulate specific tasks"""
-    query_lower = query.lower()
+def _trie_pattern(words):
+    """Regex alternation for `words` factored into a prefix trie
+    
+    The engine then follows one branch per character instead of trying
+    every keyword in turn - in effect an Aho-Corasick scan. Optional
+    branches are greedy, so the longest keyword wins ("tallest" over "tall").
+    """
+    tree = {}
+    for word in words:
+        node = tree
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:{})'.format('|'.join(branches))
+        return '(?:{})?'.format(body) if '' in node else body
+    
+    return build(tree)
+
+KEYWORDS = _keyword_map(KEYWORD_TABLES)
+KEYWORD_PATTERN = re.compile(r"\b({})s?\b".format(_trie_pattern(KEYWORDS)))
+
+def match_intents(query):
+    """Return every keyword match as {'kind', 'label', 'text', 'start', 'end'}, in query order
+    
+    'kind' is 'action', 'element', 'parameter' or 'complexity'. A word can
+    match more than one kind ("floor" is an element and a level parameter).
+    """
+    matches = []
+    for match in KEYWORD_PATTERN.finditer(query.lower()):
+        for kind, label in KEYWORDS[match.group(1)]:
+            matches.append({
+                'kind': kind,
+                'label': label,
+                'text': query[match.start():match.end()],
+                'start': match.start(),
+                'end': match.end()
+            })
+    return matches
+
+def _labels(matches, kind, table):
+    """Distinct labels of `kind` in keyword table order"""
+    found = set(item['label'] for item in matches if item['kind'] == kind)
+    return [label for label, keywords in table if label in found]
+
+def resolve_roles(query, matches, classifier):
+    """Keep only the element or the parameter reading of words that match both"""
+    kinds = {}
+    for item in matches:
+        kinds.setdefault(item['start'], set()).add(item['kind'])
+    roles = {}
+    for item in matches:
+        if item['start'] not in roles and {'element', 'parameter'} <= kinds[item['start']]:
+            roles[item['start']] = classifier.role(query, item['start'], item['end'])[0]
+    return [item for item in matches
+            if item['start'] not in roles or item['kind'] not in ('element', 'parameter')
+            or item['kind'] == roles[item['start']]]
+
+def understand_and_formulate_tasks(query, config=None):
+    """Analyze user query to understand intent and formulate specific tasks
+    
+    'actions' lists every action found, in query order; the first one that
+    is not "analyze" (or "analyze" if it is the only kind) becomes
+    primary_action, so "create a list of doors" is create plus analyze.
+    
+    With the intent classifier enabled (config 'intent_classifier') a query
+    naming no action takes the classifier's action when it reaches
+    'min_confidence'; a named action is kept even when the classifier
+    prefers another. 'confidence' is the classifier's probability for the
+    primary action and 'low_confidence' is set below 'min_confidence', so
+    callers can retrieve more broadly when the two disagree.
+    
+    'requires_transaction' and 'requires_selection' look at every action,
+    not just the primary one: "select the walls and delete them" is a select
+    that still needs a transaction and elements to delete. Any create,
+    modify or delete needs a transaction; any modify or delete needs
+    elements to act on, which docs_router turns into selection docs.
+    """
+    settings = intent_settings(config)
+    classifier = get_classifier() if settings['enabled'] else None
+    matches = match_intents(query)
+    if classifier is not None:
+        matches = resolve_roles(query, matches, classifier)
+    
+    actions = []
+    for item in matches:
+        if item['kind'] == 'action' and item['label'] not in actions:
+            actions.append(item['label'])
     
     task_analysis = {
         "primary_action": None,
-        "target_elements": [],
-        "parameters": {},
+        "actions": actions,
+        "target_elements": _labels(matches, 'element', ELEMENT_KEYWORDS),
+        "parameters": dict((param, True) for param in _labels(matches, 'parameter', PARAMETER_KEYWORDS)),
         "complexity": "simple",
         "requires_selection": False,
         "requires_transaction": False,
-        "suggested_approach": ""
-    }
-    
-    if any(word in query_lower for word in ["create", "make", "add", "new", "generate"]):
-        task_analysis["primary_action"] = "create"
-        task_analysis["requires_transaction"] = True
-        
-    elif any(word in query_lower for word in ["select", "find", "get", "collect", "filter"]):
-        task_analysis["primary_action"] = "select"
-        task_analysis["requires_selection"] = False
-        
-    elif any(word in query_lower for word in ["move", "copy", "rotate", "modify", "change", "update"]):
-        task_analysis["primary_action"] = "modify"
-        task_analysis["requires_selection"] = True
-        task_analysis["requires_transaction"] = True
-        
-    elif any(word in query_lower for word in ["delete", "remove", "erase"]):
-        task_analysis["primary_action"] = "delete"
-        task_analysis["requires_selection"] = True
-        task_analysis["requires_transaction"] = True
-        
-    elif any(word in query_lower for word in ["list", "show", "display", "report", "analyze"]):
-        task_analysis["primary_action"] = "analyze"
-    
-    element_types = {
-        "walls": ["wall", "walls"],
-        "doors": ["door", "doors"], 
-        "windows": ["window", "windows"],
-        "floors": ["floor", "floors", "slab"],
-        "ceilings": ["ceiling", "ceilings"],
-        "rooms": ["room", "rooms", "space", "spaces"],
-        "grids": ["grid", "grids", "gridline"],
-        "levels": ["level", "levels"],
-        "families": ["family", "families", "family instance"],
-        "elements": ["element", "elements", "component", "components"]
-    }
-    
-    for element_type, keywords in element_types.items():
-        if any(keyword in query_lower for keyword in keywords):
-            task_analysis["target_elements"].append(element_type)
-    
-    parameter_indicators = {
-        "height": ["height", "tall", "elevation"],
-        "width": ["width", "wide", "thickness"],
-        "length": ["length", "long", "distance"],
-        "location": ["location", "position", "coordinate", "point"],
-        "material": ["material", "finish"],
-        "type": ["type", "family", "style"],
-        "level": ["level", "floor"],
-        "name": ["name", "tag", "mark", "label"]
+        "suggested_approach": "",
+        "confidence": None,
+        "low_confidence": False
     }
     
-    for param, keywords in parameter_indicators.items():
-        if any(keyword in query_lower for keyword in keywords):
-            task_analysis["parameters"][param] = True
-    
-    complexity_indicators = {
-        "complex": ["all", "multiple", "batch", "many", "every", "loop", "iterate"],
-        "simple": ["one", "single", "this", "selected"]
-    }
+    primary = [action for action in actions if action != "analyze"] or actions
+    if primary:
+        task_analysis["primary_action"] = primary[0]
+    if classifier is not None:
+        prediction = classifier.classify(query)
+        probabilities = prediction['probabilities']
+        if not actions and prediction['confidence'] >= settings['min_confidence']:
+            # The classifier fills in verbs the keywords do not know ("purge", "isolate")
+            task_analysis["primary_action"] = prediction['action']
+            actions.append(prediction['action'])
+        # A keyword action the classifier disagrees with stands, but at low confidence
+        confidence = probabilities.get(task_analysis["primary_action"], prediction['confidence'])
+        task_analysis["confidence"] = confidence
+        task_analysis["low_confidence"] = confidence < settings['min_confidence']
+    task_analysis["requires_transaction"] = any(action in ("create", "modify", "delete") for action in actions)
+    task_analysis["requires_selection"] = any(action in ("modify", "delete") for action in actions)
     
-    for complexity, keywords in complexity_indicators.items():
-        if any(keyword in query_lower for keyword in keywords):
-            task_analysis["complexity"] = complexity
-            break
+    complexity = _labels(matches, 'complexity', COMPLEXITY_KEYWORDS)
+    if complexity:
+        task_analysis["complexity"] = complexity[0]
     
     if task_analysis["primary_action"] == "create":
         if task_analysis["target_elements"]:
@@ -116,6 +234,10 @@ def formulate_enhanced_query(original_query, task_analysis):
         "- Suggested Approach: {}".format(task_analysis["suggested_approach"]),
     ]
     
+    other_actions = [action for action in task_analysis.get("actions", []) if action != task_analysis["primary_action"]]
+    if other_actions:
+        enhanced_parts.append("- Also Requested: {}".format(", ".join(other_actions)))
+    
     if task_analysis["parameters"]:
         enhanced_parts.append("- Parameters Involved: {}".format(", ".join(task_analysis["parameters"].keys())))
     
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight tracing of the assistant pipeline
+
+A Trace collects spans (name, start offset, duration, attributes) measured
+on a monotonic clock for one request - task analysis, retrieval, prompt
+building, time to first byte, generation, display - plus token counts and
+cache outcomes, and appends them as one JSON line to a size-rotated trace
+file. `python -m utils.tracing summary` reads every trace file in the
+configured directory and prints p50/p95/p99 per stage across sessions.
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from .config import load_config
+from .hedging import percentile
+
+try:
+    _clock = time.monotonic
+except AttributeError:
+    try:
+        from System.Diagnostics import Stopwatch
+
+        def _clock():
+            return Stopwatch.GetTimestamp() / float(Stopwatch.Frequency)
+    except ImportError:
+        _clock = time.time
+
+TRACE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'cache', 'traces')
+TRACE_FILE = 'traces.jsonl'
+
+DEFAULT_TRACE_CONFIG = {
+    'enabled': True,
+    'directory': '',            # Empty uses cache/traces in the extension folder
+    'max_mb': 5,                # Rotate the trace file beyond this size
+    'backups': 3                # Rotated files kept (traces.1.jsonl ... traces.3.jsonl)
+}
+
+_WRITERS = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+def trace_settings(config):
+    settings = dict(DEFAULT_TRACE_CONFIG)
+    settings.update(config.get('tracing') or {})
+    return settings
+
+
+def trace_directory(config):
+    return trace_settings(config)['directory'] or TRACE_DIR
+
+
+def now():
+    """Monotonic seconds, for span boundaries measured outside a Trace"""
+    return _clock()
+
+
+class TraceWriter(object):
+    """Appends trace records to a JSONL file, rotating it by size"""
+
+    def __init__(self, directory=TRACE_DIR, max_bytes=5 * 1024 * 1024, backups=3):
+        self.directory = directory
+        self.path = os.path.join(directory, TRACE_FILE)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+
+    def _rotate(self):
+        for index in range(self.backups, 0, -1):
+            source = self.path if index == 1 else self._backup(index - 1)
+            if os.path.exists(source):
+                target = self._backup(index)
+                if os.path.exists(target):
+                    os.remove(target)
+                os.rename(source, target)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _backup(self, index):
+        return os.path.join(self.directory, 'traces.{}.jsonl'.format(index))
+
+    def write(self, record):
+        line = json.dumps(record, sort_keys=True) + '\n'
+        with self.lock:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                self._rotate()
+            with io.open(self.path, 'a', encoding='utf-8') as f:
+                f.write(u'{}'.format(line))
+
+
+def get_writer(config):
+    """Return the shared writer for the configured directory, or None when tracing is off"""
+    settings = trace_settings(config)
+    if not settings['enabled']:
+        return None
+    directory = trace_directory(config)
+    key = (directory, float(settings['max_mb']), int(settings['backups']))
+    with _WRITERS_LOCK:
+        writer = _WRITERS.get(key)
+        if writer is None:
+            writer = _WRITERS[key] = TraceWriter(directory, int(float(settings['max_mb']) * 1024 * 1024),
+                                                 int(settings['backups']))
+        return writer
+
+
+class Trace(object):
+    """Spans and attributes of one request; thread-safe, written once by finish()"""
+
+    def __init__(self, name, writer=None, **attrs):
+        self.name = name
+        self.writer = writer
+        self.attrs = dict(attrs)
+        self.spans = []
+        self.started = _clock()
+        self.started_at = time.time()
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def add_span(self, name, start, duration, **attrs):
+        """Record a span that began at monotonic time `start` and lasted `duration` seconds"""
+        span = {'name': name, 'start_ms': round((start - self.started) * 1000.0, 2),
+                'duration_ms': round(max(duration, 0.0) * 1000.0, 2)}
+        span.update((key, value) for key, value in attrs.items() if value is not None)
+        with self.lock:
+            self.spans.append(span)
+        return span
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """Time a block; the yielded dict takes extra attributes"""
+        values = dict(attrs)
+        start = _clock()
+        try:
+            yield values
+        except Exception as e:
+            values['error'] = type(e).__name__
+            raise
+        finally:
+            self.add_span(name, start, _clock() - start, **values)
+
+    def set(self, **attrs):
+        with self.lock:
+            self.attrs.update(attrs)
+
+    def add_generation(self, start, info):
+        """Split a get_ai_response() call that began at `start` into spans from its info dict"""
+        elapsed = info.get('elapsed', _clock() - start)
+        self.set(response_cache=info.get('response_cache'), prompt_tokens=info.get('prompt_tokens'),
+                 response_tokens=info.get('response_tokens'))
+        if info.get('prompt_cache'):
+            self.set(prompt_cache=info['prompt_cache'].get('status'),
+                     prompt_cache_saved_tokens=info['prompt_cache'].get('saved_input_tokens'))
+        if info.get('hedged') is not None:
+            self.set(hedged=info['hedged'], winner=info.get('winner'))
+        if info.get('cached'):
+            self.add_span('response_cache', start, elapsed, hit=True)
+            return
+
+        offset = start
+        lookup = info.get('cache_lookup')
+        if lookup is not None and info.get('response_cache') not in ('off', 'skipped'):
+            self.add_span('response_cache', offset, lookup, hit=False)
+            offset += lookup
+        prompt = info.get('prompt_build')
+        if prompt is not None:
+            self.add_span('prompt', offset, prompt, tokens=info.get('prompt_tokens'))
+            offset += prompt
+        first_token = info.get('first_token')
+        if first_token is not None:
+            self.add_span('ttfb', offset, first_token)
+            offset += first_token
+        self.add_span('generation', offset, start + elapsed - offset, tokens=info.get('response_tokens'))
+
+    def finish(self, **attrs):
+        """Close the trace and append it to the trace file; later calls do nothing"""
+        with self.lock:
+            if self.finished:
+                return None
+            self.finished = True
+            self.attrs.update(attrs)
+            record = {
+                'trace': self.name,
+                'timestamp': round(self.started_at, 3),
+                'duration_ms': round((_clock() - self.started) * 1000.0, 2),
+                'spans': sorted(self.spans, key=lambda span: span['start_ms']),
+                'attrs': dict((key, value) for key, value in self.attrs.items() if value is not None)
+            }
+        if self.writer is not None:
+            try:
+                self.writer.write(record)
+            except (IOError, OSError):
+                pass
+        return record
+
+
+def start_trace(name, config, **attrs):
+    """Begin a Trace that is written to the configured trace file (or nowhere when tracing is off)"""
+    return Trace(name, get_writer(config), **attrs)
+
+
+def trace_files(directory=TRACE_DIR):
+    """Current and rotated trace files, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    paths = []
+    index = 1
+    while os.path.exists(os.path.join(directory, 'traces.{}.jsonl'.format(index))):
+        paths.insert(0, os.path.join(directory, 'traces.{}.jsonl'.format(index)))
+        index += 1
+    if os.path.exists(os.path.join(directory, TRACE_FILE)):
+        paths.append(os.path.join(directory, TRACE_FILE))
+    return paths
+
+
+def read_traces(paths):
+    records = []
+    for path in paths:
+        with io.open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+    return records
+
+
+def summarize(records, trace=None):
+    """Per-stage {'count', 'p50', 'p95', 'p99', 'mean'} in ms; 'total' covers whole traces"""
+    durations = {}
+    for record in records:
+        if trace is not None and record.get('trace') != trace:
+            continue
+        durations.setdefault('total', []).append(record['duration_ms'])
+        for span in record.get('spans', []):
+            durations.setdefault(span['name'], []).append(span['duration_ms'])
+    summary = {}
+    for stage, values in durations.items():
+        summary[stage] = {
+            'count': len(values),
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'mean': round(sum(values) / len(values), 2)
+        }
+    return summary
+
+
+def format_summary(summary):
+    stages = sorted(summary, key=lambda stage: (stage == 'total', -summary[stage]['p50']))
+    lines = ["{:<16} {:>7} {:>10} {:>10} {:>10}".format('stage', 'count', 'p50 ms', 'p95 ms', 'p99 ms')]
+    for stage in stages:
+        values = summary[stage]
+        lines.append("{:<16} {:>7} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+            stage, values['count'], values['p50'], values['p95'], values['p99']))
+    return "\n".join(lines)
+
+
+def _load_summary_config(path=None):
+    """The config whose 'tracing.directory' is summarized: a JSON file, or the extension's config.json"""
+    if path:
+        with io.open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return load_config()
+
+
+def main(argv=None):
+    """python -m utils.tracing summary [--dir DIR] [--config FILE] [--trace NAME] [--json]"""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != 'summary':
+        sys.stderr.write("Usage: python -m utils.tracing summary [--dir DIR] [--config FILE] [--trace NAME] "
+                         "[--json]\n")
+        return 2
+    if '--dir' in argv:
+        directory = argv[argv.index('--dir') + 1]
+    else:
+        directory = trace_directory(_load_summary_config(argv[argv.index('--config') + 1]
+                                                         if '--config' in argv else None))
+    trace = argv[argv.index('--trace') + 1] if '--trace' in argv else None
+    records = read_traces(trace_files(directory))
+    summary = summarize(records, trace)
+    if '--json' in argv:
+        print(json.dumps(summary, sort_keys=True))
+    elif not summary:
+        print("No traces in {}".format(directory))
+    else:
+        print("{} trace(s) from {}".format(summary['total']['count'], directory))
+        print(format_summary(summary))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
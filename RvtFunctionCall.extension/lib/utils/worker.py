@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Background execution with cooperative cancellation
+
+Work runs on a daemon thread; results, errors and progress are marshalled
+back through a `dispatch` callable (in the assistant, the WPF dispatcher) so
+UI objects are only touched on the UI thread.
+"""
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+# Queued once per worker thread after the items; a thread that takes it exits
+_NO_MORE_ITEMS = object()
+
+
+class OperationCancelled(Exception):
+    """Raised inside background work once its token has been cancelled"""
+    pass
+
+
+class CancellationToken(object):
+    """Thread-safe cancellation flag checked by background work"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled("Operation cancelled")
+
+    def wait(self, seconds):
+        """Sleep up to `seconds`, returning True early if cancelled"""
+        self._event.wait(seconds)
+        return self._event.is_set()
+
+
+def call_directly(callback):
+    """Default dispatcher: run callbacks on the worker thread"""
+    callback()
+
+
+class BackgroundTask(object):
+    """Run `work(token, report)` on a daemon thread
+
+    `on_result(result)`, `on_error(exception)` and `on_progress(*args)` are
+    invoked through `dispatch`. A cancelled task always finishes through
+    `on_error` with OperationCancelled, even if the work itself completed.
+    """
+
+    def __init__(self, work, on_result=None, on_error=None, on_progress=None, dispatch=None):
+        self.work = work
+        self.on_result = on_result
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.dispatch = dispatch or call_directly
+        self.token = CancellationToken()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.token.cancel()
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def report(self, *args):
+        """Forward progress to the UI unless the task was cancelled"""
+        if self.on_progress is not None and not self.token.is_cancelled:
+            self.dispatch(lambda: self.on_progress(*args))
+
+    def _finish_with_error(self, error):
+        if self.on_error is not None:
+            self.dispatch(lambda: self.on_error(error))
+
+    def _run(self):
+        try:
+            result = self.work(self.token, self.report)
+        except OperationCancelled as e:
+            self._finish_with_error(e)
+            return
+        except Exception as e:
+            error = OperationCancelled("Operation cancelled") if self.token.is_cancelled else e
+            self._finish_with_error(error)
+            return
+
+        if self.token.is_cancelled:
+            self._finish_with_error(OperationCancelled("Operation cancelled"))
+        elif self.on_result is not None:
+            self.dispatch(lambda: self.on_result(result))
+
+
+def run_concurrently(work, items, concurrency=4, token=None):
+    """Yield (item, result, error) for each item as soon as work(item) finishes
+
+    At most `concurrency` items run at once on daemon threads. Exactly one
+    tuple is yielded per item; once `token` is cancelled the items not yet
+    started are yielded with an OperationCancelled error instead of running.
+    The threads are joined before the generator finishes, also when the
+    caller stops early, so none is left running at interpreter exit (where
+    Python 2 kills them mid-call and prints a traceback).
+    """
+    items = list(items)
+    workers = max(1, min(concurrency, len(items)))
+    pending = queue.Queue()
+    for item in items:
+        pending.put(item)
+    for _ in range(workers):
+        pending.put(_NO_MORE_ITEMS)
+    done = queue.Queue()
+    stopped = threading.Event()
+
+    def run():
+        while True:
+            item = pending.get()
+            if item is _NO_MORE_ITEMS:
+                return
+            if stopped.is_set():
+                continue
+            if token is not None and token.is_cancelled:
+                done.put((item, None, OperationCancelled("Operation cancelled")))
+                continue
+            try:
+                done.put((item, work(item), None))
+            except Exception as e:
+                done.put((item, None, e))
+
+    threads = []
+    for _ in range(workers):
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    try:
+        for _ in range(len(items)):
+            yield done.get()
+    finally:
+        # Items the caller no longer wants are skipped, not run
+        stopped.set()
+        for thread in threads:
+            thread.join()
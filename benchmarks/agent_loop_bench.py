@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Agent loop benchmark: generate -> check -> repair cycles against the stand-in API
+
+A scripted dry run fails the first --failures attempts, so the loop has to
+feed the error back that many times. Reports wall-clock time, iterations,
+estimated tokens, prompt cache outcomes per iteration and how many TCP
+connections the whole task used. A second run with a small token budget
+shows the loop stopping early.
+
+Usage:
+    python benchmarks/agent_loop_bench.py [--failures 2] [--model claude]
+"""
+import json
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, BENCH_DIR)
+
+from standin_server import StandinServer, _option  # noqa: E402
+from utils.agent_loop import AgentLoop, format_history  # noqa: E402
+from utils.docs_lookup import find_relevant_context  # noqa: E402
+from utils.task_agent import formulate_enhanced_query, understand_and_formulate_tasks  # noqa: E402
+
+QUERY = "select all walls on level 1 and set their comments parameter"
+
+
+def scripted_dry_run(failures):
+    attempts = []
+
+    def dry_run(code):
+        attempts.append(code)
+        if len(attempts) <= failures:
+            return "AttributeError: 'NoneType' object has no attribute 'Set' (attempt {})".format(len(attempts))
+        return None
+    return dry_run
+
+
+def run(model, failures, **settings):
+    server = StandinServer(first_byte_ms=50, tokens_per_second=0).start()
+    config = server.assistant_config()
+    agent = {'max_iterations': failures + 2, 'token_budget': 0}
+    agent.update(settings)
+    config.update({
+        'response_cache': {'enabled': False},
+        'prompt_cache': {'enabled': True},
+        'agent_loop': agent
+    })
+    context = find_relevant_context(QUERY)
+    prompt = formulate_enhanced_query(QUERY, understand_and_formulate_tasks(QUERY))
+    loop = AgentLoop(QUERY, prompt, context, model, config, dry_run=scripted_dry_run(failures),
+                     on_token=lambda text: None)
+    result = loop.run()
+    server.shutdown()
+    return {
+        'status': result['status'],
+        'iterations': result['iterations'],
+        'tokens': result['tokens'],
+        'elapsed_ms': round(result['elapsed'] * 1000.0, 1),
+        'connections': server.connections,
+        'history': format_history(result)
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    failures = int(_option(argv, '--failures', 2))
+    model = _option(argv, '--model', 'claude')
+    for name, settings in (('unlimited budget', {}), ('budget 1500 tokens', {'token_budget': 1500})):
+        report = run(model, failures, **settings)
+        history = report.pop('history')
+        print("{}: {}".format(name, json.dumps(report, sort_keys=True)))
+        print(history)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Batch generation throughput from 1 to 32 workers against the stand-in API
+
+Sends --requests enhanced queries spread over eight intents through
+ai_client.batch_responses at each worker count. Requests with the same
+intent share one documentation lookup, so the prompt prefix repeats and the
+stand-in's emulated prompt cache serves it. Reports throughput, speedup over
+one worker, p50/p95 latency per request and prompt cache hits. Finally one
+run with a 600 requests/minute provider limit shows the rate limiter holding
+throughput at ~10/s.
+
+Usage:
+    python benchmarks/batch_bench.py [--requests 64] [--first-byte-ms 100] [--model claude]
+"""
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, BENCH_DIR)
+
+from standin_server import StandinServer, _option  # noqa: E402
+from utils.ai_client import batch_responses  # noqa: E402
+from utils.hedging import percentile  # noqa: E402
+from utils.task_agent import formulate_enhanced_query, understand_and_formulate_tasks  # noqa: E402
+
+INTENTS = [
+    ("select", "select all {} on level 1"),
+    ("create", "create a new {} on level 2"),
+    ("modify", "set the comments parameter of every {}"),
+    ("delete", "delete all unused {} types"),
+    ("analyze", "count the {} on each level"),
+    ("schedule", "create a schedule of {}"),
+    ("tag", "tag all {} in the active view"),
+    ("export", "export a list of {} to csv")
+]
+ELEMENTS = ["walls", "doors", "windows", "rooms", "floors", "columns", "beams", "furniture"]
+
+
+def make_requests(count):
+    requests = []
+    for index in range(count):
+        intent, template = INTENTS[index % len(INTENTS)]
+        query = template.format(ELEMENTS[(index // len(INTENTS)) % len(ELEMENTS)])
+        requests.append({
+            'query': formulate_enhanced_query(query, understand_and_formulate_tasks(query)),
+            'intent': intent,
+            'lookup': template.format('elements')
+        })
+    return requests
+
+
+def run(server, model, requests, workers, per_minute=0):
+    config = server.assistant_config()
+    config.update({
+        'response_cache': {'enabled': False},
+        'batch': {'requests_per_minute': {model: per_minute}, 'burst': 1}
+    })
+    latencies, hits, errors = [], 0, 0
+    started = time.time()
+    last = started
+    for result in batch_responses(requests, model, config, concurrency=workers):
+        now = time.time()
+        if result['error'] is not None:
+            errors += 1
+            continue
+        latencies.append(result['info']['elapsed'])
+        if (result['info'].get('prompt_cache') or {}).get('status') == 'hit':
+            hits += 1
+        last = now
+    elapsed = last - started
+    return {
+        'workers': workers,
+        'requests_per_second': round(len(requests) / elapsed, 1),
+        'elapsed_s': round(elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'prompt_cache_hits': hits,
+        'errors': errors
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(_option(argv, '--requests', 64))
+    model = _option(argv, '--model', 'claude')
+    server = StandinServer(first_byte_ms=float(_option(argv, '--first-byte-ms', 100)), tokens_per_second=0).start()
+    requests = make_requests(count)
+
+    baseline = None
+    for workers in (1, 2, 4, 8, 16, 32):
+        report = run(server, model, requests, workers)
+        baseline = baseline or report['requests_per_second']
+        report['speedup'] = round(report['requests_per_second'] / baseline, 1)
+        print(json.dumps(report, sort_keys=True))
+    report = run(server, model, requests[:40], 16, per_minute=600)
+    report['rate_limit_per_minute'] = 600
+    print(json.dumps(report, sort_keys=True))
+    print(json.dumps({'tcp_connections': server.connections, 'requests': sum(server.request_counts.values())}))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Dry-run check and overhead benchmark against a mock Revit document
+
+The mock document keeps a dict of elements, fires DocumentChanged on every
+Transaction commit and restores its snapshot when the outer TransactionGroup
+rolls back, like Revit does; starting a Transaction inside an open one fails. Each scenario checks what
+utils.dry_run reports and that the model is unchanged afterwards; the last
+line compares a dry run with a plain exec of the same script.
+
+Usage:
+    python benchmarks/dry_run_bench.py [--runs 2000]
+"""
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, BENCH_DIR)
+
+from standin_server import _option  # noqa: E402
+from utils.dry_run import dry_run, format_result  # noqa: E402
+
+
+class MockEvent(object):
+
+    def __init__(self):
+        self.handlers = []
+
+    def __iadd__(self, handler):
+        self.handlers.append(handler)
+        return self
+
+    def __isub__(self, handler):
+        self.handlers.remove(handler)
+        return self
+
+    def fire(self, sender, args):
+        for handler in list(self.handlers):
+            handler(sender, args)
+
+
+class MockChangedArgs(object):
+
+    def __init__(self, added, modified, deleted):
+        self.ids = (added, modified, deleted)
+
+    def GetAddedElementIds(self):
+        return self.ids[0]
+
+    def GetModifiedElementIds(self):
+        return self.ids[1]
+
+    def GetDeletedElementIds(self):
+        return self.ids[2]
+
+
+class MockApplication(object):
+
+    def __init__(self):
+        self.DocumentChanged = MockEvent()
+
+
+class MockDocument(object):
+
+    def __init__(self, elements=10):
+        self.Application = MockApplication()
+        self.elements = dict((index, {'Comments': ''}) for index in range(elements))
+        self.next_id = elements
+        self.open_transactions = 0
+        self.pending = ([], [], [])
+
+    @property
+    def IsModifiable(self):
+        return self.open_transactions > 0
+
+    def _require_transaction(self):
+        if not self.open_transactions:
+            raise Exception("Modification of the document is forbidden outside of a transaction")
+
+    def Create(self):
+        self._require_transaction()
+        element_id, self.next_id = self.next_id, self.next_id + 1
+        self.elements[element_id] = {'Comments': ''}
+        self.pending[0].append(element_id)
+        return element_id
+
+    def Set(self, element_id, name, value):
+        self._require_transaction()
+        self.elements[element_id][name] = value
+        self.pending[1].append(element_id)
+
+    def Delete(self, element_id):
+        self._require_transaction()
+        del self.elements[element_id]
+        self.pending[2].append(element_id)
+
+    def snapshot(self):
+        return dict((key, dict(value)) for key, value in self.elements.items()), self.next_id
+
+
+class MockTransaction(object):
+
+    def __init__(self, doc, name=None):
+        self.doc = doc
+        self.started = False
+
+    def Start(self):
+        if self.doc.open_transactions:
+            raise Exception("Starting a new transaction is not permitted while another one is open")
+        self.doc.open_transactions += 1
+        self.doc.pending = ([], [], [])
+        self.started = True
+
+    def Commit(self):
+        self.doc.open_transactions -= 1
+        self.started = False
+        changes, self.doc.pending = self.doc.pending, ([], [], [])
+        self.doc.Application.DocumentChanged.fire(self.doc, MockChangedArgs(*changes))
+
+    def RollBack(self):
+        self.doc.open_transactions -= 1
+        self.started = False
+
+    def HasStarted(self):
+        return self.started
+
+    def HasEnded(self):
+        return not self.started
+
+
+class MockTransactionGroup(object):
+
+    def __init__(self, doc, name=None):
+        self.doc = doc
+        self.saved = None
+
+    def Start(self):
+        self.saved = self.doc.snapshot()
+
+    def RollBack(self):
+        if self.doc.open_transactions:
+            raise Exception("Cannot roll back a TransactionGroup while a Transaction is open")
+        self.doc.elements, self.doc.next_id = self.saved
+
+
+SCRIPTS = {
+    'modifies': """t = Transaction(doc, 'Edit')
+t.Start()
+for element_id in list(doc.elements)[:5]:
+    doc.Set(element_id, 'Comments', 'checked')
+doc.Delete(9)
+new_id = doc.Create()
+t.Commit()""",
+    'raises': """t = Transaction(doc, 'Edit')
+t.Start()
+doc.Set(0, 'Comments', 'x')
+t.Commit()
+doc.Set(1, 'Comments', missing_name)""",
+    'leaves_open': """t = Transaction(doc, 'Edit')
+t.Start()
+doc.Set(0, 'Comments', 'x')""",
+    'never_started': """doc.Delete(0)""",
+    'read_only': """count = len([element_id for element_id in doc.elements if doc.elements[element_id]['Comments'] == ''])"""
+}
+
+
+def namespace(doc):
+    return {'doc': doc, 'Transaction': MockTransaction}
+
+
+def scenario(name, expect_ok, expect_touched, modifiable=False):
+    doc = MockDocument()
+    before = doc.snapshot()
+    if modifiable:
+        doc.open_transactions = 1
+    result = dry_run(SCRIPTS[name], namespace(doc), MockTransactionGroup)
+    unchanged = doc.snapshot() == before
+    passed = result['ok'] == expect_ok and result['touched'] == expect_touched and (unchanged or not result['rolled_back'])
+    # With a Transaction already open the script must not run at all
+    passed = passed and bool(result['skipped']) == modifiable and (unchanged or not modifiable)
+    print("{} {}{}: {} [{}]".format("PASS" if passed else "FAIL", name, " (open transaction)" if modifiable else "",
+                                     format_result(result).replace("\n", " | "), result['scope']))
+    return passed
+
+
+def overhead(runs):
+    code = SCRIPTS['modifies']
+    compiled = compile(code, '<string>', 'exec')
+    started = time.time()
+    for _ in range(runs):
+        doc = MockDocument()
+        exec(compiled, namespace(doc))
+    plain = (time.time() - started) / runs
+    started = time.time()
+    for _ in range(runs):
+        doc = MockDocument()
+        dry_run(code, namespace(doc), MockTransactionGroup)
+    wrapped = (time.time() - started) / runs
+    return {'runs': runs, 'plain_exec_us': round(plain * 1e6, 1), 'dry_run_us': round(wrapped * 1e6, 1),
+            'overhead_us': round((wrapped - plain) * 1e6, 1)}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    results = [
+        scenario('modifies', True, 7),
+        scenario('raises', False, 1),
+        scenario('leaves_open', False, 0),
+        scenario('never_started', False, 0),
+        scenario('read_only', True, 0),
+        scenario('modifies', True, 0, modifiable=True)
+    ]
+    print(json.dumps(overhead(int(_option(argv, '--runs', 2000))), sort_keys=True))
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
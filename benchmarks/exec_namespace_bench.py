@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Per-execution overhead of preparing a generated script to run
+
+Before: every run walked dir() of the script module with getattr/hasattr to
+rebuild the globals, then exec'd the source string (compiling it again).
+After: a NamespaceTemplate built once is shallow-copied with doc/uidoc, and
+the code object comes from the source-hash cache.
+
+A synthetic module stands in for `from Autodesk.Revit.DB import *`
+(--names classes tagged with the Revit DB module). CPython attribute access
+is far cheaper than IronPython's .NET reflection, so the "before" numbers
+here understate the cost inside Revit.
+
+Usage:
+    python benchmarks/exec_namespace_bench.py [--names 2500] [--runs 500]
+"""
+import json
+import os
+import sys
+import time
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, BENCH_DIR)
+
+from standin_server import _option  # noqa: E402
+from utils.exec_cache import CodeCache, NamespaceTemplate, module_names  # noqa: E402
+
+SCRIPT = """walls = [w for w in FilteredElementCollector(doc) if w is not None]
+by_level = {}
+for wall in walls:
+    by_level.setdefault(wall % 3, []).append(wall)
+t = Transaction(doc, 'Tag walls')
+t.Start()
+for level, items in sorted(by_level.items()):
+    for item in items:
+        total = item * 2
+t.Commit()
+summary = "\\n".join("{}: {}".format(level, len(items)) for level, items in by_level.items())
+"""
+
+
+def fake_revit_module(count):
+    module = types.ModuleType('fake_script')
+    for index in range(count):
+        cls = type('RevitType{}'.format(index), (object,), {})
+        cls.__module__ = 'Autodesk.Revit.DB'
+        setattr(module, cls.__name__, cls)
+    for index in range(200):
+        setattr(module, 'helper{}'.format(index), index)
+    module.FilteredElementCollector = lambda doc: list(range(50))
+    module.FilteredElementCollector.__module__ = 'Autodesk.Revit.DB'
+    module.Transaction = type('Transaction', (object,), {
+        '__init__': lambda self, doc, name: None, 'Start': lambda self: None, 'Commit': lambda self: None})
+    module.Transaction.__module__ = 'Autodesk.Revit.DB'
+    return module
+
+
+def before(module):
+    exec_globals = {'doc': None, 'uidoc': None}
+    for attr_name in dir(module):
+        attr = getattr(module, attr_name)
+        if hasattr(attr, '__module__') and attr.__module__ == 'Autodesk.Revit.DB':
+            exec_globals[attr_name] = attr
+    return exec_globals, SCRIPT
+
+
+def after_factory(module):
+    template = NamespaceTemplate(lambda: module_names(module))
+    cache = CodeCache()
+
+    def after():
+        return template.fresh(doc=None, uidoc=None), cache.compile(SCRIPT)
+    return after
+
+
+def timed(prepare, runs, execute):
+    setup = 0.0
+    total_started = time.time()
+    for _ in range(runs):
+        started = time.time()
+        exec_globals, code = prepare()
+        if not execute:
+            code = compile(code, '<string>', 'exec') if not hasattr(code, 'co_code') else code
+        setup += time.time() - started
+        if execute:
+            exec(code, exec_globals)
+    return setup / runs, (time.time() - total_started) / runs
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    names = int(_option(argv, '--names', 2500))
+    runs = int(_option(argv, '--runs', 500))
+    module = fake_revit_module(names)
+
+    # Setup alone: globals plus a code object (before compiles the string, as exec would)
+    before_setup, _ = timed(lambda: before(module), runs, False)
+    after_setup, _ = timed(after_factory(module), runs, False)
+    # End to end, including running the script
+    _, before_total = timed(lambda: before(module), runs, True)
+    _, after_total = timed(after_factory(module), runs, True)
+
+    print(json.dumps({
+        'names': names,
+        'runs': runs,
+        'before_setup_us': round(before_setup * 1e6, 1),
+        'after_setup_us': round(after_setup * 1e6, 1),
+        'setup_speedup': round(before_setup / after_setup, 1) if after_setup else None,
+        'before_total_us': round(before_total * 1e6, 1),
+        'after_total_us': round(after_total * 1e6, 1)
+    }, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
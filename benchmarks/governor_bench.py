@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Fault-injection check for the request governor
+
+Drives the Claude provider against the stand-in API while it injects 429,
+529 and dropped connections, and verifies that requests recover (or give up)
+as configured and that the per-key token bucket spaces out concurrent calls.
+Prints one JSON line per scenario and exits non-zero if any check fails.
+
+Usage:
+    python benchmarks/governor_bench.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, BENCH_DIR)
+
+from standin_server import StandinServer  # noqa: E402
+from utils.http_pool import HTTPStatusError  # noqa: E402
+from utils.providers import ClaudeProvider  # noqa: E402
+from utils.worker import CancellationToken, OperationCancelled  # noqa: E402
+
+PROMPT = "USER REQUEST: select all walls"
+
+
+def provider_for(server, **governor):
+    settings = {'max_retries': 4, 'base_delay_ms': 100, 'max_delay_ms': 2000}
+    settings.update(governor)
+    config = server.assistant_config()
+    config['governor'] = settings
+    return ClaudeProvider(config)
+
+
+def scenario(name, faults, check, stream=False, **governor):
+    server = StandinServer(faults=faults).start()
+    retries = []
+    started = time.time()
+    outcome = 'ok'
+    try:
+        provider_for(server, **governor).generate(
+            PROMPT, (lambda text: None) if stream else None, None, None,
+            lambda attempt, delay, error: retries.append(round(delay, 3)))
+    except HTTPStatusError as e:
+        outcome = 'HTTP {}'.format(e.code)
+    elapsed = time.time() - started
+    server.shutdown()
+    result = {'scenario': name, 'faults': faults, 'outcome': outcome, 'retries': retries,
+              'requests': len(server.arrivals), 'elapsed_s': round(elapsed, 3)}
+    result['passed'] = bool(check(result))
+    return result
+
+
+def rate_limit_scenario(count=12, per_minute=600, burst=2):
+    server = StandinServer().start()
+    provider = provider_for(server, requests_per_minute=per_minute, burst=burst)
+    threads = [threading.Thread(target=provider.generate, args=(PROMPT,)) for _ in range(count)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    arrivals = sorted(t - started for t in server.arrivals)
+    expected = (count - burst) * 60.0 / per_minute
+    result = {'scenario': 'token bucket {}/min burst {}'.format(per_minute, burst), 'requests': count,
+              'span_s': round(arrivals[-1], 3), 'expected_min_span_s': expected}
+    result['passed'] = arrivals[-1] >= expected * 0.95 and len(arrivals) == count
+    return result
+
+
+def cancel_scenario():
+    server = StandinServer(faults=['429:30']).start()
+    token = CancellationToken()
+    threading.Timer(0.2, token.cancel).start()
+    started = time.time()
+    outcome = 'completed'
+    try:
+        provider_for(server, max_delay_ms=60000).generate(PROMPT, None, None, token)
+    except OperationCancelled:
+        outcome = 'cancelled'
+    elapsed = time.time() - started
+    server.shutdown()
+    return {'scenario': 'cancel during Retry-After wait', 'outcome': outcome, 'elapsed_s': round(elapsed, 3),
+            'passed': outcome == 'cancelled' and elapsed < 1.0}
+
+
+def main():
+    results = [
+        scenario('429 honours Retry-After', ['429:1'],
+                 lambda r: r['outcome'] == 'ok' and r['retries'] == [1.0] and r['elapsed_s'] >= 1.0),
+        scenario('529 overloaded backs off', ['529', '529', '529'],
+                 lambda r: r['outcome'] == 'ok' and len(r['retries']) == 3 and r['requests'] == 4),
+        scenario('dropped connection is retried', ['reset'],
+                 lambda r: r['outcome'] == 'ok' and r['requests'] == 2),
+        scenario('streamed request is retried before first token', ['529', 'ok'],
+                 lambda r: r['outcome'] == 'ok' and r['requests'] == 2, stream=True),
+        scenario('gives up after max_retries', ['529'] * 10,
+                 lambda r: r['outcome'] == 'HTTP 529' and r['requests'] == 3, max_retries=2),
+        scenario('client errors are not retried', ['400'],
+                 lambda r: r['outcome'] == 'HTTP 400' and r['requests'] == 1),
+        rate_limit_scenario(),
+        cancel_scenario()
+    ]
+    for result in results:
+        print(json.dumps(result, sort_keys=True))
+    if not all(result['passed'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Hedged request benchmark: tail latency with and without race mode
+
+Runs two stand-in APIs. Claude usually answers its first token in 150 ms but
+one request in 25 stalls for 3 s; Gemini steadily answers in 350 ms. The
+same request sequence is sent with race mode off and on, and total latency
+percentiles are compared.
+
+Usage:
+    python benchmarks/hedging_bench.py [--requests 100] [--spike-every 25]
+"""
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, BENCH_DIR)
+
+from standin_server import StandinServer, _option  # noqa: E402
+from utils.ai_client import get_ai_response  # noqa: E402
+from utils.hedging import get_tracker, percentile  # noqa: E402
+
+CONTEXT = {"documentation": [], "patterns": {}}
+
+
+def run(count, spike_every, claude_server, race):
+    config = {
+        'claude_api_key': 'standin',
+        'gemini_api_key': 'standin',
+        'claude_api_url': claude_server.base_url + '/v1/messages',
+        'gemini_api_url': run.gemini_url,
+        'response_cache': {'enabled': False},
+        'race': {'enabled': race, 'min_samples': 5}
+    }
+    latencies, winners = [], {}
+    for index in range(count):
+        claude_server.first_byte_ms = 3000 if index % spike_every == spike_every - 1 else 150
+        info = {}
+        started = time.time()
+        get_ai_response("select all walls {}".format(index), CONTEXT, 'claude', info=info,
+                        on_token=lambda text: None, config=config)
+        latencies.append((time.time() - started) * 1000.0)
+        winner = info.get('winner', 'claude')
+        winners[winner] = winners.get(winner, 0) + 1
+    return {
+        'race': race,
+        'requests': count,
+        'winners': winners,
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'p99_ms': round(percentile(latencies, 99), 1),
+        'max_ms': round(max(latencies), 1),
+        'mean_ms': round(sum(latencies) / len(latencies), 1)
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = _option(argv, '--requests', 100)
+    spike_every = _option(argv, '--spike-every', 25)
+
+    claude_server = StandinServer(tokens_per_second=400).start()
+    gemini_server = StandinServer(first_byte_ms=350, tokens_per_second=400).start()
+    run.gemini_url = gemini_server.base_url + '/v1beta/models'
+
+    print(json.dumps(run(count, spike_every, claude_server, False), sort_keys=True))
+    print(json.dumps(run(count, spike_every, claude_server, True), sort_keys=True))
+    summary = get_tracker().summary('claude')
+    print(json.dumps({'claude_first_token_ms': dict(
+        (key, round(value * 1000.0, 1) if key != 'count' else value) for key, value in summary.items())},
+        sort_keys=True))
+
+    claude_server.shutdown()
+    gemini_server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Connection pool benchmark: 50 sequential HTTPS requests, fresh vs. kept alive
+
+Starts the stand-in API over TLS with a throwaway self-signed certificate and
+sends the same Messages API request through a new urllib connection each time
+(the previous transport) and through the shared keep-alive pool.
+
+Usage:
+    python benchmarks/http_pool_bench.py [--requests 50]
+"""
+import json
+import os
+import shutil
+import ssl
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, BENCH_DIR)
+
+try:
+    import urllib.request as urllib_request
+except ImportError:
+    import urllib2 as urllib_request
+
+from standin_server import StandinServer, _option, make_self_signed_cert  # noqa: E402
+from utils.http_pool import ConnectionPool  # noqa: E402
+
+HEADERS = {"Content-Type": "application/json", "x-api-key": "standin", "anthropic-version": "2023-06-01"}
+BODY = json.dumps({"model": "standin", "max_tokens": 10,
+                   "messages": [{"role": "user", "content": "select all walls"}]}).encode('utf-8')
+
+
+def timed(send, count):
+    latencies = []
+    for _ in range(count):
+        started = time.time()
+        payload = json.loads(send().decode('utf-8'))
+        assert payload['content'][0]['text']
+        latencies.append((time.time() - started) * 1000.0)
+    return latencies
+
+
+def summarize(name, latencies, connections):
+    ordered = sorted(latencies)
+    return {
+        'transport': name,
+        'requests': len(latencies),
+        'connections': connections,
+        'total_ms': round(sum(latencies), 1),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'p50_ms': round(ordered[len(ordered) // 2], 2),
+        'first_ms': round(latencies[0], 2)
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = _option(argv, '--requests', 50)
+    cert_dir = tempfile.mkdtemp()
+    try:
+        certfile, keyfile = make_self_signed_cert(cert_dir)
+        server = StandinServer(certfile=certfile, keyfile=keyfile).start()
+        url = server.base_url + '/v1/messages'
+        client_context = ssl.create_default_context(cafile=certfile)
+
+        def send_fresh():
+            request = urllib_request.Request(url, BODY, HEADERS)
+            return urllib_request.urlopen(request, context=client_context).read()
+
+        before = server.connections
+        fresh = timed(send_fresh, count)
+        print(json.dumps(summarize('urllib (new connection per request)', fresh,
+                                   server.connections - before), sort_keys=True))
+
+        pool = ConnectionPool(ssl_context=client_context)
+        before = server.connections
+        pooled = timed(lambda: pool.request('POST', url, BODY, HEADERS).read(), count)
+        print(json.dumps(summarize('keep-alive pool', pooled, server.connections - before), sort_keys=True))
+
+        print(json.dumps({'saved_ms_total': round(sum(fresh) - sum(pooled), 1),
+                          'speedup': round(sum(fresh) / sum(pooled), 2)}, sort_keys=True))
+        pool.close()
+        server.shutdown()
+    finally:
+        shutil.rmtree(cert_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
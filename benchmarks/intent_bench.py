@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+task_agent intent matching: accuracy on a labeled set and per-query cost
+
+intent_queries.jsonl labels each query with its actions (primary first),
+target elements and parameters, including multi-intent queries ("create a
+list of doors") and substring traps ("target" contains "get", "wall"
+contains "all"). The "before" analyzer is the original substring-scan
+version of understand_and_formulate_tasks, kept here for comparison;
+"keywords" is the current analyzer with the intent classifier disabled.
+
+Reports primary action accuracy, exact match of the action set, element and
+parameter F1 and exact match, and microseconds per query for each analyzer
+(and for match_intents and the classifier alone), plus the time to load the
+shipped classifier weights and to retrain them. --errors lists the queries the current analyzer gets wrong.
+
+Usage:
+    python benchmarks/intent_bench.py [--runs 200] [--errors]
+"""
+import io
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, BENCH_DIR)
+
+from standin_server import _option  # noqa: E402
+from utils.intent_classifier import IntentClassifier, get_classifier  # noqa: E402
+from utils.task_agent import match_intents, understand_and_formulate_tasks  # noqa: E402
+
+LABELS = os.path.join(BENCH_DIR, 'intent_queries.jsonl')
+KEYWORDS_ONLY = {'intent_classifier': {'enabled': False}}
+
+LEGACY_ACTIONS = [
+    ("create", ["create", "make", "add", "new", "generate"]),
+    ("select", ["select", "find", "get", "collect", "filter"]),
+    ("modify", ["move", "copy", "rotate", "modify", "change", "update"]),
+    ("delete", ["delete", "remove", "erase"]),
+    ("analyze", ["list", "show", "display", "report", "analyze"])
+]
+LEGACY_ELEMENTS = {
+    "walls": ["wall", "walls"],
+    "doors": ["door", "doors"],
+    "windows": ["window", "windows"],
+    "floors": ["floor", "floors", "slab"],
+    "ceilings": ["ceiling", "ceilings"],
+    "rooms": ["room", "rooms", "space", "spaces"],
+    "grids": ["grid", "grids", "gridline"],
+    "levels": ["level", "levels"],
+    "families": ["family", "families", "family instance"],
+    "elements": ["element", "elements", "component", "components"]
+}
+LEGACY_PARAMETERS = {
+    "height": ["height", "tall", "elevation"],
+    "width": ["width", "wide", "thickness"],
+    "length": ["length", "long", "distance"],
+    "location": ["location", "position", "coordinate", "point"],
+    "material": ["material", "finish"],
+    "type": ["type", "family", "style"],
+    "level": ["level", "floor"],
+    "name": ["name", "tag", "mark", "label"]
+}
+
+
+def legacy_analysis(query):
+    """The substring-scan analysis task_agent used before the compiled matcher"""
+    query_lower = query.lower()
+    actions = []
+    for action, words in LEGACY_ACTIONS:
+        if any(word in query_lower for word in words):
+            actions.append(action)
+            break
+    return {
+        'primary_action': actions[0] if actions else None,
+        'actions': actions,
+        'target_elements': [element for element, words in LEGACY_ELEMENTS.items()
+                            if any(word in query_lower for word in words)],
+        'parameters': dict((param, True) for param, words in LEGACY_PARAMETERS.items()
+                           if any(word in query_lower for word in words))
+    }
+
+
+def load_labels(path=LABELS):
+    with io.open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def f1(expected, predicted):
+    true_positive = sum(len(set(e) & set(p)) for e, p in zip(expected, predicted))
+    predicted_count = sum(len(set(p)) for p in predicted)
+    expected_count = sum(len(set(e)) for e in expected)
+    precision = float(true_positive) / predicted_count if predicted_count else 0.0
+    recall = float(true_positive) / expected_count if expected_count else 0.0
+    return round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0
+
+
+def score(labels, analyze):
+    """Accuracy metrics of `analyze(query)` against the labeled set, plus the queries it gets wrong"""
+    results = [analyze(label['query']) for label in labels]
+    count = float(len(labels))
+    wrong = []
+    for label, result in zip(labels, results):
+        mistakes = []
+        if result['primary_action'] != label['actions'][0]:
+            mistakes.append('primary {} != {}'.format(result['primary_action'], label['actions'][0]))
+        if set(result['target_elements']) != set(label['elements']):
+            mistakes.append('elements {} != {}'.format(sorted(result['target_elements']), label['elements']))
+        if set(result['parameters']) != set(label['parameters']):
+            mistakes.append('parameters {} != {}'.format(sorted(result['parameters']), label['parameters']))
+        if mistakes:
+            wrong.append({'query': label['query'], 'mistakes': mistakes})
+    return {
+        'primary_accuracy': round(sum(r['primary_action'] == l['actions'][0]
+                                      for l, r in zip(labels, results)) / count, 4),
+        'action_set_accuracy': round(sum(set(r['actions']) == set(l['actions'])
+                                         for l, r in zip(labels, results)) / count, 4),
+        'element_exact': round(sum(set(r['target_elements']) == set(l['elements'])
+                                   for l, r in zip(labels, results)) / count, 4),
+        'element_f1': f1([l['elements'] for l in labels], [r['target_elements'] for r in results]),
+        'parameter_exact': round(sum(set(r['parameters']) == set(l['parameters'])
+                                     for l, r in zip(labels, results)) / count, 4),
+        'parameter_f1': f1([l['parameters'] for l in labels], [list(r['parameters']) for r in results])
+    }, wrong
+
+
+def per_query_us(function, queries, runs):
+    started = time.time()
+    for _ in range(runs):
+        for query in queries:
+            function(query)
+    return round((time.time() - started) / (runs * len(queries)) * 1e6, 2)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    runs = int(_option(argv, '--runs', 200))
+    labels = load_labels()
+    queries = [label['query'] for label in labels]
+
+    started = time.time()
+    IntentClassifier.load()
+    loading = time.time() - started
+    started = time.time()
+    IntentClassifier.from_file()
+    training = time.time() - started
+
+    def keywords(query):
+        return understand_and_formulate_tasks(query, KEYWORDS_ONLY)
+
+    before, _ = score(labels, legacy_analysis)
+    keyword_scores, _ = score(labels, keywords)
+    after, wrong = score(labels, understand_and_formulate_tasks)
+    print(json.dumps({
+        'queries': len(labels),
+        'before': dict(before, us_per_query=per_query_us(legacy_analysis, queries, runs)),
+        'keywords': dict(keyword_scores, us_per_query=per_query_us(keywords, queries, runs),
+                         match_us_per_query=per_query_us(match_intents, queries, runs)),
+        'after': dict(after, us_per_query=per_query_us(understand_and_formulate_tasks, queries, runs),
+                      classify_us_per_query=per_query_us(get_classifier().classify, queries, runs),
+                      load_ms=round(loading * 1000.0, 1), training_ms=round(training * 1000.0, 1))
+    }, sort_keys=True))
+    if '--errors' in argv:
+        for item in wrong:
+            print(json.dumps(item, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Offline end-to-end benchmark of the assistant pipeline
+
+Runs every query in a fixed labeled corpus (pipeline_queries.jsonl: 300
+create/select/modify/delete/analyze queries over ten element kinds) through
+utils.batch - task analysis, documentation retrieval, prompt building,
+generation on the replay provider and code extraction - and prints one JSON
+report:
+
+    throughput_qps, elapsed_s, startup_ms    startup loads the documentation index
+                                             and trains the intent classifier
+    stages_ms      p50/p95/p99/mean per stage
+    prompt_tokens  mean/p50/p95/max estimated prompt size
+    retrieval      precision@k, recall of labeled sections, MRR, hit rate,
+                   share of queries routed to a subset of the documentation
+                   files and share of the indexed text searched (scope)
+    analysis       primary_action accuracy (overall and per labeled intent)
+                   and recall of labeled target elements
+    memory         peak RSS (and peak Python heap with --heap, which traces
+                   every allocation and slows all timings several fold)
+
+A retrieved chunk is relevant when its source starts with one of the query's
+labeled sections ("selection/selection", "quick_reference: CREATION",
+"core/document: USAGE_EXAMPLES #5", ...). The response cache is off and the
+replay provider is unpaced by default, so the numbers measure the pipeline
+itself. Save a report with -o and pass it to --compare on a later commit to
+print the change in every metric.
+
+Usage:
+    python benchmarks/pipeline_bench.py [--corpus benchmarks/pipeline_queries.jsonl]
+        [--concurrency 1] [--repeat 1] [--first-token-ms 0] [--tokens-per-second 0]
+        [--heap] [-o report.json] [--records records.jsonl] [--compare baseline.json]
+"""
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, BENCH_DIR)
+
+from standin_server import _option  # noqa: E402
+from utils.batch import iter_results, read_queries  # noqa: E402
+from utils.config import DEFAULT_CONFIG  # noqa: E402
+from utils.docs_index import get_index  # noqa: E402
+from utils.hedging import percentile  # noqa: E402
+from utils.intent_classifier import get_classifier  # noqa: E402
+
+CORPUS = os.path.join(BENCH_DIR, 'pipeline_queries.jsonl')
+STAGES = ['analyze', 'retrieve', 'prompt', 'generate', 'extract', 'total']
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def load_corpus(path):
+    with io.open(path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    entries = [json.loads(line) for line in lines if line.strip()]
+    return read_queries(lines), dict((entry['id'], entry) for entry in entries)
+
+
+def bench_config(first_token_ms, tokens_per_second):
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    config.update({
+        'default_model': 'replay',
+        'response_cache': {'enabled': False},
+        'replay': dict(config['replay'], first_token_ms=first_token_ms, tokens_per_second=tokens_per_second),
+        'tracing': {'enabled': False}
+    })
+    return config
+
+
+def score_retrieval(sources, relevant):
+    """Return (precision, recall, reciprocal rank) of retrieved sources against labeled section prefixes"""
+    def matches(source, label):
+        return source == label or source.startswith(label + ' ') or source.startswith(label + ':')
+
+    hits = [any(matches(source, label) for label in relevant) for source in sources]
+    found = [label for label in relevant if any(matches(source, label) for source in sources)]
+    precision = float(sum(hits)) / len(sources) if sources else 0.0
+    recall = float(len(found)) / len(relevant) if relevant else 0.0
+    rank = hits.index(True) + 1 if True in hits else None
+    return precision, recall, 1.0 / rank if rank else 0.0
+
+
+def distribution(values):
+    if not values:
+        return None
+    return {
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'mean': round(sum(values) / float(len(values)), 3)
+    }
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                                       stderr=subprocess.STDOUT).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(items, labels, config, concurrency, repeat, records_file=None):
+    stages = dict((stage, []) for stage in STAGES)
+    prompt_tokens, precision, recall, reciprocal = [], [], [], []
+    intents, element_recall, statuses = {}, [], {}
+    routed, scope = [], []
+    index = get_index()
+    indexed = float(sum(index.lengths))
+
+    started = time.time()
+    for _ in range(repeat):
+        for record in iter_results(items, 'replay', config, concurrency):
+            label = labels[record['id']]
+            statuses[record['status']] = statuses.get(record['status'], 0) + 1
+            for stage in STAGES:
+                if stage in record['timings_ms']:
+                    stages[stage].append(record['timings_ms'][stage])
+            if record['status'] == 'error':
+                continue
+            prompt_tokens.append(record['prompt_tokens'])
+            record['precision'], record['recall'], record['reciprocal_rank'] = score_retrieval(
+                record['sources'], label['relevant'])
+            precision.append(record['precision'])
+            recall.append(record['recall'])
+            reciprocal.append(record['reciprocal_rank'])
+            files = record['routing']['files']
+            routed.append(files is not None)
+            if files is None:
+                scope.append(1.0)
+            else:
+                scope.append(sum(index.lengths[position] for position in index.scope(files)) / indexed)
+            correct = record['analysis']['primary_action'] == label['intent']
+            intents.setdefault(label['intent'], []).append(correct)
+            found = [element for element in label['elements'] if element in record['analysis']['target_elements']]
+            element_recall.append(float(len(found)) / len(label['elements']) if label['elements'] else 1.0)
+            if records_file is not None:
+                records_file.write(u'{}\n'.format(json.dumps(record, sort_keys=True)))
+    elapsed = time.time() - started
+
+    count = len(items) * repeat
+    judged = [correct for values in intents.values() for correct in values]
+    return {
+        'queries': count,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_qps': round(count / elapsed, 1) if elapsed else None,
+        'status': statuses,
+        'stages_ms': dict((stage, distribution(values)) for stage, values in stages.items() if values),
+        'prompt_tokens': dict(distribution(prompt_tokens) or {}, max=max(prompt_tokens) if prompt_tokens else None),
+        'retrieval': {
+            'k': config.get('max_docs', 5),
+            'precision': round(sum(precision) / len(precision), 4) if precision else None,
+            'recall': round(sum(recall) / len(recall), 4) if recall else None,
+            'mrr': round(sum(reciprocal) / len(reciprocal), 4) if reciprocal else None,
+            'hit_rate': round(float(sum(1 for value in reciprocal if value)) / len(reciprocal), 4)
+            if reciprocal else None,
+            'routed': round(float(sum(routed)) / len(routed), 4) if routed else None,
+            'scope': round(sum(scope) / len(scope), 4) if scope else None
+        },
+        'analysis': {
+            'intent_accuracy': round(float(sum(judged)) / len(judged), 4) if judged else None,
+            'by_intent': dict((intent, round(float(sum(values)) / len(values), 4))
+                              for intent, values in intents.items()),
+            'element_recall': round(sum(element_recall) / len(element_recall), 4) if element_recall else None
+        }
+    }
+
+
+def flatten(report, prefix=''):
+    values = {}
+    for key, value in report.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            values.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def compare(baseline, report):
+    """Lines of 'metric: old -> new (change)' for every numeric metric in both reports"""
+    old, new = flatten(baseline), flatten(report)
+    lines = []
+    for name in sorted(set(old) & set(new)):
+        if old[name] == new[name]:
+            continue
+        change = " ({:+.1%})".format((new[name] - old[name]) / float(old[name])) if old[name] else ""
+        lines.append("{}: {} -> {}{}".format(name, old[name], new[name], change))
+    return lines
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    corpus = _option(argv, '--corpus', CORPUS)
+    concurrency = int(_option(argv, '--concurrency', 1))
+    repeat = int(_option(argv, '--repeat', 1))
+    output = _option(argv, '-o', '')
+    records_path = _option(argv, '--records', '')
+    baseline_path = _option(argv, '--compare', '')
+    config = bench_config(float(_option(argv, '--first-token-ms', 0.0)),
+                          float(_option(argv, '--tokens-per-second', 0.0)))
+
+    tracemalloc = None
+    if '--heap' in argv:
+        import tracemalloc
+        tracemalloc.start()
+
+    started = time.time()
+    get_index()
+    get_classifier()
+    startup = time.time() - started
+    items, labels = load_corpus(corpus)
+
+    records_file = io.open(records_path, 'w', encoding='utf-8') if records_path else None
+    try:
+        report = run(items, labels, config, concurrency, repeat, records_file)
+    finally:
+        if records_file is not None:
+            records_file.close()
+
+    report.update({
+        'corpus': os.path.basename(corpus),
+        'commit': git_commit(),
+        'python': platform.python_implementation() + ' ' + platform.python_version(),
+        'concurrency': concurrency,
+        'startup_ms': round(startup * 1000.0, 1),
+        'memory': {'peak_rss_mb': peak_rss_mb()}
+    })
+    if tracemalloc is not None:
+        report['memory']['heap_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0), 2)
+        tracemalloc.stop()
+
+    text = json.dumps(report, sort_keys=True)
+    if output:
+        with io.open(output, 'w', encoding='utf-8') as f:
+            f.write(u'{}\n'.format(text))
+    print(text)
+    if baseline_path:
+        with io.open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        for line in compare(baseline, report):
+            sys.stderr.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
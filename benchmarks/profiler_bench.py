@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Execution profiler overhead and report on a mock "slow script"
+
+The script below has the classic hot spot: a FilteredElementCollector built
+for every level and a parameter lookup per element. It runs plain and under
+utils.profiler; the report should rank the nested loop first and show the
+collector and lookup counts. Mock elements stand in for Revit.
+
+Usage:
+    python benchmarks/profiler_bench.py [--elements 2000] [--runs 20]
+"""
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, BENCH_DIR)
+
+from standin_server import _option  # noqa: E402
+from utils.profiler import Profiler, format_report  # noqa: E402
+
+SCRIPT = """levels = FilteredElementCollector(doc).OfClass(Level).ToElements()
+counts = {}
+for level in levels:
+    for wall in FilteredElementCollector(doc).OfClass(Wall).ToElements():
+        if wall.get_Parameter('Base Constraint') == level.Name:
+            counts[level.Name] = counts.get(level.Name, 0) + 1
+t = Transaction(doc, 'Write counts')
+t.Start()
+for level in levels:
+    level.LookupParameter('Comments')
+t.Commit()
+"""
+
+
+class MockElement(object):
+
+    def __init__(self, name, level):
+        self.Name = name
+        self.level = level
+
+    def get_Parameter(self, name):
+        return self.level
+
+    def LookupParameter(self, name):
+        return None
+
+
+class MockCollector(object):
+    elements = {}
+
+    def __init__(self, doc):
+        self.kind = None
+
+    def OfClass(self, kind):
+        self.kind = kind
+        return self
+
+    def ToElements(self):
+        return self.elements[self.kind]
+
+
+class MockTransaction(object):
+
+    def __init__(self, doc, name):
+        pass
+
+    def Start(self):
+        pass
+
+    def Commit(self):
+        pass
+
+
+def namespace(elements):
+    levels = [MockElement('Level {}'.format(index), None) for index in range(5)]
+    MockCollector.elements = {
+        'Level': levels,
+        'Wall': [MockElement('Wall', levels[index % 5].Name) for index in range(elements)]
+    }
+    return {'doc': None, 'FilteredElementCollector': MockCollector, 'Transaction': MockTransaction,
+            'Level': 'Level', 'Wall': 'Wall'}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    elements = int(_option(argv, '--elements', 2000))
+    runs = int(_option(argv, '--runs', 20))
+
+    compiled = compile(SCRIPT, '<string>', 'exec')
+    started = time.time()
+    for _ in range(runs):
+        exec(compiled, namespace(elements))
+    plain = (time.time() - started) / runs
+
+    started = time.time()
+    for _ in range(runs):
+        profiler = Profiler()
+        profiler.run(SCRIPT, namespace(elements))
+    profiled = (time.time() - started) / runs
+
+    print(format_report(profiler))
+    print(json.dumps({'elements': elements, 'plain_ms': round(plain * 1000, 2),
+                      'profiled_ms': round(profiled * 1000, 2),
+                      'overhead': round(profiled / plain, 2) if plain else None}, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
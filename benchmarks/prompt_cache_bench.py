@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Prompt caching benchmark: first-token latency with and without cached prefixes
+
+The stand-in API charges a prefill delay for every uncached prompt token
+(--prefill-ms-per-1k, default 200 ms per 1k tokens) and emulates Claude's
+cache_control breakpoints. A generate request is followed by review/fix
+requests over the same documentation, as in the assistant's fix loop, with
+prompt caching off and on. Gemini is not measured: its explicit cache needs
+32k tokens, far above these prompts.
+
+Usage:
+    python benchmarks/prompt_cache_bench.py [--prefill-ms-per-1k 200] [--fixes 4]
+"""
+import json
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, BENCH_DIR)
+
+from standin_server import StandinServer, _option  # noqa: E402
+from utils.ai_client import get_ai_response  # noqa: E402
+from utils.docs_lookup import find_relevant_context  # noqa: E402
+
+QUERY = "select all walls on level 1 and set their comments parameter"
+FIX = "ORIGINAL TASK: {}\nERROR: attempt {} failed\nFix the code."
+
+
+def run(model, enabled, prefill, fixes):
+    server = StandinServer(prefill_ms_per_1k=prefill, tokens_per_second=0).start()
+    config = server.assistant_config()
+    config.update({
+        'response_cache': {'enabled': False},
+        'prompt_cache': {'enabled': enabled},
+        'max_docs': 8,
+        'context_token_budget': {'claude': 1600}
+    })
+    context = find_relevant_context(QUERY, 8)
+    rows = []
+    for attempt, query in enumerate([QUERY] + [FIX.format(QUERY, n) for n in range(1, fixes + 1)]):
+        info = {}
+        get_ai_response(query, context, model, info=info, on_token=lambda text: None, config=config)
+        cache = info.get('prompt_cache', {})
+        rows.append({
+            'request': 'generate' if attempt == 0 else 'fix {}'.format(attempt),
+            'cache': cache.get('status'),
+            'input_tokens': cache.get('input_tokens'),
+            'saved_input_tokens': cache.get('saved_input_tokens'),
+            'first_token_ms': round(info['first_token'] * 1000.0, 1)
+        })
+    server.shutdown()
+    return rows
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    prefill = _option(argv, '--prefill-ms-per-1k', 200.0)
+    fixes = _option(argv, '--fixes', 4)
+    model = 'claude'
+    totals = {}
+    for enabled in (False, True):
+        rows = run(model, enabled, prefill, fixes)
+        for row in rows:
+            print(json.dumps(dict(row, model=model, prompt_cache=enabled), sort_keys=True))
+        totals[enabled] = sum(row['first_token_ms'] for row in rows)
+    print(json.dumps({'model': model, 'total_first_token_ms_uncached': round(totals[False], 1),
+                      'total_first_token_ms_cached': round(totals[True], 1)}, sort_keys=True))
+
+if __name__ == '__main__':
+    main()
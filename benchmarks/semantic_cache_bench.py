@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Semantic cache benchmark: hit rate and lookup latency at 10k and 100k entries
+
+Stored queries are generated from action/element/level templates. Half of
+the probes paraphrase a stored query and should find it. The other half take
+a stored query and swap one thing, in rotation:
+
+    number     a different level/phase/view number (never stored)
+    element    a different element ("walls" -> "doors")
+    action     a different action ("select all" -> "delete all")
+    negation   the place negated ("not on level 3", "except in phase 2")
+
+A swapped probe may only return the stored query it now literally equals
+(element and action swaps of a stored query are usually stored too), never
+the query it was derived from or any other. false_hit_rate counts wrong
+answers per swap kind; number swaps are kept apart by the literal partition,
+negation, action and element swaps by the intent partition as well as the
+similarity threshold.
+
+Short templates leave a swapped word a large share of the vector, so the
+threshold alone separates them. The long_* results repeat the test on
+16-word queries, where one swapped action, element or sort parameter still
+scores about 0.9: every other combination of LONG_QUERY is stored, and each
+probe either paraphrases a stored one or swaps one slot to a combination
+that is not stored, so any hit on a swap is false.
+
+Usage:
+    python benchmarks/semantic_cache_bench.py [--sizes 10000,100000] [--probes 2000]
+"""
+import json
+import os
+import random
+import sys
+import time
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'RvtFunctionCall.extension', 'lib')
+sys.path.insert(0, LIB_DIR)
+
+from utils.semantic_cache import SemanticCache  # noqa: E402
+
+ACTIONS = {
+    'select all': ['pick every', 'find all the', 'grab each', 'collect all'],
+    'delete all': ['remove every', 'erase all the', 'remove each'],
+    'create': ['make', 'add', 'place'],
+    'list all': ['show every', 'display all the', 'report all'],
+    'update all': ['change every', 'edit all the', 'adjust each']
+}
+ELEMENTS = ['walls', 'doors', 'windows', 'floors', 'ceilings', 'rooms', 'grids', 'columns',
+            'beams', 'furniture', 'roofs', 'stairs', 'railings', 'pipes', 'ducts', 'sheets',
+            'views', 'tags', 'dimensions', 'levels']
+PLACES = ['on level {}', 'in phase {}', 'in view {}', 'on sheet {}', 'in workset {}']
+NEGATIONS = ['not {}', 'except {}', 'excluding those {}']
+SWAPS = ['number', 'element', 'action', 'negation']
+
+LONG_QUERY = u'{} {} on level 1 whose comments parameter is empty and report their count grouped by {}'
+LONG_ACTIONS = ['select all', 'delete all', 'update all', 'list all']
+LONG_ELEMENTS = ['walls', 'doors', 'windows', 'floors', 'ceilings', 'rooms']
+LONG_ORDERS = ['name', 'type', 'height', 'width', 'material']
+LONG_SLOTS = [LONG_ACTIONS, LONG_ELEMENTS, LONG_ORDERS]
+LONG_SWAPS = ['action', 'element', 'parameter']
+
+
+def stored_query(n):
+    """Deterministically map an integer to a distinct canonical query"""
+    actions = sorted(ACTIONS)
+    action = actions[n % len(actions)]
+    element = ELEMENTS[(n // len(actions)) % len(ELEMENTS)]
+    place = PLACES[(n // (len(actions) * len(ELEMENTS))) % len(PLACES)]
+    number = n // (len(actions) * len(ELEMENTS) * len(PLACES)) + 1
+    return action, element, place.format(number)
+
+
+def query_id(action, element, place, number):
+    """Inverse of stored_query for a place template; the id may exceed the stored size"""
+    actions = sorted(ACTIONS)
+    return actions.index(action) + len(actions) * (
+        ELEMENTS.index(element) + len(ELEMENTS) * (PLACES.index(place) + len(PLACES) * (number - 1)))
+
+
+def swapped_probe(kind, n, size, rng):
+    """Return (query, id the probe may match or None) for one swap of stored query n"""
+    action, element, place = stored_query(n)
+    template = PLACES[(n // (len(ACTIONS) * len(ELEMENTS))) % len(PLACES)]
+    number = int(place.split()[-1])
+    if kind == 'number':
+        return u'{} {} {}'.format(action, element, template.format(number + size)), None
+    if kind == 'element':
+        element = rng.choice([other for other in ELEMENTS if other != element])
+    elif kind == 'action':
+        action = rng.choice([other for other in sorted(ACTIONS) if other != action])
+    else:
+        return u'{} {} {}'.format(action, element, rng.choice(NEGATIONS).format(place)), None
+    same = query_id(action, element, template, number)
+    return u'{} {} {}'.format(action, element, place), same if same < size else None
+
+
+def long_combinations():
+    """Every (action, element, order) index triple; the even ones are stored"""
+    return [(a, e, o) for a in range(len(LONG_ACTIONS)) for e in range(len(LONG_ELEMENTS))
+            for o in range(len(LONG_ORDERS))]
+
+
+def long_query(combination, action=None):
+    a, e, o = combination
+    return LONG_QUERY.format(action or LONG_ACTIONS[a], LONG_ELEMENTS[e], LONG_ORDERS[o])
+
+
+def run_long(cache, probes, rng):
+    """Paraphrase hit rate and false hits per swapped slot on long queries"""
+    stored = [combination for combination in long_combinations() if sum(combination) % 2 == 0]
+    for combination in stored:
+        cache.index.add(long_query(combination), {'id': combination})
+
+    hits = 0
+    swapped = dict((kind, [0, 0]) for kind in LONG_SWAPS)
+    for i in range(probes):
+        combination = rng.choice(stored)
+        if i % 2 == 0:
+            action = LONG_ACTIONS[combination[0]]
+            query, expected = long_query(combination, rng.choice(ACTIONS[action])), combination
+        else:
+            slot = (i // 2) % len(LONG_SWAPS)
+            # An odd step makes the combination odd, so it is never stored
+            values = [value for value in range(len(LONG_SLOTS[slot])) if (value - combination[slot]) % 2]
+            changed = list(combination)
+            changed[slot] = rng.choice(values)
+            query, expected = long_query(tuple(changed)), None
+        score, entry = cache.lookup(query)
+        found = entry['id'] if entry is not None else None
+        if expected is not None:
+            hits += found == expected
+        else:
+            swapped[LONG_SWAPS[slot]][0] += 1
+            swapped[LONG_SWAPS[slot]][1] += found is not None
+
+    paraphrases = (probes + 1) // 2
+    return {
+        'long_paraphrase_hit_rate': round(float(hits) / paraphrases, 4),
+        'long_false_hit_rate_by_swap': dict((kind, round(float(false) / count, 4) if count else None)
+                                            for kind, (count, false) in swapped.items())
+    }
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(size, probes, rng):
+    cache = SemanticCache(path=None, threshold=0.85, max_entries=size)
+    started = time.time()
+    for n in range(size):
+        action, element, place = stored_query(n)
+        cache.index.add(u'{} {} {}'.format(action, element, place), {'id': n})
+    build_seconds = time.time() - started
+
+    hits = 0
+    swapped = dict((kind, [0, 0]) for kind in SWAPS)
+    latencies = []
+    for i in range(probes):
+        n = rng.randrange(size)
+        action, element, place = stored_query(n)
+        kind = None
+        if i % 2 == 0:
+            query = u'{} {} {}'.format(rng.choice(ACTIONS[action]), element, place)
+            expected = n
+        else:
+            kind = SWAPS[(i // 2) % len(SWAPS)]
+            query, expected = swapped_probe(kind, n, size, rng)
+
+        started = time.time()
+        score, entry = cache.lookup(query)
+        latencies.append((time.time() - started) * 1000.0)
+
+        found = entry['id'] if entry is not None else None
+        if kind is None:
+            hits += found == expected
+        else:
+            swapped[kind][0] += 1
+            swapped[kind][1] += found is not None and found != expected
+
+    paraphrases = (probes + 1) // 2
+    wrong = sum(false for count, false in swapped.values())
+    result = run_long(cache, probes, rng)
+    result.update({
+        'entries': size,
+        'build_seconds': round(build_seconds, 3),
+        'paraphrase_hit_rate': round(float(hits) / paraphrases, 4),
+        'false_hit_rate': round(float(wrong) / (probes - paraphrases), 4),
+        'false_hit_rate_by_swap': dict((kind, round(float(false) / count, 4) if count else None)
+                                       for kind, (count, false) in swapped.items()),
+        'lookup_ms_p50': round(percentile(latencies, 0.50), 3),
+        'lookup_ms_p95': round(percentile(latencies, 0.95), 3),
+        'lookup_ms_max': round(max(latencies), 3)
+    })
+    return result
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    sizes = [10000, 100000]
+    probes = 2000
+    if '--sizes' in argv:
+        sizes = [int(size) for size in argv[argv.index('--sizes') + 1].split(',')]
+    if '--probes' in argv:
+        probes = int(argv[argv.index('--probes') + 1])
+
+    rng = random.Random(42)
+    for size in sizes:
+        print(json.dumps(run(size, probes, rng), sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the Claude Messages and Gemini generateContent APIs
+
+Serves a canned response either as one JSON body or as a server-sent event
+stream (Claude 'stream': true, Gemini streamGenerateContent?alt=sse), with
+configurable first-byte delay and token rate so the assistant pipeline can be
+exercised offline. Claude cache_control breakpoints are emulated, usage is
+reported the way the real APIs do, and uncached prompt tokens can be charged
+a prefill delay.
+
+Point the assistant at it through config.json:
+    "claude_api_url": "http://127.0.0.1:8765/v1/messages",
+    "gemini_api_url": "http://127.0.0.1:8765/v1beta/models"
+
+Faults can be injected for retry testing: each request consumes the next
+entry of the fault list ("429:2" answers 429 with Retry-After 2, "529"
+answers overloaded, "reset" drops the connection, "truncate" ends a stream
+halfway without its terminal event, "ok" serves normally).
+
+Usage:
+    python benchmarks/standin_server.py [--port 8765] [--first-byte-ms 300] [--tokens-per-second 80]
+                                        [--faults 429:1,529,reset,ok]
+"""
+import json
+import os
+import socket
+import ssl
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+DEFAULT_RESPONSE = u"""Here is a script that selects all walls in the active document.
+
+```python
+import clr
+clr.AddReference('RevitAPI')
+clr.AddReference('RevitAPIUI')
+from Autodesk.Revit.DB import *
+from Autodesk.Revit.UI import *
+from System.Collections.Generic import List
+
+doc = __revit__.ActiveUIDocument.Document
+uidoc = __revit__.ActiveUIDocument
+
+walls = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Walls).WhereElementIsNotElementType().ToElementIds()
+uidoc.Selection.SetElementIds(List[ElementId](walls))
+print("Selected {} walls".format(len(walls)))
+```
+
+The collector uses a quick category filter before materializing ids."""
+
+
+def estimate(text):
+    """Token estimate matching the assistant's chars/4 rule"""
+    return len(text) // 4
+
+
+def split_tokens(text, size=4):
+    """Split text into pseudo-tokens of roughly `size` characters"""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Real API front ends answer without Nagle delays on kept-alive connections
+    disable_nagle_algorithm = True
+    truncate = False
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        try:
+            return json.loads(body.decode('utf-8')) if body else {}
+        except ValueError:
+            return {}
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(('%x\r\n' % len(data)).encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def _token_delay(self):
+        rate = self.server.tokens_per_second
+        return 1.0 / rate if rate else 0.0
+
+    def _inject_fault(self, fault):
+        """Answer with an injected failure; returns False for 'ok'"""
+        if fault in ('ok', 'truncate'):
+            self.truncate = fault == 'truncate'
+            return False
+        if fault == 'reset':
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return True
+        status, _, retry_after = fault.partition(':')
+        body = json.dumps({'type': 'error', 'error': {
+            'type': 'rate_limit_error' if status == '429' else 'overloaded_error',
+            'message': 'injected fault {}'.format(fault)}}).encode('utf-8')
+        self.send_response(int(status))
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if retry_after:
+            self.send_header('Retry-After', retry_after)
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def _stream_tokens(self, text):
+        """Pseudo-tokens to stream, cut in half under the 'truncate' fault"""
+        tokens = split_tokens(text)
+        return tokens[:len(tokens) // 2] if self.truncate else tokens
+
+    def _claude_usage(self, request, text):
+        """Emulate Claude prompt caching over the system blocks' cache_control breakpoints"""
+        blocks = request.get('system') or []
+        if not isinstance(blocks, list):
+            blocks = [{'text': blocks}]
+        prefix, breakpoints = '', []
+        for block in blocks:
+            prefix += block.get('text', '')
+            if 'cache_control' in block:
+                breakpoints.append(prefix)
+        read, written = self.server.prompt_cache(breakpoints)
+        system_tokens = estimate(prefix)
+        message_tokens = estimate(json.dumps(request.get('messages', [])))
+        return {
+            'input_tokens': system_tokens - read - written + message_tokens,
+            'cache_read_input_tokens': read,
+            'cache_creation_input_tokens': written,
+            'output_tokens': estimate(text)
+        }
+
+    def _gemini_usage(self, request, text):
+        return {'promptTokenCount': estimate(json.dumps(request.get('contents', []))),
+                'candidatesTokenCount': estimate(text)}
+
+    def _prefill(self, uncached_tokens):
+        time.sleep(self.server.prefill_ms_per_1k * uncached_tokens / 1000.0 / 1000.0)
+
+    def do_POST(self):
+        self.server.count_request(self.path)
+        request = self._read_body()
+        if self._inject_fault(self.server.next_fault()):
+            return
+        time.sleep(self.server.first_byte_ms / 1000.0)
+        text = self.server.response_text
+
+        if self.path.startswith('/v1/messages'):
+            usage = self._claude_usage(request, text)
+            self._prefill(usage['input_tokens'] + usage['cache_creation_input_tokens'])
+        else:
+            usage = self._gemini_usage(request, text)
+            self._prefill(usage['promptTokenCount'])
+
+        streaming = request.get('stream') or ':streamGenerateContent' in self.path
+        if not streaming:
+            # A blocking response arrives only once the whole completion is generated
+            time.sleep(self._token_delay() * len(split_tokens(text)))
+
+        if self.path.startswith('/v1/messages'):
+            if streaming:
+                self._stream_claude(text, usage)
+            else:
+                self._send_json(200, {
+                    'type': 'message',
+                    'content': [{'type': 'text', 'text': text}],
+                    'usage': usage
+                })
+        elif ':streamGenerateContent' in self.path:
+            self._stream_gemini(text, usage)
+        elif ':generateContent' in self.path:
+            self._send_json(200, {'candidates': [{'content': {'parts': [{'text': text}]}}], 'usageMetadata': usage})
+        else:
+            self._send_json(404, {'error': {'message': 'unknown path ' + self.path}})
+
+    def _stream_claude(self, text, usage):
+        self._start_stream()
+
+        def event(kind, payload):
+            payload['type'] = kind
+            self._write_chunk('event: {}\ndata: {}\n\n'.format(kind, json.dumps(payload)))
+
+        start_usage = dict(usage, output_tokens=1)
+        event('message_start', {'message': {'type': 'message', 'content': [], 'usage': start_usage}})
+        event('content_block_start', {'index': 0, 'content_block': {'type': 'text', 'text': ''}})
+        delay = self._token_delay()
+        for token in self._stream_tokens(text):
+            event('content_block_delta', {'index': 0, 'delta': {'type': 'text_delta', 'text': token}})
+            time.sleep(delay)
+        if self.truncate:
+            self._end_stream()
+            return
+        event('content_block_stop', {'index': 0})
+        event('message_delta', {'delta': {'stop_reason': 'end_turn'}, 'usage': {'output_tokens': usage['output_tokens']}})
+        event('message_stop', {})
+        self._end_stream()
+
+    def _stream_gemini(self, text, usage):
+        self._start_stream()
+        delay = self._token_delay()
+        tokens = self._stream_tokens(text)
+        for position, token in enumerate(tokens):
+            candidate = {'content': {'parts': [{'text': token}], 'role': 'model'}}
+            if position == len(tokens) - 1 and not self.truncate:
+                candidate['finishReason'] = 'STOP'
+            self._write_chunk('data: {}\r\n\r\n'.format(json.dumps({'candidates': [candidate],
+                                                                     'usageMetadata': usage})))
+            time.sleep(delay)
+        self._end_stream()
+
+
+class StandinServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), response_text=DEFAULT_RESPONSE,
+                 first_byte_ms=0, tokens_per_second=0, verbose=False, certfile=None, keyfile=None, faults=None,
+                 prefill_ms_per_1k=0, min_cache_tokens=1024):
+        HTTPServer.__init__(self, address, StandinHandler)
+        self.scheme = 'http'
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+            self.scheme = 'https'
+        self.connections = 0
+        self.response_text = response_text
+        self.first_byte_ms = first_byte_ms
+        self.tokens_per_second = tokens_per_second
+        self.verbose = verbose
+        self.request_counts = {}
+        self.faults = list(faults or [])
+        self.prefill_ms_per_1k = prefill_ms_per_1k
+        self.min_cache_tokens = min_cache_tokens
+        self.cached_prefixes = set()
+        self.arrivals = []
+        self._lock = threading.Lock()
+
+    def prompt_cache(self, breakpoints):
+        """Return (read, written) tokens for cumulative prefixes ending at each breakpoint"""
+        with self._lock:
+            read = 0
+            for prefix in breakpoints:
+                if prefix in self.cached_prefixes:
+                    read = max(read, estimate(prefix))
+            written = 0
+            if breakpoints and breakpoints[-1] not in self.cached_prefixes:
+                written = max(estimate(breakpoints[-1]) - read, 0)
+            for prefix in breakpoints:
+                if estimate(prefix) >= self.min_cache_tokens:
+                    self.cached_prefixes.add(prefix)
+            if breakpoints and estimate(breakpoints[-1]) < self.min_cache_tokens:
+                written = 0
+            return read, written
+
+    def next_fault(self):
+        """Record the request arrival and return the fault to inject ('ok' when none are queued)"""
+        with self._lock:
+            self.arrivals.append(time.time())
+            return self.faults.pop(0) if self.faults else 'ok'
+
+    def handle_error(self, request, client_address):
+        # Clients that cancel a stream hang up mid-response; that is expected
+        error = sys.exc_info()[1]
+        if self.verbose or not isinstance(error, (socket.error, ssl.SSLError)):
+            HTTPServer.handle_error(self, request, client_address)
+
+    def count_request(self, path):
+        with self._lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    def get_request(self):
+        accepted = HTTPServer.get_request(self)
+        with self._lock:
+            self.connections += 1
+        return accepted
+
+    @property
+    def base_url(self):
+        return '{}://{}:{}'.format(self.scheme, *self.server_address[:2])
+
+    def assistant_config(self):
+        """Config overrides pointing both providers at this server"""
+        return {
+            'claude_api_key': 'standin',
+            'gemini_api_key': 'standin',
+            'claude_api_url': self.base_url + '/v1/messages',
+            'gemini_api_url': self.base_url + '/v1beta/models'
+        }
+
+    def start(self):
+        """Serve on a daemon thread and return self"""
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def make_self_signed_cert(directory):
+    """Create a localhost certificate with openssl; returns (certfile, keyfile)"""
+    certfile = os.path.join(directory, 'standin.crt')
+    keyfile = os.path.join(directory, 'standin.key')
+    subprocess.check_call([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-subj', '/CN=localhost', '-addext', 'subjectAltName=IP:127.0.0.1,DNS:localhost',
+        '-keyout', keyfile, '-out', certfile
+    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return certfile, keyfile
+
+
+def _option(argv, name, default):
+    if name in argv:
+        return type(default)(argv[argv.index(name) + 1])
+    return default
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    server = StandinServer(
+        ('127.0.0.1', _option(argv, '--port', 8765)),
+        first_byte_ms=_option(argv, '--first-byte-ms', 300),
+        tokens_per_second=_option(argv, '--tokens-per-second', 80.0),
+        verbose=True,
+        faults=[fault for fault in _option(argv, '--faults', '').split(',') if fault]
+    )
+    print('Stand-in API listening on {}'.format(server.base_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming benchmark: time-to-first-token vs. blocking responses
+
+Runs get_ai_response for both providers against the local stand-in server,
+once blocking and once streamed, and reports time to first token, total time
+and whether the streamed text matches the blocking one.
+
+Usage:
+    python benchmarks/streaming_bench.py [--first-byte-ms 200] [--tokens-per-second 200]
+"""
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, BENCH_DIR)
+
+from standin_server import StandinServer, _option  # noqa: E402
+from utils.ai_client import get_ai_response  # noqa: E402
+from utils.config import DEFAULT_CONFIG  # noqa: E402
+from utils.streaming import partial_code_block  # noqa: E402
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    server = StandinServer(
+        first_byte_ms=_option(argv, '--first-byte-ms', 200),
+        tokens_per_second=_option(argv, '--tokens-per-second', 200.0)
+    ).start()
+
+    config = dict(DEFAULT_CONFIG)
+    config.update(server.assistant_config())
+    config['response_cache'] = {'enabled': False}
+    context = {'documentation': []}
+
+    try:
+        for model in ('claude', 'gemini'):
+            started = time.time()
+            blocking = get_ai_response('select all walls', context, model, config=config)
+            blocking_seconds = time.time() - started
+
+            received = []
+            info = {}
+            started = time.time()
+            streamed = get_ai_response('select all walls', context, model, info=info,
+                                       on_token=received.append, config=config)
+            print(json.dumps({
+                'model': model,
+                'blocking_total_ms': round(blocking_seconds * 1000, 1),
+                'stream_first_token_ms': round(info['first_token'] * 1000, 1),
+                'stream_total_ms': round((time.time() - started) * 1000, 1),
+                'fragments': len(received),
+                'identical_text': streamed == blocking,
+                'code_lines': len((partial_code_block(streamed) or '').split('\n'))
+            }, sort_keys=True))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+The checks the agent loop runs on each generated script
+"""
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+
+from utils.agent_loop import AgentLoop, format_history  # noqa: E402
+
+SCRIPT = """from Autodesk.Revit.DB import *
+doc = __revit__.ActiveUIDocument.Document
+walls = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Walls).ToElements()
+t = Transaction(doc, 'Comment')
+t.Start()
+for wall in walls:
+    wall.LookupParameter('Comments').Set('x')
+t.Commit()
+"""
+
+
+class CheckTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dry_runs = []
+
+    def check(self, code, error=None):
+        def dry_run(code):
+            self.dry_runs.append(code)
+            return error
+
+        config = {'agent_loop': {'dry_run': True}}
+        loop = AgentLoop('comment every wall', 'prompt', {'documentation': []}, config=config, dry_run=dry_run)
+        return loop.check(code)
+
+    def test_model_only_script_is_dry_run(self):
+        code, stage, problem, prompt = self.check(SCRIPT)
+        self.assertEqual((stage, problem, prompt), ('passed', None, None))
+        self.assertEqual(self.dry_runs, [SCRIPT])
+
+    def test_dry_run_error_asks_for_a_fix(self):
+        code, stage, problem, prompt = self.check(SCRIPT, "AttributeError: 'NoneType'")
+        self.assertEqual(stage, 'dry_run')
+        self.assertIn("AttributeError", prompt)
+
+    def test_dialog_skips_the_dry_run(self):
+        code, stage, problem, prompt = self.check(SCRIPT + "TaskDialog.Show('Done', 'Comments set')\n")
+        self.assertEqual(stage, 'dry_run_skipped')
+        self.assertEqual([item['call'] for item in problem], ['TaskDialog.Show'])
+        self.assertIsNone(prompt)
+        self.assertEqual(self.dry_runs, [])
+
+    def test_selection_prompt_skips_the_dry_run(self):
+        code = SCRIPT.replace("walls = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Walls).ToElements()",
+                              "uidoc = __revit__.ActiveUIDocument\n"
+                              "walls = [doc.GetElement(r) for r in uidoc.Selection.PickObjects(ObjectType.Element)]")
+        self.assertEqual(self.check(code)[1], 'dry_run_skipped')
+        self.assertEqual(self.dry_runs, [])
+
+    def test_skipped_dry_run_in_history(self):
+        code, stage, problem, prompt = self.check(SCRIPT + "TaskDialog.Show('a', 'b')\nTaskDialog.Show('c', 'd')\n")
+        history = format_history({'history': [{'iteration': 1, 'stage': stage, 'problem': problem, 'elapsed': 0.1,
+                                               'tokens': 100, 'cached': False, 'prompt_cache': None}]})
+        self.assertEqual(history, "- #1 passed, dry run skipped: it would run TaskDialog.Show (0.1 s, ~100 tokens)")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Batch generation: per-provider rate limits and the shared connection pool
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'benchmarks'))
+
+from standin_server import StandinServer  # noqa: E402
+from utils.ai_client import batch_responses, get_ai_response  # noqa: E402
+from utils.http_pool import get_pool  # noqa: E402
+
+CONTEXT = {'documentation': []}
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandinServer(first_byte_ms=20).start()
+        self.config = self.server.assistant_config()
+        self.config['response_cache'] = {'enabled': False}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def hedge_immediately(self):
+        self.config['race'] = {'enabled': True, 'min_delay_ms': 0, 'max_delay_ms': 0}
+
+    def requests(self, count):
+        return [{'query': 'select all walls {}'.format(index), 'context': CONTEXT} for index in range(count)]
+
+
+class RateLimitTests(BatchTestCase):
+
+    def test_limit_sees_the_racing_secondary(self):
+        self.hedge_immediately()
+        limited = []
+        lock = threading.Lock()
+
+        def limit(model, token):
+            with lock:
+                limited.append(model)
+
+        get_ai_response('select all walls', CONTEXT, 'claude', config=self.config, limit=limit)
+        self.assertEqual(sorted(limited), ['claude', 'gemini'])
+
+    def test_secondary_provider_rate_is_enforced(self):
+        self.hedge_immediately()
+        self.config['batch'] = {'requests_per_minute': {'gemini': 60}, 'burst': 1}
+        results = list(batch_responses(self.requests(4), 'claude', self.config, concurrency=4))
+        self.assertTrue(all(result['error'] is None for result in results))
+        gemini = sum(count for path, count in self.server.request_counts.items() if 'gemini' in path)
+        # Every request hedges at once, but only the first secondary gets a
+        # token; the others wait a second and are cancelled when Claude wins
+        self.assertEqual(gemini, 1)
+
+    def test_unlimited_providers_do_not_wait(self):
+        self.config['batch'] = {'requests_per_minute': {'claude': 0}, 'burst': 1}
+        started = time.time()
+        results = list(batch_responses(self.requests(6), 'claude', self.config, concurrency=6))
+        self.assertEqual(len(results), 6)
+        self.assertLess(time.time() - started, 2.0)
+
+
+class PoolTests(BatchTestCase):
+
+    def test_idle_limit_is_restored_after_the_batch(self):
+        pool = get_pool(self.config)
+        limit = pool.max_connections_per_host
+        holds = list(pool.idle_holds)
+        list(batch_responses(self.requests(12), 'claude', self.config, concurrency=12))
+        self.assertEqual(pool.max_connections_per_host, limit)
+        self.assertEqual(pool.idle_holds, holds)
+        self.assertTrue(all(len(idle) <= limit for idle in pool.idle.values()))
+
+    def test_idle_limit_is_restored_when_the_caller_stops_early(self):
+        pool = get_pool(self.config)
+        holds = list(pool.idle_holds)
+        results = batch_responses(self.requests(12), 'claude', self.config, concurrency=12)
+        next(results)
+        self.assertEqual(pool.idle_holds, holds + [12])
+        results.close()
+        self.assertEqual(pool.idle_holds, holds)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-flight validation of generated scripts
+"""
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+
+from utils.code_validator import blocking, preflight, side_effects, validate_code  # noqa: E402
+
+BOILERPLATE = """from Autodesk.Revit.DB import *
+doc = __revit__.ActiveUIDocument.Document
+"""
+
+
+def rules(code):
+    return [item['rule'] for item in validate_code(BOILERPLATE + code)]
+
+
+class TransactionTests(unittest.TestCase):
+
+    def test_bare_transaction(self):
+        self.assertEqual(rules("""t = Transaction(doc, 'Set')
+t.Start()
+p.Set('x')
+t.Commit()
+"""), [])
+
+    def test_modification_outside_transaction(self):
+        self.assertEqual(rules("p.Set('x')\n"), ['missing_transaction'])
+
+    def test_module_qualified_transaction(self):
+        self.assertEqual(rules("""from Autodesk.Revit import DB
+t = DB.Transaction(doc, 'Set')
+t.Start()
+p.Set('x')
+t.Commit()
+"""), [])
+
+    def test_module_qualified_transaction_in_with(self):
+        self.assertEqual(rules("""import Autodesk
+with Autodesk.Revit.DB.Transaction(doc, 'Set') as t:
+    t.Start()
+    p.Set('x')
+    t.Commit()
+"""), [])
+
+    def test_module_qualified_transaction_must_still_start(self):
+        self.assertEqual(rules("""from Autodesk.Revit import DB
+with DB.SubTransaction(doc) as t:
+    p.Set('x')
+"""), ['transaction_not_started'])
+
+    def test_pyrevit_transaction_starts_itself(self):
+        self.assertEqual(rules("""from pyrevit import revit
+with revit.Transaction('Set comments'):
+    p.Set('x')
+"""), [])
+
+    def test_pyrevit_transaction_group(self):
+        self.assertEqual(rules("""from pyrevit import revit
+with revit.TransactionGroup('Batch'):
+    with revit.Transaction('Delete'):
+        doc.Delete(ids)
+"""), [])
+
+    def test_transaction_group_alone_does_not_allow_changes(self):
+        self.assertEqual(rules("""g = TransactionGroup(doc, 'Batch')
+g.Start()
+doc.Delete(ids)
+g.Assimilate()
+"""), ['missing_transaction'])
+
+    def test_started_but_never_committed(self):
+        self.assertEqual(rules("""t = Transaction(doc, 'Set')
+t.Start()
+p.Set('x')
+"""), ['transaction_unbalanced'])
+
+
+class SideEffectTests(unittest.TestCase):
+
+    def effects(self, code):
+        return [(item['kind'], item['call']) for item in side_effects(BOILERPLATE + code)]
+
+    def test_model_changes_only(self):
+        self.assertEqual(self.effects("""import os
+t = Transaction(doc, 'Set')
+t.Start()
+p.Set(os.path.join('a', 'b'))
+t.Commit()
+print(p.AsString())
+"""), [])
+
+    def test_dialogs(self):
+        self.assertEqual(self.effects("""from pyrevit import forms
+TaskDialog.Show('Done', 'Walls updated')
+forms.alert('Done')
+"""), [('dialog', 'TaskDialog.Show'), ('dialog', 'forms.alert')])
+
+    def test_selection_prompts(self):
+        self.assertEqual(self.effects("""uidoc = __revit__.ActiveUIDocument
+ref = uidoc.Selection.PickObject(ObjectType.Element)
+"""), [('prompt', 'Selection.PickObject')])
+
+    def test_file_and_document_io(self):
+        self.assertEqual(self.effects("""with open('C:/temp/walls.csv', 'w') as f:
+    f.write('x')
+File.WriteAllText('C:/temp/a.txt', 'x')
+doc.Export('C:/temp', 'walls', options)
+doc.Save()
+"""), [('io', 'open'), ('io', 'File.WriteAllText'), ('io', 'doc.Export'), ('io', 'doc.Save')])
+
+    def test_calls_inside_functions_count(self):
+        self.assertEqual(self.effects("""def report(text):
+    TaskDialog.Show('Report', text)
+"""), [('dialog', 'TaskDialog.Show')])
+
+    def test_syntax_error_has_none(self):
+        self.assertEqual(side_effects("TaskDialog.Show(\n"), [])
+
+
+class PreflightTests(unittest.TestCase):
+
+    def test_syntax_error_is_blocking(self):
+        self.assertEqual([item['rule'] for item in blocking(validate_code("if True print(1)\n"))], ['syntax'])
+
+    def test_autofix_adds_missing_boilerplate(self):
+        code, applied, remaining = preflight("""from Autodesk.Revit.DB import *
+walls = FilteredElementCollector(doc).OfClass(Wall).ToElementIds()
+uidoc.Selection.SetElementIds(List[ElementId](walls))
+""")
+        self.assertEqual(sorted(applied), ['missing_list_import', 'undefined_doc', 'undefined_uidoc'])
+        self.assertEqual(remaining, [])
+        self.assertIn("doc = __revit__.ActiveUIDocument.Document", code)
+
+    def test_dynamo_document_is_rewritten(self):
+        code, applied, remaining = preflight("""import clr
+clr.AddReference('RevitServices')
+from RevitServices.Persistence import DocumentManager
+doc = DocumentManager.Instance.CurrentDBDocument
+""")
+        self.assertEqual(applied, ['dynamo_api'])
+        self.assertNotIn('RevitServices', code)
+        self.assertIn('__revit__.ActiveUIDocument.Document', code)
+
+
+if __name__ == '__main__':
+    unittest.main()
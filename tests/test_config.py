@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+File helpers in utils.config
+"""
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+
+from utils.config import replace_file  # noqa: E402
+
+
+class ReplaceFileTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.target = os.path.join(self.directory, 'corpus.json')
+        self.source = self.target + '.tmp'
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, path, text):
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def read(self, path):
+        with io.open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_replaces_an_existing_file(self):
+        self.write(self.target, u'old')
+        self.write(self.source, u'new')
+        replace_file(self.source, self.target)
+        self.assertEqual(self.read(self.target), u'new')
+        self.assertFalse(os.path.exists(self.source))
+
+    def test_creates_a_missing_file(self):
+        self.write(self.source, u'new')
+        replace_file(self.source, self.target)
+        self.assertEqual(self.read(self.target), u'new')
+
+    def test_missing_source_raises(self):
+        self.write(self.target, u'old')
+        with self.assertRaises(OSError):
+            replace_file(self.source, self.target)
+        self.assertEqual(self.read(self.target), u'old')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Dry runs against the mock Revit document of benchmarks/dry_run_bench.py
+"""
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'benchmarks'))
+
+from dry_run_bench import SCRIPTS, MockDocument, MockTransactionGroup, namespace  # noqa: E402
+from utils.dry_run import dry_run, format_result  # noqa: E402
+
+
+class TransactionGroupTests(unittest.TestCase):
+
+    def run_script(self, name):
+        doc = MockDocument()
+        before = doc.snapshot()
+        result = dry_run(SCRIPTS[name], namespace(doc), MockTransactionGroup)
+        return doc, before, result
+
+    def test_changes_are_counted_and_rolled_back(self):
+        doc, before, result = self.run_script('modifies')
+        self.assertTrue(result['ok'])
+        self.assertIsNone(result['skipped'])
+        self.assertEqual(result['scope'], 'MockTransactionGroup')
+        self.assertEqual((result['added'], result['modified'], result['deleted']), (1, 5, 1))
+        self.assertTrue(result['rolled_back'])
+        self.assertEqual(doc.snapshot(), before)
+
+    def test_error_reports_the_script_line(self):
+        doc, before, result = self.run_script('raises')
+        self.assertFalse(result['ok'])
+        self.assertIn("(line 5)", result['error'])
+        self.assertEqual(doc.snapshot(), before)
+
+    def test_transaction_left_open_is_rolled_back(self):
+        doc, before, result = self.run_script('leaves_open')
+        self.assertFalse(result['ok'])
+        self.assertIn("left a Transaction open", result['error'])
+        self.assertEqual(doc.open_transactions, 0)
+        self.assertEqual(doc.snapshot(), before)
+
+
+class OpenTransactionTests(unittest.TestCase):
+    """A document that is already modifiable used to get a SubTransaction scope"""
+
+    def test_script_is_not_run(self):
+        doc = MockDocument()
+        doc.open_transactions = 1
+        before = doc.snapshot()
+        exec_globals = namespace(doc)
+        result = dry_run(SCRIPTS['modifies'] + "\nran = True", exec_globals, MockTransactionGroup)
+        self.assertTrue(result['skipped'])
+        self.assertIsNone(result['error'])
+        self.assertIsNone(result['scope'])
+        self.assertNotIn('ran', exec_globals)
+        self.assertEqual(doc.snapshot(), before)
+        self.assertEqual(doc.open_transactions, 1)
+        self.assertTrue(format_result(result).startswith("skipped - "))
+
+    def test_nested_transaction_fails_in_the_mock(self):
+        # Why the script cannot run: its own Transaction refuses to start
+        doc = MockDocument()
+        doc.open_transactions = 1
+        with self.assertRaises(Exception):
+            exec(SCRIPTS['modifies'], namespace(doc))
+
+
+if __name__ == '__main__':
+    unittest.main()
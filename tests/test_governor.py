@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Retry, backoff, Retry-After and token bucket behaviour of the request governor
+
+Each test drives the Claude provider against the local stand-in API
+(benchmarks/standin_server.py), which answers with injected 429, 529 and 503
+faults before serving normally.
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'benchmarks'))
+
+from standin_server import DEFAULT_RESPONSE, StandinServer  # noqa: E402
+from utils import governor  # noqa: E402
+from utils.governor import Governor, retry_after  # noqa: E402
+from utils.http_pool import HTTPStatusError  # noqa: E402
+from utils.providers import ClaudeProvider  # noqa: E402
+
+PROMPT = "USER REQUEST: select all walls"
+
+
+class GovernorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # Buckets are shared per API key for the whole process
+        with governor._BUCKETS_LOCK:
+            governor._BUCKETS.clear()
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def provider(self, faults, **settings):
+        server = StandinServer(faults=faults).start()
+        self.servers.append(server)
+        config = server.assistant_config()
+        config['governor'] = dict({'max_retries': 4, 'base_delay_ms': 50, 'max_delay_ms': 2000}, **settings)
+        return server, ClaudeProvider(config)
+
+    def generate(self, provider, stream=False):
+        """Return (response, [(attempt, delay, status)]) for one generate call"""
+        retries = []
+
+        def on_retry(attempt, delay, error):
+            retries.append((attempt, delay, getattr(error, 'code', None)))
+
+        on_token = (lambda text: None) if stream else None
+        return provider.generate(PROMPT, on_token, None, None, on_retry), retries
+
+
+class RetryTests(GovernorTestCase):
+
+    def test_429_honours_retry_after(self):
+        server, provider = self.provider(['429:0.3', 'ok'])
+        started = time.time()
+        response, retries = self.generate(provider)
+        self.assertEqual(response, DEFAULT_RESPONSE)
+        self.assertEqual(retries, [(1, 0.3, 429)])
+        self.assertEqual(len(server.arrivals), 2)
+        self.assertGreaterEqual(server.arrivals[1] - started, 0.3)
+
+    def test_503_retry_after_is_capped_at_max_delay(self):
+        server, provider = self.provider(['503:60', 'ok'], max_delay_ms=200)
+        started = time.time()
+        response, retries = self.generate(provider)
+        self.assertEqual(response, DEFAULT_RESPONSE)
+        self.assertEqual(retries, [(1, 0.2, 503)])
+        self.assertLess(time.time() - started, 5.0)
+
+    def test_529_backs_off_with_full_jitter(self):
+        server, provider = self.provider(['529', '529', '529', 'ok'], base_delay_ms=100)
+        response, retries = self.generate(provider)
+        self.assertEqual(response, DEFAULT_RESPONSE)
+        self.assertEqual([(attempt, status) for attempt, _, status in retries], [(1, 529), (2, 529), (3, 529)])
+        for attempt, delay, _ in retries:
+            self.assertGreaterEqual(delay, 0.0)
+            self.assertLessEqual(delay, 0.1 * 2 ** (attempt - 1))
+        self.assertEqual(len(server.arrivals), 4)
+
+    def test_gives_up_after_max_retries(self):
+        server, provider = self.provider(['529:0', '529:0', '529:0', 'ok'], max_retries=2)
+        with self.assertRaises(HTTPStatusError) as raised:
+            self.generate(provider)
+        self.assertEqual(raised.exception.code, 529)
+        self.assertEqual(len(server.arrivals), 3)
+
+    def test_client_errors_are_not_retried(self):
+        server, provider = self.provider(['400', 'ok'])
+        with self.assertRaises(HTTPStatusError) as raised:
+            self.generate(provider)
+        self.assertEqual(raised.exception.code, 400)
+        self.assertEqual(len(server.arrivals), 1)
+
+    def test_truncated_stream_is_retried(self):
+        server, provider = self.provider(['truncate', 'ok'])
+        response, retries = self.generate(provider, stream=True)
+        self.assertEqual(response, DEFAULT_RESPONSE)
+        self.assertEqual(len(retries), 1)
+        self.assertEqual(len(server.arrivals), 2)
+
+
+class BucketTests(GovernorTestCase):
+
+    def test_bucket_spaces_out_concurrent_requests(self):
+        server, provider = self.provider([], requests_per_minute=1200, burst=2)
+        threads = [threading.Thread(target=provider.generate, args=(PROMPT,)) for _ in range(6)]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(server.arrivals), 6)
+        # Two requests go out at once, the other four one refill (50 ms) apart
+        self.assertGreaterEqual(max(server.arrivals) - started, 4 * 0.05 * 0.95)
+
+    def test_429_pauses_every_caller_on_the_key(self):
+        server, provider = self.provider(['429:0.4'], requests_per_minute=6000, burst=5)
+        first = threading.Thread(target=provider.generate, args=(PROMPT,))
+        first.start()
+        while not server.arrivals:
+            time.sleep(0.005)
+        time.sleep(0.1)
+        # The 429 arrived before this call, so it waits out the pause too
+        provider.generate(PROMPT)
+        first.join()
+        self.assertEqual(len(server.arrivals), 3)
+        self.assertGreaterEqual(min(server.arrivals[1:]) - server.arrivals[0], 0.4 * 0.95)
+
+    def test_limiter_is_off_by_default(self):
+        self.assertIsNone(Governor.from_config({}, 'key').bucket)
+
+
+class RetryAfterTests(unittest.TestCase):
+
+    def test_header_seconds(self):
+        self.assertEqual(retry_after(HTTPStatusError(429, 'Too Many Requests', {'retry-after': '2'}, '')), 2.0)
+
+    def test_gemini_retry_delay_in_body(self):
+        body = '{"error": {"details": [{"retryDelay": "7s"}]}}'
+        self.assertEqual(retry_after(HTTPStatusError(429, 'Too Many Requests', {}, body)), 7.0)
+
+    def test_missing(self):
+        self.assertIsNone(retry_after(HTTPStatusError(503, 'Unavailable', {}, '')))
+
+
+if __name__ == '__main__':
+    unittest.main()
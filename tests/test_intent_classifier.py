@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+The shipped intent classifier weights in lib/intent_model.json
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'benchmarks'))
+
+from intent_bench import load_labels  # noqa: E402
+from utils import intent_classifier  # noqa: E402
+from utils.intent_classifier import IntentClassifier, training_hash  # noqa: E402
+from utils.task_agent import match_intents  # noqa: E402
+
+
+class ShippedModelTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.shipped = IntentClassifier.load()
+        cls.trained = IntentClassifier.from_file()
+
+    def test_model_matches_the_training_set(self):
+        # Fails after editing intent_training.jsonl; regenerate with
+        # `python -m utils.intent_classifier` from the lib directory
+        self.assertIsNotNone(self.shipped)
+        self.assertEqual(self.shipped.training, training_hash())
+
+    def test_shipped_weights_predict_like_training(self):
+        for label in load_labels():
+            query = label['query']
+            shipped, trained = self.shipped.classify(query), self.trained.classify(query)
+            self.assertEqual(shipped['action'], trained['action'], query)
+            self.assertAlmostEqual(shipped['confidence'], trained['confidence'], places=4)
+            for item in match_intents(query):
+                shipped_role, shipped_confidence = self.shipped.role(query, item['start'], item['end'])
+                trained_role, trained_confidence = self.trained.role(query, item['start'], item['end'])
+                self.assertEqual(shipped_role, trained_role, query)
+                self.assertAlmostEqual(shipped_confidence, trained_confidence, places=4)
+
+    def test_save_round_trip(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'intent_model.json')
+            self.trained.save(path)
+            loaded = IntentClassifier.load(path)
+            self.assertEqual(loaded.training, self.trained.training)
+            self.assertEqual(loaded.role_words, self.trained.role_words)
+            self.assertEqual(loaded.action_model.to_dict(), self.trained.action_model.to_dict())
+            self.assertEqual(loaded.role_model.to_dict(), self.trained.role_model.to_dict())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_missing_model_loads_as_none(self):
+        self.assertIsNone(IntentClassifier.load(os.path.join(TESTS_DIR, 'missing.json')))
+
+
+class GetClassifierTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cached = intent_classifier._CLASSIFIER
+        self.from_file = IntentClassifier.__dict__['from_file']
+        intent_classifier._CLASSIFIER = None
+
+    def tearDown(self):
+        intent_classifier._CLASSIFIER = self.cached
+        IntentClassifier.from_file = self.from_file
+
+    def test_first_use_does_not_train(self):
+        def train(cls, path=None):
+            raise AssertionError("trained at load time")
+
+        IntentClassifier.from_file = classmethod(train)
+        self.assertEqual(intent_classifier.get_classifier().classify("delete all walls")['action'], 'delete')
+
+    def test_digest_ignores_line_endings(self):
+        self.assertEqual(intent_classifier._digest(b'a\r\nb\r\n'), intent_classifier._digest(b'a\nb\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Performance findings and the one-click rewrites of the perf linter
+"""
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+
+from utils.perf_linter import analyze, rewrite  # noqa: E402
+
+INVARIANT_COLLECTOR = """for level in levels:
+    walls = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Walls).ToElements()
+    print(level.Name, len(walls))
+"""
+
+DELETING_LOOP = """for i in range(3):
+    walls = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Walls).ToElementIds()
+    t = Transaction(doc, 'Delete')
+    t.Start()
+    doc.Delete(list(walls)[0])
+    t.Commit()
+"""
+
+TRANSACTION_PER_ELEMENT = """for wall in walls:
+    t = Transaction(doc, 'Comment')
+    t.Start()
+    wall.LookupParameter('Comments').Set('x')
+    t.Commit()
+"""
+
+
+def collector_findings(code):
+    return [item for item in analyze(code) if item['rule'] == 'collector_in_loop']
+
+
+class CollectorInLoopTests(unittest.TestCase):
+
+    def test_invariant_collector_is_hoisted(self):
+        self.assertTrue(collector_findings(INVARIANT_COLLECTOR)[0]['rewritable'])
+        code, applied = rewrite(INVARIANT_COLLECTOR)
+        self.assertEqual(applied, ['collector_in_loop'])
+        self.assertEqual(code, """walls = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Walls).ToElements()
+for level in levels:
+    print(level.Name, len(walls))
+""")
+
+    def test_collector_depending_on_the_loop_stays(self):
+        code = """for level in levels:
+    walls = FilteredElementCollector(doc, level.Id).ToElements()
+"""
+        self.assertFalse(collector_findings(code)[0]['rewritable'])
+
+    def test_loop_that_deletes_elements_is_not_rewritten(self):
+        finding = collector_findings(DELETING_LOOP)[0]
+        self.assertFalse(finding['rewritable'])
+        self.assertIn('changes the model', finding['suggestion'])
+        code, applied = rewrite(DELETING_LOOP)
+        self.assertNotIn('collector_in_loop', applied)
+        # The collector still runs once per deletion
+        self.assertTrue(code.split('\n')[1].strip().startswith('walls = FilteredElementCollector'))
+
+    def test_loop_that_sets_parameters_is_not_rewritten(self):
+        code = """for name in names:
+    rooms = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Rooms).ToElements()
+    with revit.Transaction('Rename'):
+        rooms[0].LookupParameter('Name').Set(name)
+"""
+        self.assertFalse(collector_findings(code)[0]['rewritable'])
+        self.assertEqual(rewrite(code), (code, []))
+
+    def test_prefixes_match_whole_words(self):
+        code = """for level in levels:
+    walls = FilteredElementCollector(doc).OfCategory(BuiltInCategory.OST_Walls).ToElements()
+    Settings(level)
+"""
+        self.assertTrue(collector_findings(code)[0]['rewritable'])
+
+
+class TransactionPerElementTests(unittest.TestCase):
+
+    def transaction_finding(self, code):
+        return [item for item in analyze(code) if item['rule'] == 'transaction_per_element'][0]
+
+    def test_transactions_are_batched(self):
+        code, applied = rewrite(TRANSACTION_PER_ELEMENT)
+        self.assertEqual(applied, ['transaction_per_element'])
+        self.assertEqual(code, """t = Transaction(doc, 'Comment')
+t.Start()
+for wall in walls:
+    wall.LookupParameter('Comments').Set('x')
+t.Commit()
+""")
+
+    def test_transaction_ended_inside_the_loop_is_not_batched(self):
+        code = """for wall in walls:
+    t = Transaction(doc, 'Comment')
+    t.Start()
+    try:
+        wall.LookupParameter('Comments').Set('x')
+    except Exception:
+        t.RollBack()
+        t.Start()
+    t.Commit()
+"""
+        self.assertFalse(self.transaction_finding(code)['rewritable'])
+        self.assertEqual(rewrite(code), (code, []))
+
+    def test_with_transaction_committed_inside_the_loop_is_not_batched(self):
+        code = """for wall in walls:
+    with Transaction(doc, 'Comment') as t:
+        t.Start()
+        if wall.Pinned:
+            t.Commit()
+            t.Start()
+        wall.LookupParameter('Comments').Set('x')
+        t.Commit()
+"""
+        self.assertFalse(self.transaction_finding(code)['rewritable'])
+        self.assertEqual(rewrite(code), (code, []))
+
+    def test_trailing_newline_is_kept(self):
+        self.assertTrue(rewrite(TRANSACTION_PER_ELEMENT)[0].endswith('\n'))
+        self.assertFalse(rewrite(TRANSACTION_PER_ELEMENT.rstrip('\n'))[0].endswith('\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Profiled and plain script runs in utils.profiler
+"""
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+
+from utils.profiler import Profiler, format_report, run_script  # noqa: E402
+
+SCRIPT = """total = 0
+for i in range(1000):
+    total += i
+"""
+
+
+class RunScriptTests(unittest.TestCase):
+
+    def test_profiled_run_returns_its_profile(self):
+        exec_globals = {}
+        profile = run_script(SCRIPT, exec_globals, profile=True)
+        self.assertIsInstance(profile, Profiler)
+        self.assertEqual(len(profile.statements), 2)
+        self.assertEqual(exec_globals['total'], 499500)
+
+    def test_plain_run_after_a_profiled_one_has_no_profile(self):
+        # The Assistant keeps whatever run_script returns, so a plain Execute
+        # no longer reports the hot spots of the previous profiled run
+        last_profile = run_script(SCRIPT, {}, profile=True)
+        self.assertIsNotNone(last_profile)
+        exec_globals = {}
+        last_profile = run_script(SCRIPT, exec_globals)
+        self.assertIsNone(last_profile)
+        self.assertEqual(exec_globals['total'], 499500)
+
+    def test_failed_profiled_run_carries_its_profile(self):
+        with self.assertRaises(ZeroDivisionError) as raised:
+            run_script(SCRIPT + "total / 0\n", {}, profile=True)
+        self.assertEqual(len(raised.exception.profile.statements), 3)
+        self.assertIn("line 4", format_report(raised.exception.profile))
+
+    def test_failed_plain_run_carries_no_profile(self):
+        with self.assertRaises(ZeroDivisionError) as raised:
+            run_script(SCRIPT + "total / 0\n", {})
+        self.assertIsNone(getattr(raised.exception, 'profile', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
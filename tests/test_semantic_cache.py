@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Which stored scripts the semantic cache may reuse
+"""
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+
+from utils.semantic_cache import SemanticCache, cosine, vectorize  # noqa: E402
+
+SET_MARK = "select all walls on level 1 whose comments parameter is empty and set their mark to the room name"
+GROUPED = "list all doors on level 1 that are in the fire rated group and report their widths grouped by type"
+SCHEDULE = "create a room schedule with area and department sorted by name"
+
+
+class LookupTests(unittest.TestCase):
+
+    def cache(self, *queries):
+        cache = SemanticCache(path=None, threshold=0.85)
+        for query in queries:
+            cache.index.add(query, {'query': query})
+        return cache
+
+    def assertReuses(self, stored, query):
+        self.assertEqual(self.cache(stored).lookup(query)[1], {'query': stored})
+
+    def assertDoesNotReuse(self, stored, query):
+        # Similar enough that the threshold alone would not separate them
+        self.assertGreater(cosine(vectorize(stored)[0], vectorize(query)[0]), 0.85)
+        self.assertIsNone(self.cache(stored).lookup(query)[1])
+
+    def test_paraphrases_are_reused(self):
+        self.assertReuses("select all doors", "pick every door")
+        self.assertReuses("delete the walls on level 2", "remove each wall on level 2")
+        self.assertReuses("select all slabs on level 2", "grab every floor on storey 2")
+
+    def test_long_query_with_another_action(self):
+        self.assertDoesNotReuse(SET_MARK, SET_MARK.replace("select", "delete"))
+
+    def test_long_query_with_another_element(self):
+        self.assertDoesNotReuse(GROUPED, GROUPED.replace("doors", "windows"))
+
+    def test_long_query_with_another_parameter(self):
+        self.assertDoesNotReuse(SCHEDULE, SCHEDULE.replace("by name", "by height"))
+
+    def test_numbers_and_negation(self):
+        self.assertIsNone(self.cache("select all walls on level 1").lookup("select all walls on level 2")[1])
+        self.assertIsNone(self.cache("select the fire rated doors").lookup("select the doors that are not fire rated")[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
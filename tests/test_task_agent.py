@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Task analysis in utils.task_agent against the labeled set of benchmarks/intent_bench.py
+"""
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'benchmarks'))
+
+from intent_bench import KEYWORDS_ONLY, legacy_analysis, load_labels, score  # noqa: E402
+from utils.task_agent import understand_and_formulate_tasks  # noqa: E402
+
+
+def keywords(query):
+    return understand_and_formulate_tasks(query, KEYWORDS_ONLY)
+
+
+class KeywordAccuracyTests(unittest.TestCase):
+    """Floors a little under the measured scores (0.99 primary, 0.98 action set)"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.labels = load_labels()
+        cls.scores, cls.wrong = score(cls.labels, keywords)
+
+    def test_primary_action(self):
+        self.assertGreaterEqual(self.scores['primary_accuracy'], 0.97, self.wrong)
+
+    def test_action_set(self):
+        self.assertGreaterEqual(self.scores['action_set_accuracy'], 0.96, self.wrong)
+
+    def test_better_than_substring_scan(self):
+        before, _ = score(self.labels, legacy_analysis)
+        for metric in ('primary_accuracy', 'action_set_accuracy', 'parameter_f1'):
+            self.assertGreater(self.scores[metric], before[metric], metric)
+
+
+class ClassifierTests(unittest.TestCase):
+
+    def test_primary_action_matches_keywords(self):
+        labels = load_labels()
+        after, wrong = score(labels, understand_and_formulate_tasks)
+        self.assertGreaterEqual(after['primary_accuracy'], score(labels, keywords)[0]['primary_accuracy'], wrong)
+
+    def test_keyword_action_stands_at_low_confidence(self):
+        # The classifier prefers delete here
+        analysis = understand_and_formulate_tasks("copy walls to level 3 then delete the originals")
+        self.assertEqual(analysis['primary_action'], 'modify')
+        self.assertEqual(analysis['actions'], ['modify', 'delete'])
+        self.assertTrue(analysis['low_confidence'])
+
+    def test_unknown_verb_takes_the_classifier_action(self):
+        analysis = understand_and_formulate_tasks("renumber the rooms")
+        self.assertEqual(analysis['primary_action'], 'modify')
+        self.assertEqual(analysis['actions'], ['modify'])
+        self.assertFalse(analysis['low_confidence'])
+
+
+class FlagTests(unittest.TestCase):
+
+    def test_flags_follow_every_action(self):
+        analysis = keywords("select the walls and delete them")
+        self.assertEqual(analysis['primary_action'], 'select')
+        self.assertTrue(analysis['requires_selection'])
+        self.assertTrue(analysis['requires_transaction'])
+
+    def test_select_alone_needs_neither(self):
+        analysis = keywords("select all walls")
+        self.assertFalse(analysis['requires_selection'])
+        self.assertFalse(analysis['requires_transaction'])
+
+    def test_create_needs_no_selection(self):
+        analysis = keywords("create a list of doors")
+        self.assertEqual(analysis['actions'], ['create', 'analyze'])
+        self.assertFalse(analysis['requires_selection'])
+        self.assertTrue(analysis['requires_transaction'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Trace files and the `python -m utils.tracing summary` command
+"""
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+
+from utils import tracing  # noqa: E402
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class SummaryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.traces = os.path.join(self.directory, 'traces')
+        self.config_path = os.path.join(self.directory, 'config.json')
+        self.config = {'tracing': {'directory': self.traces}}
+        with io.open(self.config_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.config, ensure_ascii=True))
+        for query in ('select walls', 'count doors', 'tag rooms'):
+            trace = tracing.start_trace('ask', self.config, query=query)
+            with trace.span('retrieve'):
+                pass
+            trace.finish(outcome='ok')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def summary(self, *args):
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            self.assertEqual(tracing.main(['summary', '--json'] + list(args)), 0)
+            return json.loads(sys.stdout.getvalue())
+        finally:
+            sys.stdout = stdout
+
+    def test_traces_go_to_the_configured_directory(self):
+        self.assertEqual(tracing.trace_files(self.traces), [os.path.join(self.traces, tracing.TRACE_FILE)])
+
+    def test_summary_reads_the_configured_directory(self):
+        summary = self.summary('--config', self.config_path)
+        self.assertEqual(summary['total']['count'], 3)
+        self.assertEqual(summary['retrieve']['count'], 3)
+
+    def test_dir_overrides_the_config(self):
+        self.assertEqual(self.summary('--dir', self.traces)['total']['count'], 3)
+        self.assertEqual(self.summary('--dir', os.path.join(self.directory, 'empty')), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent batch execution in utils.worker
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'RvtFunctionCall.extension', 'lib'))
+
+from utils.worker import CancellationToken, OperationCancelled, run_concurrently  # noqa: E402
+
+
+def worker_threads():
+    return [thread for thread in threading.enumerate() if thread is not threading.current_thread()]
+
+
+class RunConcurrentlyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.before = set(worker_threads())
+
+    def assertNoWorkersLeft(self):
+        self.assertEqual(set(worker_threads()) - self.before, set())
+
+    def test_every_item_is_yielded_once(self):
+        results = list(run_concurrently(lambda item: item * 2, range(20), concurrency=4))
+        self.assertEqual(sorted(result for item, result, error in results), [item * 2 for item in range(20)])
+        self.assertNoWorkersLeft()
+
+    def test_errors_are_yielded_not_raised(self):
+        def work(item):
+            if item == 3:
+                raise ValueError(item)
+            return item
+
+        errors = [error for item, result, error in run_concurrently(work, range(5), 2) if error is not None]
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], ValueError)
+        self.assertNoWorkersLeft()
+
+    def test_no_items(self):
+        self.assertEqual(list(run_concurrently(lambda item: item, [])), [])
+        self.assertNoWorkersLeft()
+
+    def test_cancelled_items_are_not_run(self):
+        token = CancellationToken()
+        token.cancel()
+        run = []
+        results = list(run_concurrently(run.append, range(4), 2, token))
+        self.assertEqual(run, [])
+        self.assertTrue(all(isinstance(error, OperationCancelled) for item, result, error in results))
+
+    def test_stopping_early_joins_the_workers(self):
+        started = []
+
+        def work(item):
+            started.append(item)
+            time.sleep(0.01)
+            return item
+
+        results = run_concurrently(work, range(50), concurrency=2)
+        next(results)
+        results.close()
+        self.assertNoWorkersLeft()
+        # The items still queued were skipped rather than run
+        self.assertLess(len(started), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()